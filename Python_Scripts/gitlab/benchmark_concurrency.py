@@ -0,0 +1,65 @@
+"""
+This script benchmarks the concurrent fetch mode of the pipeline audit scripts against
+a local fake GitLab server (see fake_gitlab_server.py). For each concurrency level it
+fetches every pipeline's details and jobs, reports requests per second, and checks that
+the analysis output is identical to the serial run.
+
+Usage:
+    python benchmark_concurrency.py --pipelines 200 --latency 0.05 --workers 1,2,4,8,16
+"""
+import argparse
+import logging
+import os
+import time
+
+import fake_gitlab_server
+
+def load_audit_module(base_url):
+    # The audit script reads its configuration from the environment at import time
+    os.environ["GITLAB_URL"] = base_url
+    os.environ.setdefault("GITLAB_PROJECT_IDS", "1")
+    os.environ.setdefault("GITLAB_ACCESS_TOKEN", "benchmark-token")
+    import gitlab_pipeline_performance_audit
+    return gitlab_pipeline_performance_audit
+
+def run_audit_fetches(audit, pipelines, max_workers):
+    branch_stats = audit.analyze_pipeline_runtimes(1, pipelines, max_workers=max_workers)
+    job_store = audit.build_job_store(1, pipelines, max_workers=max_workers)
+    job_stats = audit.analyze_job_durations(audit.latest_job_attempts(job_store))
+    return branch_stats, job_stats, audit.analyze_retries(job_store)
+
+def run_script():
+    parser = argparse.ArgumentParser(description="Benchmark fetch throughput against concurrency level.")
+    parser.add_argument("--pipelines", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of latency injected per request")
+    parser.add_argument("--workers", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = fake_gitlab_server.start_server(port=0, pipelines=args.pipelines, jobs=args.jobs, latency=args.latency)
+    audit = load_audit_module(fake_gitlab_server.server_url(server))
+    logging.getLogger().setLevel(logging.WARNING)
+    pipelines = audit.fetch_pipelines(1)
+
+    print(f"{len(pipelines)} pipelines, {args.jobs} jobs each, {args.latency * 1000:.0f} ms injected latency\n")
+    print(f"{'Workers':<10} {'Requests':<10} {'Seconds':<10} {'Requests/s':<12} {'Speedup':<10} {'Output':<10}")
+    print("=" * 62)
+
+    baseline = None
+    for max_workers in [int(level) for level in args.workers.split(',')]:
+        requests_before = server.RequestHandlerClass.request_count
+        start = time.perf_counter()
+        results = run_audit_fetches(audit, pipelines, max_workers)
+        elapsed = time.perf_counter() - start
+        request_count = server.RequestHandlerClass.request_count - requests_before
+        if baseline is None:
+            baseline = (elapsed, results)
+        output = "identical" if results == baseline[1] else "DIFFERENT"
+        print(f"{max_workers:<10} {request_count:<10} {elapsed:<10.2f} {request_count / elapsed:<12.1f} "
+              f"{baseline[0] / elapsed:<10.2f} {output:<10}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    run_script()
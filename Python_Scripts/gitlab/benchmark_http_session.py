@@ -0,0 +1,73 @@
+"""
+This script measures request latency against a local fake GitLab server (see
+fake_gitlab_server.py) with and without the shared HTTP session from gitlab_client.py.
+
+"Per-request connections" calls module-level `requests.get`, which opens a new connection
+for every call, as the gitlab scripts used to. "Shared session" reuses pooled keep-alive
+connections. Against a remote HTTPS instance the gap is larger still, because every new
+connection also pays a TLS handshake.
+
+Usage:
+    python benchmark_http_session.py --requests 500 --workers 8
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import fake_gitlab_server
+from gitlab_client import create_session
+
+def measure(get, urls, workers):
+    """
+    Issue a GET for every URL on `workers` threads and return (wall seconds, latencies in ms).
+    """
+    def timed_get(url):
+        start = time.perf_counter()
+        response = get(url)
+        response.raise_for_status()
+        response.content
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(timed_get, urls))
+    return time.perf_counter() - start, latencies
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_script():
+    parser = argparse.ArgumentParser(description="Compare request latency with and without a shared session.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = fake_gitlab_server.start_server(port=0, pipelines=args.requests)
+    base_url = fake_gitlab_server.server_url(server)
+    pipeline_ids = sorted(server.RequestHandlerClass.data.pipelines)[:args.requests]
+    urls = [f"{base_url}/api/v4/projects/1/pipelines/{pipeline_id}/jobs" for pipeline_id in pipeline_ids]
+
+    headers = {"Private-Token": "benchmark-token"}
+    session = create_session("benchmark-token", pool_size=args.workers)
+    modes = [
+        ("Per-request connections", lambda url: requests.get(url, headers=headers)),
+        ("Shared session", session.get),
+    ]
+
+    print(f"{len(urls)} requests on {args.workers} threads against {base_url}\n")
+    print(f"{'Mode':<26} {'Wall (s)':<10} {'Mean (ms)':<11} {'p50 (ms)':<10} {'p95 (ms)':<10} {'p99 (ms)':<10}")
+    print("=" * 77)
+    for name, get in modes:
+        elapsed, latencies = measure(get, urls, args.workers)
+        print(f"{name:<26} {elapsed:<10.2f} {statistics.mean(latencies):<11.2f} {percentile(latencies, 0.5):<10.2f} "
+              f"{percentile(latencies, 0.95):<10.2f} {percentile(latencies, 0.99):<10.2f}")
+
+    session.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    run_script()
@@ -0,0 +1,156 @@
+"""
+This script benchmarks the gitlab scripts end to end against a local fake GitLab server
+(see fake_gitlab_server.py) at several data scales, and reports runtime, number of API
+requests and peak memory of each run.
+
+Scripts:
+- `audit`: gitlab_pipeline_performance_audit.py (one project, cache and trends disabled).
+- `jobs_audit`: gitlab_pipleline_jobs_performance_audit.py (one project, cache disabled).
+- `find_replace`: find_replace_gitlab.py. It does not read jobs, so a scale of N jobs is run
+  as N / 1000 projects (at least one) of `--files` files each, some containing the search term.
+
+A scale is a number of jobs: the fake project gets scale / `--jobs` pipelines, spaced so that
+all of them fall inside the audits' fetch window (about 10% of jobs get an extra retried attempt).
+Every run happens in a fresh Python process, so peak memory (max RSS) is that of the script alone.
+
+With `--replay`, each script first runs live while recording its responses (GITLAB_RECORD_PATH,
+see gitlab_client.py), then again offline from the recording (GITLAB_REPLAY_PATH). The replay
+run shows the script's own cost without network or server time.
+
+Usage:
+    python benchmark_suite.py --scales 1000,10000,100000 --latency 0.002 --replay
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_gitlab_server
+
+SCRIPTS = ("audit", "jobs_audit", "find_replace")
+JOBS_PER_PROJECT = 1000     # Jobs of scale per find_replace project
+AUDIT_WINDOW_DAYS = 30      # Shortest fetch window of the audited scripts
+ACCESS_TOKEN = "benchmark-token"
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_child(script, base_url, result_path):
+    """
+    Run one script in this (fresh) process and write its runtime and peak memory to `result_path`.
+    """
+    start = time.perf_counter()
+    if script == "audit":
+        # The audit script reads its configuration from the environment at import time
+        os.environ.update({"GITLAB_URL": base_url, "GITLAB_PROJECT_IDS": "1", "GITLAB_ACCESS_TOKEN": ACCESS_TOKEN,
+                           "GITLAB_CACHE_PATH": "", "GITLAB_TRENDS_PATH": ""})
+        import gitlab_pipeline_performance_audit
+        gitlab_pipeline_performance_audit.main()
+    elif script == "jobs_audit":
+        import gitlab_pipleline_jobs_performance_audit as jobs_audit
+        jobs_audit.Config.GITLAB_URL = base_url
+        jobs_audit.Config.PROJECT_ID = "1"
+        jobs_audit.Config.ACCESS_TOKEN = ACCESS_TOKEN
+        jobs_audit.Config.CACHE_PATH = None
+        jobs_audit.run_script()
+    else:
+        import find_replace_gitlab
+        find_replace_gitlab.Config.GITLAB_URL = base_url
+        find_replace_gitlab.Config.ACCESS_TOKEN = ACCESS_TOKEN
+        find_replace_gitlab.Config.LOG_FILE = os.path.join(os.getcwd(), "log.txt")
+        find_replace_gitlab.Config.SEARCH_TERM = fake_gitlab_server.Config.SEARCH_TERM
+        find_replace_gitlab.Config.REPLACEMENT_TERM = "https://registry.example.com"
+        find_replace_gitlab.Config.TARGET_NAMESPACE = "/group"
+        find_replace_gitlab.Config.BRANCH_PREFIX = "benchmark"
+        find_replace_gitlab.run_script()
+    with open(result_path, "w") as result_file:
+        json.dump({"seconds": time.perf_counter() - start, "peak_rss_mib": peak_rss_mib()}, result_file)
+
+def run_benchmark(script, server, record_path=None, replay_path=None):
+    """
+    Run a script in a subprocess against `server`.
+    Returns (result dict, request count, None), or (None, request count, log path) if the run failed.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"benchmark_{script}_")
+    result_path = os.path.join(workdir, "result.json")
+    log_path = os.path.join(workdir, "output.log")
+    env = {key: value for key, value in os.environ.items() if key not in ("GITLAB_RECORD_PATH", "GITLAB_REPLAY_PATH")}
+    if record_path:
+        env["GITLAB_RECORD_PATH"] = record_path
+    if replay_path:
+        env["GITLAB_REPLAY_PATH"] = replay_path
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH")]))
+
+    requests_before = server.RequestHandlerClass.request_count
+    with open(log_path, "w") as log_file:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", script,
+                        "--url", fake_gitlab_server.server_url(server), "--result", result_path],
+                       cwd=workdir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    request_count = server.RequestHandlerClass.request_count - requests_before
+    if not os.path.exists(result_path):
+        return None, request_count, log_path  # Keep the working directory for its log
+    with open(result_path) as result_file:
+        result = json.load(result_file)
+    shutil.rmtree(workdir)
+    return result, request_count, None
+
+def start_scaled_server(script, scale, args):
+    if script == "find_replace":
+        return fake_gitlab_server.start_server(port=0, projects=max(1, scale // JOBS_PER_PROJECT), pipelines=0,
+                                               files=args.files, latency=args.latency)
+    pipelines = max(1, scale // args.jobs)
+    interval = min(fake_gitlab_server.Config.PIPELINE_INTERVAL, AUDIT_WINDOW_DAYS * 24 * 60 * 0.9 / pipelines)
+    return fake_gitlab_server.start_server(port=0, pipelines=pipelines, jobs=args.jobs, latency=args.latency,
+                                           pipeline_interval=interval)
+
+def run_script():
+    parser = argparse.ArgumentParser(description="Benchmark the gitlab scripts at several data scales.")
+    parser.add_argument("--scales", default="1000,10000,100000", help="Comma-separated numbers of jobs")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"Comma-separated subset of {', '.join(SCRIPTS)}")
+    parser.add_argument("--jobs", type=int, default=10, help="Jobs per pipeline")
+    parser.add_argument("--files", type=int, default=fake_gitlab_server.Config.FILES, help="Files per find_replace project")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency injected per request")
+    parser.add_argument("--replay", action="store_true", help="Also rerun every script offline from a recording")
+    parser.add_argument("--child", choices=SCRIPTS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child, args.url, args.result)
+
+    scripts = [name.strip() for name in args.scripts.split(',') if name.strip()]
+    unknown = [name for name in scripts if name not in SCRIPTS]
+    if unknown:
+        parser.error(f"Unknown script(s) {', '.join(unknown)}; choose from {', '.join(SCRIPTS)}")
+
+    print(f"{args.jobs} jobs per pipeline, {args.latency * 1000:.0f} ms injected latency\n")
+    print(f"{'Script':<14} {'Jobs':<9} {'Mode':<8} {'Seconds':<10} {'Requests':<10} {'Peak RSS (MiB)':<15}")
+    print("=" * 70)
+    for scale in [int(value) for value in args.scales.split(',')]:
+        for script in scripts:
+            server = start_scaled_server(script, scale, args)
+            with tempfile.TemporaryDirectory(prefix="benchmark_fixtures_") as fixture_dir:
+                record_path = os.path.join(fixture_dir, f"{script}.jsonl") if args.replay else None
+                runs = [("live", {"record_path": record_path})]
+                if args.replay:
+                    runs.append(("replay", {"replay_path": record_path}))
+                for mode, paths in runs:
+                    result, request_count, log_path = run_benchmark(script, server, **paths)
+                    if result is None:
+                        print(f"{script:<14} {scale:<9} {mode:<8} FAILED, see {log_path}")
+                        continue
+                    print(f"{script:<14} {scale:<9} {mode:<8} {result['seconds']:<10.2f} {request_count:<10} "
+                          f"{result['peak_rss_mib']:<15.1f}")
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    run_script()
@@ -0,0 +1,204 @@
+"""
+Local code search index for find.py, as an alternative to the GitLab search API.
+
+Each project's default branch is fetched with depth 1 into a bare mirror under the cache
+directory (`<cache_dir>/mirrors/<project_id>.git`), incrementally with `git fetch` on later
+runs. Files are indexed in SQLite (`<cache_dir>/index.sqlite`): the compressed content of every
+text file plus the set of its lower-cased trigrams. A search only scans the files that contain
+every trigram of the term, so repeated searches run locally without API calls. Only projects
+whose branch moved are re-indexed, and within them only the files whose blob changed.
+
+Searches are case-insensitive substring matches per line, like GitLab's basic blob search.
+Terms shorter than three characters cannot use the trigram index and scan every file.
+Binary files and files larger than MAX_FILE_BYTES are not indexed.
+Needs the `git` command line client, 2.31 or later.
+"""
+import base64
+import os
+import sqlite3
+import subprocess
+import threading
+import zlib
+
+MAX_FILE_BYTES = 1024 * 1024
+BLOB_BATCH_SIZE = 500       # Blobs read per `git cat-file --batch` call
+
+class CodeIndexError(Exception):
+    pass
+
+def trigrams(text):
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+def _git(args, cwd=None, input=None, timeout=None, access_token=None):
+    """
+    Run a git command and return its stdout; raises CodeIndexError if it fails.
+    The token is sent as an HTTP header set through git's environment configuration
+    (GIT_CONFIG_COUNT), so it is neither stored in the mirror's configuration nor visible in the
+    process list. It remains readable in the environment of the git processes by their user (and root).
+    """
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    if access_token:
+        credentials = base64.b64encode(f"oauth2:{access_token}".encode()).decode()
+        env.update({"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "http.extraHeader",
+                    "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}"})
+    try:
+        result = subprocess.run(["git"] + args, cwd=cwd, input=input, capture_output=True, timeout=timeout, env=env)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise CodeIndexError(f"git {args[0]} failed: {e}") from None
+    if result.returncode != 0:
+        message = result.stderr.decode(errors="replace").strip().splitlines()
+        raise CodeIndexError(f"git {args[0]} failed: {message[0] if message else f'exit status {result.returncode}'}")
+    return result.stdout
+
+def _list_tree(mirror, commit):
+    """
+    Return {path: (blob sha, size)} of the blobs in a commit.
+    """
+    files = {}
+    for entry in _git(["ls-tree", "-r", "-z", "--long", commit], cwd=mirror).split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        _, object_type, sha, size = info.split()
+        if object_type == b"blob":
+            files[path.decode(errors="replace")] = (sha.decode(), int(size))
+    return files
+
+def _read_blobs(mirror, shas):
+    """
+    Yield (sha, content) of blobs, read in batches through `git cat-file --batch`.
+    """
+    for start in range(0, len(shas), BLOB_BATCH_SIZE):
+        batch = shas[start:start + BLOB_BATCH_SIZE]
+        output = _git(["cat-file", "--batch"], cwd=mirror, input="".join(f"{sha}\n" for sha in batch).encode())
+        position = 0
+        for _ in batch:
+            header_end = output.index(b"\n", position)
+            sha, _, size = output[position:header_end].split()
+            content_start = header_end + 1
+            content_end = content_start + int(size)
+            yield sha.decode(), output[content_start:content_end]
+            position = content_end + 1  # Each blob is followed by a newline
+
+class CodeIndex:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.mirror_dir = os.path.join(cache_dir, "mirrors")
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    project_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    web_url TEXT,
+                    branch TEXT NOT NULL,
+                    commit_sha TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id INTEGER PRIMARY KEY,
+                    project_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    blob_sha TEXT NOT NULL,
+                    content BLOB,
+                    UNIQUE (project_id, path)
+                );
+                CREATE TABLE IF NOT EXISTS trigrams (
+                    trigram TEXT NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    PRIMARY KEY (trigram, file_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS trigrams_by_file ON trigrams (file_id);
+            """)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def sync_project(self, project, access_token=None, timeout=None):
+        """
+        Fetch a project's default branch into its mirror and re-index the files that changed.
+        Returns the number of files (re)indexed, or None if the project has no branch to index.
+        Raises CodeIndexError if git fails.
+        """
+        project_id, branch = project['id'], project.get('default_branch')
+        if not branch or not project.get('http_url_to_repo'):
+            return None
+        mirror = os.path.join(self.mirror_dir, f"{project_id}.git")
+        if not os.path.isdir(mirror):
+            _git(["init", "--bare", "--quiet", mirror])
+        _git(["fetch", "--quiet", "--depth", "1", "--no-tags", project['http_url_to_repo'],
+              f"+refs/heads/{branch}:refs/heads/{branch}"], cwd=mirror, timeout=timeout, access_token=access_token)
+        commit = _git(["rev-parse", f"refs/heads/{branch}"], cwd=mirror).decode().strip()
+
+        with self.lock:
+            row = self.connection.execute("SELECT commit_sha FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+            indexed = dict(self.connection.execute(
+                "SELECT path, blob_sha FROM files WHERE project_id = ?", (project_id,)).fetchall())
+        if row is not None and row[0] == commit:
+            return 0
+
+        tree = _list_tree(mirror, commit)
+        changed = {path: sha for path, (sha, size) in tree.items() if indexed.get(path) != sha}
+        removed = [path for path in indexed if path not in tree]
+        # Oversized files are recorded without content, so they are not read again until they change
+        readable = sorted({sha for path, sha in changed.items() if tree[path][1] <= MAX_FILE_BYTES})
+        contents = dict(_read_blobs(mirror, readable))
+
+        new_files = []
+        for path, sha in changed.items():
+            content = contents.get(sha)
+            if content is None or b"\0" in content:
+                new_files.append((path, sha, None, ()))
+            else:
+                text = content.decode("utf-8", errors="replace")
+                new_files.append((path, sha, zlib.compress(content), trigrams(text.lower())))
+
+        with self.lock, self.connection:
+            for path in removed + list(changed):
+                self.connection.execute(
+                    "DELETE FROM trigrams WHERE file_id IN (SELECT file_id FROM files WHERE project_id = ? AND path = ?)",
+                    (project_id, path))
+                self.connection.execute("DELETE FROM files WHERE project_id = ? AND path = ?", (project_id, path))
+            for path, sha, compressed, file_trigrams in new_files:
+                file_id = self.connection.execute(
+                    "INSERT INTO files (project_id, path, blob_sha, content) VALUES (?, ?, ?, ?)",
+                    (project_id, path, sha, compressed)).lastrowid
+                self.connection.executemany("INSERT INTO trigrams (trigram, file_id) VALUES (?, ?)",
+                                            [(trigram, file_id) for trigram in file_trigrams])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO projects (project_id, name, web_url, branch, commit_sha) VALUES (?, ?, ?, ?, ?)",
+                (project_id, project['name'], project.get('web_url'), branch, commit))
+        _git(["gc", "--auto", "--quiet"], cwd=mirror)
+        return len(changed)
+
+    def search(self, term, pattern=None):
+        """
+        Yield a result per line containing `term` (and matching the compiled regex `pattern`, if
+        given), in the shape of a blob search result plus 'project_name' and 'web_url'.
+        """
+        needle = term.lower()
+        needle_trigrams = sorted(trigrams(needle))
+        with self.lock:
+            projects = {project_id: (name, web_url) for project_id, name, web_url
+                        in self.connection.execute("SELECT project_id, name, web_url FROM projects")}
+            if needle_trigrams:
+                placeholders = ", ".join("?" * len(needle_trigrams))
+                rows = self.connection.execute(
+                    "SELECT files.project_id, files.path, files.content FROM files JOIN ("
+                    f"  SELECT file_id FROM trigrams WHERE trigram IN ({placeholders})"
+                    "   GROUP BY file_id HAVING COUNT(*) = ?"
+                    ") AS candidates ON candidates.file_id = files.file_id",
+                    (*needle_trigrams, len(needle_trigrams))).fetchall()
+            else:
+                rows = self.connection.execute(
+                    "SELECT project_id, path, content FROM files WHERE content IS NOT NULL").fetchall()
+
+        for project_id, path, content in sorted(rows, key=lambda row: (row[0], row[1])):
+            project_name, web_url = projects.get(project_id, (str(project_id), None))
+            lines = zlib.decompress(content).decode("utf-8", errors="replace").splitlines()
+            for line_number, line in enumerate(lines, start=1):
+                if needle in line.lower() and (pattern is None or pattern.search(line)):
+                    yield {'project_id': project_id, 'project_name': project_name, 'web_url': web_url,
+                           'path': path, 'startline': line_number, 'data': line}
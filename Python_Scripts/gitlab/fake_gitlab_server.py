@@ -0,0 +1,646 @@
+"""
+This script runs a local fake GitLab API server with synthetic pipeline and job data.
+It lets the gitlab scripts in this folder be exercised and benchmarked without a live
+GitLab instance.
+
+The synthetic data is generated deterministically from a seed, so repeated runs
+against the same configuration return identical responses. A fixed latency can be
+injected into every response to mimic a remote instance, a GitLab-style rate limit
+(RateLimit-* headers and 429 with Retry-After) can be enforced, and a fraction of
+requests can fail with 502 to exercise retries.
+
+Besides pipelines and jobs, every project has a small synthetic repository (some files contain
+`SEARCH_TERM`) behind the blob search, raw file, branch, file update and merge request
+endpoints, so the search and find-and-replace scripts run against it too. Project `web_url`s
+point at the server itself. Writes only change the in-memory data of the running server.
+Projects are spread over a tree of `GROUPS` groups (each with up to `GROUP_FANOUT` subgroups),
+and every project and group has `VARIABLES` CI/CD variables, some of whose values contain one
+of `SERVICE_ACCOUNTS`.
+
+Usage:
+1. Run the server: `python fake_gitlab_server.py --pipelines 200 --jobs 10 --latency 0.05`
+2. Point a script at it, e.g. `GITLAB_URL=http://127.0.0.1:8080 python gitlab_pipeline_performance_audit.py`
+"""
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs, unquote
+
+class Config:
+    HOST = "127.0.0.1"      # Interface the fake server listens on
+    PORT = 8080             # Port the fake server listens on (0 picks a free port)
+    PROJECTS = 1            # Number of synthetic projects
+    PIPELINES = 100         # Number of pipelines per project
+    JOBS = 10               # Number of distinct jobs per pipeline
+    RETRY_RATE = 0.1        # Fraction of jobs that get one retried attempt
+    LATENCY = 0.0           # Seconds of latency injected into every response
+    SEED = 42               # Seed for the synthetic data generator
+    RATE_LIMIT = 0          # Requests allowed per rate-limit window (0 disables rate limiting)
+    RATE_WINDOW = 60        # Length of the rate-limit window in seconds
+    ERROR_RATE = 0.0        # Fraction of requests answered with 502 Bad Gateway
+    PIPELINE_INTERVAL = 10  # Minutes between consecutive pipelines of a project
+    FILES = 20              # Number of files in each project's repository
+    MATCH_RATE = 0.2        # Fraction of files that contain SEARCH_TERM (and of variables holding a service account)
+    SEARCH_TERM = "http://old-registry.example.com"  # String planted in the matching files
+    GROUPS = 1              # Number of groups; group 1 is the root, the others form a tree below it
+    GROUP_FANOUT = 3        # Maximum number of direct subgroups per group
+    VARIABLES = 5           # Number of CI/CD variables per project and per group
+
+# Values planted in a MATCH_RATE fraction of the CI/CD variables
+SERVICE_ACCOUNTS = [f"deploy-{index}@example-project.iam.gserviceaccount.com" for index in range(10)]
+
+BRANCHES = ["main", "develop", "feature/login", "feature/search", "release/1.0"]
+STAGES = ["build", "test", "deploy"]
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def _running_seconds(jobs):
+    """
+    Total time at least one job was running, which is how GitLab computes pipeline duration.
+    Retried attempts are not counted.
+    """
+    intervals = sorted((job["started_at"], job["finished_at"]) for job in jobs if not job["retried"])
+    total = 0.0
+    current_start, current_end = intervals[0]
+    for start, end in intervals[1:] + [(None, None)]:
+        if start is None or start > current_end:
+            total += (datetime.strptime(current_end, "%Y-%m-%dT%H:%M:%S.000Z")
+                      - datetime.strptime(current_start, "%Y-%m-%dT%H:%M:%S.000Z")).total_seconds()
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    return total
+
+class FakeGitlabData:
+    """
+    Deterministic synthetic projects, pipelines and jobs.
+    """
+    def __init__(self, projects, pipelines, jobs, retry_rate, seed, pipeline_interval=Config.PIPELINE_INTERVAL,
+                 files=Config.FILES, match_rate=Config.MATCH_RATE, groups=Config.GROUPS,
+                 group_fanout=Config.GROUP_FANOUT, variables=Config.VARIABLES):
+        self.groups = {}
+        self.projects = {}
+        self.pipelines = {}
+        self.jobs = {}
+        self.seed = seed
+        self.files = files
+        self.match_rate = match_rate
+        self.repositories = {}  # {project_id: {branch: {path: content}}}, generated on first access
+        self.variable_count = variables
+        self.variables = {}     # {(kind, ID): [variable]}, generated on first access
+        self.merge_requests = {}
+        self.lock = threading.Lock()
+        rng = random.Random(seed)
+        now = datetime.utcnow()
+        next_job_id = 1
+        for group_id in range(1, groups + 1):
+            parent_id = (group_id - 2) // group_fanout + 1 if group_id > 1 else None
+            full_path = f"{self.groups[parent_id]['full_path']}/sub-{group_id}" if parent_id else "group"
+            self.groups[group_id] = {
+                "id": group_id,
+                "name": "Group" if parent_id is None else f"Subgroup {group_id}",
+                "path": full_path.rsplit("/", 1)[-1],
+                "full_path": full_path,
+                "parent_id": parent_id,
+            }
+        for project_id in range(1, projects + 1):
+            group = self.groups[(project_id - 1) % groups + 1]
+            self.projects[project_id] = {
+                "id": project_id,
+                "name": f"Project {project_id}",
+                "path_with_namespace": f"{group['full_path']}/project-{project_id}",
+                "default_branch": "main",
+                "namespace": {"id": group["id"], "full_path": group["full_path"], "kind": "group"},
+            }
+            project_pipelines = []
+            for index in range(pipelines):
+                pipeline_id = project_id * 1000000 + index + 1
+                created = now - timedelta(minutes=(pipelines - index) * pipeline_interval)
+                pipeline_jobs = []
+                pipeline_start = created + timedelta(seconds=rng.randint(1, 60))
+                stage_start = pipeline_start
+                for stage_index, stage in enumerate(STAGES):
+                    stage_end = stage_start
+                    for job_index in range(stage_index, jobs, len(STAGES)):
+                        attempts = 2 if rng.random() < retry_rate else 1
+                        job_start = stage_start
+                        for attempt in range(attempts):
+                            queued = round(rng.uniform(0.5, 30.0), 2)
+                            duration = round(rng.uniform(10.0, 600.0), 2)
+                            started = job_start + timedelta(seconds=queued)
+                            finished = started + timedelta(seconds=duration)
+                            retried = attempt < attempts - 1
+                            pipeline_jobs.append({
+                                "id": next_job_id,
+                                "name": f"job-{job_index}",
+                                "stage": stage,
+                                "status": "failed" if retried else rng.choice(["success"] * 9 + ["failed"]),
+                                "ref": BRANCHES[index % len(BRANCHES)],
+                                "created_at": _iso(job_start),
+                                "started_at": _iso(started),
+                                "finished_at": _iso(finished),
+                                "duration": duration,
+                                "queued_duration": queued,
+                                "failure_reason": "script_failure" if retried else None,
+                                "retried": retried,
+                                "pipeline": {"id": pipeline_id, "project_id": project_id},
+                            })
+                            next_job_id += 1
+                            job_start = finished
+                        stage_end = max(stage_end, job_start)
+                    stage_start = stage_end
+                finished_at = stage_start
+                pipeline = {
+                    "id": pipeline_id,
+                    "iid": index + 1,
+                    "project_id": project_id,
+                    "ref": BRANCHES[index % len(BRANCHES)],
+                    "status": "failed" if any(job["status"] == "failed" and not job["retried"] for job in pipeline_jobs) else "success",
+                    "created_at": _iso(created),
+                    "updated_at": _iso(finished_at),
+                    "started_at": _iso(pipeline_start),
+                    "finished_at": _iso(finished_at),
+                    "duration": int(_running_seconds(pipeline_jobs)),
+                    "queued_duration": (pipeline_start - created).total_seconds(),
+                    "web_url": f"http://gitlab.local/group/project-{project_id}/-/pipelines/{pipeline_id}",
+                }
+                self.pipelines[pipeline_id] = pipeline
+                self.jobs[pipeline_id] = pipeline_jobs
+                project_pipelines.append(pipeline)
+            # The pipelines endpoint lists newest first
+            self.projects[project_id]["_pipelines"] = list(reversed(project_pipelines))
+
+    def project(self, project_id, base_url):
+        project = self.projects.get(project_id)
+        if project is None:
+            return None
+        payload = {key: value for key, value in project.items() if not key.startswith("_")}
+        payload["web_url"] = f"{base_url}/{project['path_with_namespace']}"
+        payload["http_url_to_repo"] = f"{base_url}/{project['path_with_namespace']}.git"
+        return payload
+
+    def group(self, group_id, base_url):
+        group = self.groups.get(group_id)
+        if group is None:
+            return None
+        return {**group, "web_url": f"{base_url}/groups/{group['full_path']}"}
+
+    def subgroup_ids(self, group_id):
+        return [child_id for child_id, group in self.groups.items() if group["parent_id"] == group_id]
+
+    def descendant_ids(self, group_id):
+        descendants, level = [], self.subgroup_ids(group_id)
+        while level:
+            descendants.extend(level)
+            level = [child_id for parent_id in level for child_id in self.subgroup_ids(parent_id)]
+        return descendants
+
+    def group_project_ids(self, group_ids):
+        group_ids = set(group_ids)
+        return [project_id for project_id, project in sorted(self.projects.items()) if project["namespace"]["id"] in group_ids]
+
+    def owner_variables(self, kind, owner_id):
+        """
+        Return the CI/CD variables of a project or group. The caller must hold `lock`.
+        """
+        key = (kind, owner_id)
+        if key not in self.variables:
+            rng = random.Random(f"{self.seed}-{kind}-{owner_id}")
+            variables = []
+            for index in range(self.variable_count):
+                if rng.random() < self.match_rate:
+                    value = json.dumps({"type": "service_account", "client_email": rng.choice(SERVICE_ACCOUNTS)})
+                else:
+                    value = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(24))
+                variables.append({"variable_type": "env_var", "key": f"{kind.upper()}_VAR_{index}", "value": value,
+                                  "protected": False, "masked": False, "environment_scope": "*"})
+            self.variables[key] = variables
+        return self.variables[key]
+
+    def repository(self, project_id, ref):
+        """
+        Return the files ({path: content}) of a branch, or None if the project or branch does not exist.
+        The caller must hold `lock`.
+        """
+        if project_id not in self.projects:
+            return None
+        if project_id not in self.repositories:
+            rng = random.Random(self.seed * 1000003 + project_id)
+            files = {}
+            for index in range(self.files):
+                path = f"config/service-{index}.yml" if index % 2 else f"src/module_{index}.py"
+                lines = [f"# {path} of project {project_id}"]
+                lines += [f"setting_{line} = {rng.randint(0, 10 ** 6)}" for line in range(rng.randint(5, 40))]
+                if rng.random() < self.match_rate:
+                    lines.insert(rng.randint(1, len(lines)), f"registry_url = \"{Config.SEARCH_TERM}/images\"")
+                files[path] = "\n".join(lines) + "\n"
+            self.repositories[project_id] = {"main": files}
+        return self.repositories[project_id].get(ref)
+
+class FakeGitlabHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive, like a real GitLab instance behind a load balancer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY, keep-alive responses stall on delayed ACKs
+    disable_nagle_algorithm = True
+    data = None
+    latency = 0.0
+    rate_limit = 0
+    rate_window = 60
+    error_rate = 0.0
+    error_rng = None
+    window_start = 0.0
+    window_count = 0
+    request_count = 0
+    throttled_count = 0
+    count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reject_request(self):
+        """
+        Apply the rate limit and error injection; returns True if the request was rejected.
+        """
+        cls = type(self)
+        with self.count_lock:
+            cls.request_count += 1
+            now = time.time()
+            if now - cls.window_start >= cls.rate_window:
+                cls.window_start, cls.window_count = now, 0
+            cls.window_count += 1
+            reset = int(cls.window_start + cls.rate_window)
+            fail = cls.error_rate and cls.error_rng.random() < cls.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if cls.rate_limit:
+            rate_headers = {
+                "RateLimit-Limit": str(cls.rate_limit),
+                "RateLimit-Remaining": str(max(0, cls.rate_limit - cls.window_count)),
+                "RateLimit-Reset": str(reset),
+            }
+            if cls.window_count > cls.rate_limit:
+                with self.count_lock:
+                    cls.throttled_count += 1
+                rate_headers["Retry-After"] = str(max(1, reset - int(time.time())))
+                self._send_json(429, {"message": "Retry later"}, rate_headers)
+                return True
+            self.rate_headers = rate_headers
+        if fail:
+            self._send_json(502, {"message": "502 Bad Gateway"})
+            return True
+        return False
+
+    def _base_url(self):
+        return f"http://{self.headers['Host']}"
+
+    def do_GET(self):
+        self.rate_headers = {}
+        if self._reject_request():
+            return
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        path = parsed.path
+
+        if path == "/api/v4/projects":
+            projects = [self.data.project(project_id, self._base_url()) for project_id in sorted(self.data.projects)]
+            if params.get("pagination") == "keyset":
+                return self._send_keyset_page(path, projects, params)
+            return self._send_page(projects, params)
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)", path)
+        if match:
+            return self._send_object(self.data.project(int(match.group(1)), self._base_url()))
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/search", path)
+        if match and params.get("scope") == "blobs":
+            blobs = self._search_blobs(int(match.group(1)), params.get("search", ""), params.get("ref", "main"))
+            if blobs is None:
+                return self._send_object(None)
+            return self._send_page(blobs, params)
+
+        if path == "/api/v4/search" and params.get("scope") == "blobs":
+            # Instance-level search covers the default branch of every project
+            blobs = []
+            for project_id in sorted(self.data.projects):
+                blobs.extend(self._search_blobs(project_id, params.get("search", ""), "main"))
+            return self._send_page(blobs, params)
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/variables", path)
+        if match:
+            project_id = int(match.group(1))
+            if project_id not in self.data.projects:
+                return self._send_object(None)
+            with self.data.lock:
+                variables = list(self.data.owner_variables("project", project_id))
+            return self._send_page(variables, params)
+
+        match = re.fullmatch(r"/api/v4/groups/(\d+)(/[a-z_]+)?", path)
+        if match:
+            group_id = int(match.group(1))
+            if group_id not in self.data.groups:
+                return self._send_object(None)
+            resource = match.group(2)
+            if resource is None:
+                return self._send_object(self.data.group(group_id, self._base_url()))
+            if resource in ("/subgroups", "/descendant_groups"):
+                child_ids = self.data.subgroup_ids(group_id) if resource == "/subgroups" else self.data.descendant_ids(group_id)
+                return self._send_page([self.data.group(child_id, self._base_url()) for child_id in child_ids], params)
+            group_ids = [group_id]
+            if resource == "/search" or params.get("include_subgroups") == "true":
+                group_ids += self.data.descendant_ids(group_id)
+            if resource == "/projects":
+                projects = [self.data.project(project_id, self._base_url()) for project_id in self.data.group_project_ids(group_ids)]
+                return self._send_page(projects, params)
+            if resource == "/variables":
+                with self.data.lock:
+                    variables = list(self.data.owner_variables("group", group_id))
+                return self._send_page(variables, params)
+            if resource == "/search" and params.get("scope") == "blobs":
+                blobs = []
+                for project_id in self.data.group_project_ids(group_ids):
+                    blobs.extend(self._search_blobs(project_id, params.get("search", ""), "main"))
+                return self._send_page(blobs, params)
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/repository/files/([^/]+)/raw", path)
+        if match:
+            with self.data.lock:
+                files = self.data.repository(int(match.group(1)), params.get("ref", "main"))
+                content = (files or {}).get(unquote(match.group(2)))
+            if content is None:
+                return self._send_object(None)
+            return self._send_body(200, content.encode("utf-8"), "text/plain; charset=utf-8")
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/pipelines", path)
+        if match:
+            project = self.data.projects.get(int(match.group(1)))
+            if project is None:
+                return self._send_object(None)
+            pipelines = project["_pipelines"]
+            updated_after = params.get("updated_after")
+            if updated_after:
+                cutoff = updated_after[:19]
+                pipelines = [pipeline for pipeline in pipelines if pipeline["updated_at"][:19] > cutoff]
+            summaries = [{key: pipeline[key] for key in ("id", "iid", "project_id", "ref", "status", "created_at", "updated_at", "web_url")}
+                         for pipeline in pipelines]
+            return self._send_page(summaries, params)
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/pipelines/(\d+)", path)
+        if match:
+            return self._send_object(self.data.pipelines.get(int(match.group(2))))
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/pipelines/(\d+)/jobs", path)
+        if match:
+            jobs = self.data.jobs.get(int(match.group(2)))
+            if jobs is None:
+                return self._send_object(None)
+            if params.get("include_retried") != "true":
+                jobs = [job for job in jobs if not job["retried"]]
+            # The jobs endpoint lists newest first
+            return self._send_page(sorted(jobs, key=lambda job: job["id"], reverse=True), params)
+
+        return self._send_object(None)
+
+    def _search_blobs(self, project_id, search, ref):
+        """
+        Return a blob search result per matching line, or None if the project or ref does not exist.
+        """
+        search = search.lower()
+        with self.data.lock:
+            files = self.data.repository(project_id, ref)
+            files = dict(files) if files is not None else None
+        if files is None:
+            return None
+        blobs = []
+        for path_name, content in sorted(files.items()):
+            lines = content.splitlines()
+            for line_number, line in enumerate(lines):
+                if search and search in line.lower():
+                    blobs.append({"basename": path_name.rsplit(".", 1)[0], "data": "\n".join(lines[line_number:line_number + 3]),
+                                  "path": path_name, "filename": path_name, "id": None, "ref": ref,
+                                  "startline": line_number + 1, "project_id": project_id})
+        return blobs
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def do_POST(self):
+        self.rate_headers = {}
+        payload = self._read_json()
+        if self._reject_request():
+            return
+        if payload is None:
+            return self._send_json(400, {"message": "400 Bad request - malformed JSON"})
+        path = urlparse(self.path).path
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/repository/branches", path)
+        if match:
+            project_id = int(match.group(1))
+            with self.data.lock:
+                source = self.data.repository(project_id, payload.get("ref", "main"))
+                if source is None:
+                    return self._send_object(None)
+                branches = self.data.repositories[project_id]
+                if payload.get("branch") in branches:
+                    return self._send_json(400, {"message": "Branch already exists"})
+                branches[payload.get("branch")] = dict(source)
+            return self._send_json(201, {"name": payload.get("branch"), "merged": False, "protected": False})
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/repository/commits", path)
+        if match:
+            return self._create_commit(int(match.group(1)), payload)
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/merge_requests", path)
+        if match:
+            project_id = int(match.group(1))
+            with self.data.lock:
+                if self.data.repository(project_id, payload.get("source_branch")) is None:
+                    return self._send_object(None)
+                merge_requests = self.data.merge_requests.setdefault(project_id, [])
+                merge_request = {"iid": len(merge_requests) + 1, "project_id": project_id, "state": "opened",
+                                 **{key: payload.get(key) for key in ("title", "source_branch", "target_branch")}}
+                merge_requests.append(merge_request)
+            merge_request["web_url"] = (f"{self._base_url()}/{self.data.projects[project_id]['path_with_namespace']}"
+                                        f"/-/merge_requests/{merge_request['iid']}")
+            return self._send_json(201, merge_request)
+
+        return self._send_object(None)
+
+    def _create_commit(self, project_id, payload):
+        """
+        Apply all file actions of a commit atomically, creating the branch from start_branch if needed.
+        """
+        branch, actions = payload.get("branch"), payload.get("actions") or []
+        with self.data.lock:
+            if self.data.repository(project_id, "main") is None:
+                return self._send_object(None)
+            branches = self.data.repositories[project_id]
+            files = branches.get(branch)
+            if files is None:
+                source = branches.get(payload.get("start_branch"))
+                if source is None:
+                    return self._send_json(400, {"message": "You can only create or edit files when you are on a branch"})
+                files = dict(source)
+            updated = dict(files)
+            for action in actions:
+                file_path = action.get("file_path")
+                exists = file_path in updated
+                if action.get("action") in ("update", "delete") and not exists:
+                    return self._send_json(400, {"message": f"A file with this name doesn't exist: {file_path}"})
+                if action.get("action") == "create" and exists:
+                    return self._send_json(400, {"message": f"A file with this name already exists: {file_path}"})
+                if action.get("action") == "delete":
+                    del updated[file_path]
+                elif action.get("action") in ("create", "update"):
+                    updated[file_path] = action.get("content", "")
+                else:
+                    return self._send_json(400, {"message": f"Unknown action {action.get('action')}"})
+            branches[branch] = updated
+        commit_id = f"{random.getrandbits(160):040x}"
+        return self._send_json(201, {"id": commit_id, "short_id": commit_id[:8], "title": payload.get("commit_message", "").split("\n")[0],
+                                     "message": payload.get("commit_message", ""), "stats": {"total": len(actions)}})
+
+    def do_PUT(self):
+        self.rate_headers = {}
+        payload = self._read_json()
+        if self._reject_request():
+            return
+        if payload is None:
+            return self._send_json(400, {"message": "400 Bad request - malformed JSON"})
+        path = urlparse(self.path).path
+
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/repository/files/([^/]+)", path)
+        if match:
+            file_path = unquote(match.group(2))
+            with self.data.lock:
+                files = self.data.repository(int(match.group(1)), payload.get("branch"))
+                if files is None or file_path not in files:
+                    return self._send_json(400, {"message": "A file with this name doesn't exist"})
+                files[file_path] = payload.get("content", "")
+            return self._send_json(200, {"file_path": file_path, "branch": payload.get("branch")})
+
+        return self._send_object(None)
+
+    def _send_page(self, items, params):
+        per_page = min(int(params.get("per_page", 20)), 100)
+        page = int(params.get("page", 1))
+        start = (page - 1) * per_page
+        total_pages = max(1, -(-len(items) // per_page))
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total": str(len(items)),
+            "X-Total-Pages": str(total_pages),
+            "X-Next-Page": str(page + 1) if page < total_pages else "",
+        }
+        if page < total_pages:
+            headers["Link"] = self._link(urlparse(self.path).path, {**params, "page": page + 1})
+        self._send_json(200, items[start:start + per_page], headers)
+
+    def _send_keyset_page(self, path, items, params):
+        # Keyset pagination (order_by=id, sort=asc) only advertises the next page in the Link header
+        per_page = min(int(params.get("per_page", 20)), 100)
+        id_after = int(params.get("id_after", 0))
+        remaining = [item for item in items if item["id"] > id_after]
+        page_items = remaining[:per_page]
+        headers = {}
+        if len(remaining) > per_page:
+            headers["Link"] = self._link(path, {**params, "id_after": page_items[-1]["id"]})
+        self._send_json(200, page_items, headers)
+
+    def _link(self, path, params):
+        return f'<http://{self.headers["Host"]}{path}?{urlencode(params)}>; rel="next"'
+
+    def _send_object(self, obj):
+        if obj is None:
+            self._send_json(404, {"message": "404 Not Found"})
+        else:
+            self._send_json(200, obj)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send_body(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in {**getattr(self, "rate_headers", {}), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_server(host=Config.HOST, port=Config.PORT, projects=Config.PROJECTS, pipelines=Config.PIPELINES,
+                 jobs=Config.JOBS, retry_rate=Config.RETRY_RATE, latency=Config.LATENCY, seed=Config.SEED,
+                 rate_limit=Config.RATE_LIMIT, rate_window=Config.RATE_WINDOW, error_rate=Config.ERROR_RATE,
+                 pipeline_interval=Config.PIPELINE_INTERVAL, files=Config.FILES, match_rate=Config.MATCH_RATE,
+                 groups=Config.GROUPS, group_fanout=Config.GROUP_FANOUT, variables=Config.VARIABLES):
+    """
+    Start the fake server on a background thread.
+    Returns the server; its base URL is f"http://{host}:{server.server_address[1]}".
+    """
+    handler = type("ConfiguredFakeGitlabHandler", (FakeGitlabHandler,), {
+        "data": FakeGitlabData(projects, pipelines, jobs, retry_rate, seed, pipeline_interval, files, match_rate,
+                               groups, group_fanout, variables),
+        "latency": latency,
+        "rate_limit": rate_limit,
+        "rate_window": rate_window,
+        "error_rate": error_rate,
+        "error_rng": random.Random(seed),
+        "window_start": time.time(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def server_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+def run_script():
+    parser = argparse.ArgumentParser(description="Run a local fake GitLab API server.")
+    parser.add_argument("--host", default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument("--projects", type=int, default=Config.PROJECTS)
+    parser.add_argument("--pipelines", type=int, default=Config.PIPELINES)
+    parser.add_argument("--jobs", type=int, default=Config.JOBS)
+    parser.add_argument("--retry-rate", type=float, default=Config.RETRY_RATE)
+    parser.add_argument("--latency", type=float, default=Config.LATENCY)
+    parser.add_argument("--seed", type=int, default=Config.SEED)
+    parser.add_argument("--rate-limit", type=int, default=Config.RATE_LIMIT)
+    parser.add_argument("--rate-window", type=float, default=Config.RATE_WINDOW)
+    parser.add_argument("--error-rate", type=float, default=Config.ERROR_RATE)
+    parser.add_argument("--pipeline-interval", type=float, default=Config.PIPELINE_INTERVAL)
+    parser.add_argument("--files", type=int, default=Config.FILES)
+    parser.add_argument("--match-rate", type=float, default=Config.MATCH_RATE)
+    parser.add_argument("--groups", type=int, default=Config.GROUPS)
+    parser.add_argument("--group-fanout", type=int, default=Config.GROUP_FANOUT)
+    parser.add_argument("--variables", type=int, default=Config.VARIABLES)
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.projects, args.pipelines, args.jobs,
+                          args.retry_rate, args.latency, args.seed, args.rate_limit, args.rate_window, args.error_rate,
+                          args.pipeline_interval, args.files, args.match_rate, args.groups, args.group_fanout, args.variables)
+    print(f"Fake GitLab API listening on {server_url(server)} "
+          f"({args.projects} projects, {args.pipelines} pipelines each, {args.jobs} jobs per pipeline)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    run_script()
@@ -5,19 +5,51 @@ the term is found.
 
 Configuration parameters such as GitLab URL, access token, and search term are
 centralized in a Config class for easy modification.
+
+Project pages are streamed into a pool of Config.MAX_WORKERS threads as they are listed, so
+searching starts with the first page, and each project's results are written as soon as its
+search finishes (in completion order). With Config.SEARCH_SCOPE set to "group" or "instance",
+one paginated `/groups/:id/search` or `/search` blob search replaces the per-project searches;
+these endpoints need advanced search (Elasticsearch/OpenSearch) enabled on the instance.
+
+Config.SEARCH_TERM and every term in Config.SEARCH_TERMS are searched in the same pass over
+the projects, and every search follows all result pages. The search API only matches literal
+terms, so Config.SEARCH_REGEX, if set, is applied locally to the matched snippets: the terms
+narrow the search server side and the regex keeps the matches it accepts.
+
+With Config.SEARCH_SCOPE = "index", the search runs over a local index instead of the search
+API (see code_index.py): each project's default branch is fetched into a mirror under
+Config.INDEX_DIR (needs `git`), only changed projects and files are re-indexed, and the terms
+are then looked up locally. With Config.INDEX_SYNC = False, the existing index is searched
+without contacting GitLab at all.
 """
 import requests
-import time
 import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
+from code_index import CodeIndex, CodeIndexError
+from gitlab_client import Paginator, RateLimiter, create_session, request_with_retry
+from run_profile import RunProfile
+
 class Config:
     GITLAB_URL = "YOUR_GITLAB_URL"                            # Base URL of the GitLab instance (e.g., "https://gitlab.com")
     ACCESS_TOKEN = "YOUR_ACCESS_TOKEN"                        # Personal Access Token for GitLab API authentication (e.g., "glpat-xxxxxxxxxxxxxxxxx")
     REQUEST_TIMEOUT = 20                                      # Timeout for API requests in seconds
     RETRY_LIMIT = 3                                           # Number of times to retry a failed API request
+    MAX_REQUESTS_PER_SECOND = None                            # Optional ceiling on the API request rate (None = adapt to the instance's rate-limit headers)
+    PROFILE_PATH = None                                       # Optional JSON file for the run profile (requests per endpoint, phase timings)
     LOG_FILE = os.path.join(os.getcwd(), "find-results.txt")  # Path to the log file where results will be logged
     SEARCH_TERM = "YOUR_SEARCH_TERM"                          # The specific term to search for within GitLab project files (e.g., "terraform@lc-terraform-admin.iam.gserviceaccount.com")
+    SEARCH_TERMS = []                                         # Further terms searched in the same pass over the projects (e.g., a list of leaked identifiers)
+    SEARCH_REGEX = None                                       # Optional regular expression that matched snippets must also match (e.g., r"terraform@[\w-]+\.iam")
+    MAX_WORKERS = 8                                           # Number of projects searched concurrently (1 = serial)
+    SEARCH_SCOPE = "projects"                                 # "projects" (one search per project), "group" (Config.GROUP_ID), "instance" or "index" (local mirrors)
+    GROUP_ID = None                                           # ID or URL-encoded path of the group searched with SEARCH_SCOPE = "group"
+    INDEX_DIR = os.path.join(os.getcwd(), "gitlab_code_index")  # Mirrors and index used with SEARCH_SCOPE = "index"
+    INDEX_SYNC = True                                         # Fetch and re-index changed projects before an index search (False = search the index as is)
+    GIT_TIMEOUT = 600                                         # Timeout in seconds for fetching one project's mirror
 
 # Helper function to write both to console and log file
 def write_output(message):
@@ -29,81 +61,243 @@ def write_output(message):
         print(f"Error writing to log file {Config.LOG_FILE}: {e}")
 
 class GitlabAPI:
-    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit):
+    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit, max_rate=None):
         self.gitlab_url = gitlab_url
-        self.headers = {"Private-Token": access_token}
+        self.session = create_session(access_token)
+        self.rate_limiter = RateLimiter(max_rate)
+        self.profile = RunProfile()
         self.request_timeout = request_timeout
         self.retry_limit = retry_limit
 
     def _make_request(self, method, url, **kwargs):
-        retries = 0
-        while retries < self.retry_limit:
-            try:
-                response = requests.request(method, url, timeout=self.request_timeout, headers=self.headers, **kwargs)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.Timeout:
-                write_output(f"Request to {url} timed out. Retrying... ({retries + 1}/{self.retry_limit})")
-                retries += 1
-                time.sleep(5)
-            except requests.exceptions.RequestException as e:
-                write_output(f"Error with request to {url}: {e}")
-                break
-        return None
+        def log_retry(attempt, delay, reason):
+            write_output(f"Request to {url} failed ({reason}). Retrying in {delay:.1f}s... ({attempt}/{self.retry_limit})")
 
-    def get_all_projects(self):
-        projects = []
-        page = 1
-        while True:
-            url = f"{self.gitlab_url}/api/v4/projects?membership=true&per_page=100&page={page}"
-            response = self._make_request("GET", url)
-            if not response:
-                break
-            response_data = response.json()
-            if not response_data:
-                break
-
-            projects.extend(response_data)
-            write_output(f"Fetched page {page}, total projects so far: {len(projects)}")
-            page += 1
-        return projects
+        try:
+            return request_with_retry(self.session, method, url, self.rate_limiter, self.retry_limit,
+                                      on_retry=log_retry, profile=self.profile, timeout=self.request_timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            write_output(f"Error with request to {url}: {e}")
+            return None
 
-    def search_blobs(self, project_id, search_term):
-        search_url = f"{self.gitlab_url}/api/v4/projects/{project_id}/search?scope=blobs&search={search_term}"
-        response = self._make_request("GET", search_url)
+    def _get_page(self, url, params=None):
+        return self._make_request("GET", url, params=params)
+
+    def iter_projects(self):
+        """
+        Yield projects page by page as they are listed.
+        """
+        project_count = 0
+        url = f"{self.gitlab_url}/api/v4/projects"
+        # Keyset pagination keeps deep pages fast on instances with thousands of projects
+        for page, response_data in enumerate(Paginator(self._get_page, url, {"membership": "true"}, keyset=True, profile=self.profile), start=1):
+            project_count += len(response_data)
+            write_output(f"Fetched page {page}, total projects so far: {project_count}")
+            yield from response_data
+
+    def get_project(self, project_id):
+        response = self._make_request("GET", f"{self.gitlab_url}/api/v4/projects/{project_id}")
         if response:
             return response.json()
-        return []
+        return None
+
+    def search_blobs(self, project_id, search_term):
+        """
+        Return (results, complete): every blob search result of a term in a project, following
+        all pages, and whether the last page was reached. On a failed page, the results read so far.
+        """
+        url = f"{self.gitlab_url}/api/v4/projects/{project_id}/search"
+        results = []
+        paginator = Paginator(self._get_page, url, {"scope": "blobs", "search": search_term}, prefetch=False, profile=self.profile)
+        for page in paginator:
+            results.extend(page)
+        return results, paginator.complete
+
+    def iter_scoped_blob_pages(self, search_term, scope, group_id=None):
+        """
+        Yield pages of a group- or instance-level blob search; reports an error if a page fails.
+        """
+        if scope == "group":
+            url = f"{self.gitlab_url}/api/v4/groups/{group_id}/search"
+        else:
+            url = f"{self.gitlab_url}/api/v4/search"
+        paginator = Paginator(self._get_page, url, {"scope": "blobs", "search": search_term}, profile=self.profile)
+        yield from paginator
+        if not paginator.complete:
+            write_output(f"Error: Could not fetch all search results for '{search_term}' "
+                         f"(read {paginator.pages} pages); the results above are incomplete")
+
+def get_search_terms():
+    """
+    Return the configured search terms without duplicates, in configuration order.
+    """
+    return [term for term in dict.fromkeys([Config.SEARCH_TERM, *Config.SEARCH_TERMS]) if term]
 
-# Search for the specified term in all projects
-def search_for_term_in_projects(gitlab_api, projects, search_term):
-    for project in projects:
-        project_id = project['id']
+def filter_matches(results, pattern):
+    """
+    Keep the search results whose snippet matches the compiled regex `pattern` (all if None).
+    """
+    if pattern is None:
+        return results
+    return [result for result in results if pattern.search(result.get('data') or "")]
+
+def search_projects_concurrently(gitlab_api, projects, search_terms, max_workers, pattern=None):
+    """
+    Search each project from the `projects` iterable for every term on a pool of `max_workers`
+    threads and yield (project, {term: search results}, [terms whose search is incomplete]) as the
+    searches finish. At most twice `max_workers` projects are queued ahead, so the project listing
+    streams in as searches complete.
+    """
+    def search(project):
+        results_by_term, incomplete_terms = {}, []
+        for term in search_terms:
+            results, complete = gitlab_api.search_blobs(project['id'], term)
+            results_by_term[term] = filter_matches(results, pattern)
+            if not complete:
+                incomplete_terms.append(term)
+        return project, results_by_term, incomplete_terms
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for project in projects:
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(search, project))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def format_match(term, project_name, result, multiple_terms):
+    location = f"{result.get('path')}:{result['startline']}" if result.get('startline') else result.get('path')
+    if multiple_terms:
+        return f"Found '{term}' in {project_name}: {location}"
+    return f"Found in {project_name}: {location}"
+
+# Search for the specified terms in all projects
+def search_for_terms_in_projects(gitlab_api, projects, search_terms, max_workers=1, pattern=None):
+    """
+    Search every project and write its results as they arrive; returns the number of projects searched.
+    """
+    project_count = 0
+    for project, results_by_term, incomplete_terms in search_projects_concurrently(gitlab_api, projects, search_terms,
+                                                                                  max_workers, pattern):
+        project_count += 1
         project_name = project['name']
-        project_url = project['web_url']
-        
-        write_output(f"\nSearching in project: {project_name} ({project_url})")
-        
-        search_results = gitlab_api.search_blobs(project_id, search_term)
-        
-        if not search_results:
-            write_output(f"No occurrences found in {project_name}")
-            continue
-        
-        for result in search_results:
-            file_path = result.get('path')
-            write_output(f"Found in {project_name}: {file_path}")
+        lines = [f"\nSearching in project: {project_name} ({project['web_url']})"]
+        for term, search_results in results_by_term.items():
+            for result in search_results:
+                lines.append(format_match(term, project_name, result, len(search_terms) > 1))
+        for term in incomplete_terms:
+            lines.append(f"Error: Could not fetch all search results for '{term}' in {project_name}; "
+                         "the results above are incomplete")
+        if len(lines) == 1:
+            lines.append(f"No occurrences found in {project_name}")
+        # One write per project keeps its lines together
+        write_output("\n".join(lines))
+    return project_count
+
+def search_for_terms_in_scope(gitlab_api, search_terms, scope, group_id=None, pattern=None):
+    """
+    Run one group- or instance-level blob search per term and write the results page by page;
+    returns the number of matches.
+    """
+    project_names = {}
+    match_count = 0
+    for term in search_terms:
+        for page in gitlab_api.iter_scoped_blob_pages(term, scope, group_id):
+            for result in filter_matches(page, pattern):
+                project_id = result.get('project_id')
+                if project_id not in project_names:
+                    project = gitlab_api.get_project(project_id)
+                    project_names[project_id] = project['name'] if project else str(project_id)
+                write_output(format_match(term, project_names[project_id], result, len(search_terms) > 1))
+                match_count += 1
+    return match_count
+
+def sync_code_index(code_index, projects, access_token, max_workers):
+    """
+    Fetch and re-index every project from the `projects` iterable on `max_workers` threads;
+    returns the number of projects that were up to date, re-indexed, and failed.
+    """
+    def sync(project):
+        try:
+            return project, code_index.sync_project(project, access_token, Config.GIT_TIMEOUT), None
+        except CodeIndexError as e:
+            return project, None, e
+
+    counts = {"up to date": 0, "re-indexed": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for project, changed_files, error in executor.map(sync, projects):
+            if error is not None:
+                counts["failed"] += 1
+                write_output(f"Failed to index {project['name']}: {error}")
+            elif changed_files:
+                counts["re-indexed"] += 1
+                write_output(f"Indexed {changed_files} changed files in {project['name']}")
+            elif changed_files == 0:
+                counts["up to date"] += 1
+    return counts
+
+def search_for_terms_in_index(code_index, search_terms, pattern=None):
+    """
+    Look the terms up in the local index and write the results; returns the number of matches.
+    """
+    match_count = 0
+    for term in search_terms:
+        for result in code_index.search(term, pattern):
+            write_output(format_match(term, result['project_name'], result, len(search_terms) > 1))
+            match_count += 1
+    return match_count
 
 def run_script():
     write_output("Starting the script...\n")
     
-    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT)
+    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT,
+                           Config.MAX_REQUESTS_PER_SECOND)
 
-    projects = gitlab_api.get_all_projects()
-    write_output(f"Total projects found: {len(projects)}")
-    
-    search_for_term_in_projects(gitlab_api, projects, Config.SEARCH_TERM)
+    if Config.SEARCH_SCOPE not in ("projects", "group", "instance", "index") or (Config.SEARCH_SCOPE == "group" and not Config.GROUP_ID):
+        write_output(f"Invalid search scope '{Config.SEARCH_SCOPE}': use 'projects', 'instance', 'index' or 'group' with a GROUP_ID")
+        return
+
+    search_terms = get_search_terms()
+    try:
+        pattern = re.compile(Config.SEARCH_REGEX) if Config.SEARCH_REGEX else None
+    except re.error as e:
+        write_output(f"Invalid search regex '{Config.SEARCH_REGEX}': {e}")
+        return
+    write_output(f"Searching for {len(search_terms)} term(s): {', '.join(search_terms)}"
+                 + (f", matching regex {Config.SEARCH_REGEX}" if pattern else ""))
+
+    if Config.SEARCH_SCOPE == "index":
+        code_index = CodeIndex(Config.INDEX_DIR)
+        try:
+            if Config.INDEX_SYNC:
+                with gitlab_api.profile.phase("sync index"):
+                    counts = sync_code_index(code_index, gitlab_api.iter_projects(), Config.ACCESS_TOKEN, Config.MAX_WORKERS)
+                write_output("Index sync: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+            with gitlab_api.profile.phase("search"):
+                match_count = search_for_terms_in_index(code_index, search_terms, pattern)
+        finally:
+            code_index.close()
+        write_output(f"Total matches found: {match_count}")
+    elif Config.SEARCH_SCOPE in ("group", "instance"):
+        with gitlab_api.profile.phase("search"):
+            match_count = search_for_terms_in_scope(gitlab_api, search_terms, Config.SEARCH_SCOPE, Config.GROUP_ID, pattern)
+        write_output(f"Total matches found: {match_count}")
+    else:
+        # Listing and searching overlap, so both count towards the search phase
+        with gitlab_api.profile.phase("search"):
+            project_count = search_for_terms_in_projects(gitlab_api, gitlab_api.iter_projects(), search_terms,
+                                                         Config.MAX_WORKERS, pattern)
+        write_output(f"Total projects searched: {project_count}")
     write_output("\nScript execution completed.")
+    write_output(gitlab_api.profile.summary())
+    if Config.PROFILE_PATH:
+        gitlab_api.profile.write_json(Config.PROFILE_PATH)
+        write_output(f"Run profile saved to {Config.PROFILE_PATH}")
 
 if __name__ == "__main__":
     if not os.path.exists(Config.LOG_FILE):
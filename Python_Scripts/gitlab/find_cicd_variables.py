@@ -5,20 +5,46 @@ GitLab group. It logs the projects and variables where the service account is fo
 
 Configuration parameters such as GitLab URL, access token, search term, and
 the target GitLab group ID are centralized in a Config class for easy modification.
+
+The group tree is walked breadth first, fetching the projects and subgroups of every group
+of a level concurrently. Projects (and, with Config.SCAN_GROUP_VARIABLES, the groups
+themselves) are fed into a pool of Config.MAX_WORKERS threads that fetch their variables
+while the traversal continues; each project's or group's results are written as one block
+as soon as its scan finishes.
+
+Group projects, subgroups and variables are read page by page until the last page (the next
+page is prefetched while the current one is processed), so large groups are not truncated.
+
+Config.SEARCH_TERM and the terms of Config.SEARCH_TERMS_FILE (one per line) are matched against
+every variable value in a single pass with an Aho-Corasick automaton (see term_matcher.py), so
+auditing hundreds of identifiers costs one sweep of the API. The run ends with a report of
+where each term was found.
 """
 import requests
-import time
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
+from collections import defaultdict
+
+from gitlab_client import DEFAULT_POOL_SIZE, Paginator, RateLimiter, create_session, request_with_retry
+from run_profile import RunProfile
+from term_matcher import TermMatcher, load_terms
+
 class Config:
     GITLAB_URL = "YOUR_GITLAB_URL"                       # Base URL of the GitLab instance (e.g., "https://gitlab.com")
     ACCESS_TOKEN = "YOUR_ACCESS_TOKEN"                   # Personal Access Token for GitLab API authentication (e.g., "glpat-xxxxxxxxxxxxxxxxx")
-    SEARCH_TERM = "YOUR_GCP_SERVICE_ACCOUNT_EMAIL"       # The GCP service account email to search for (e.g., "terraform@lc-terraform-admin.iam.gserviceaccount.com")
-    GROUP_ID = YOUR_GROUP_ID                             # The ID of the GitLab group to search within (e.g., 95194212)
+    SEARCH_TERM = "YOUR_GCP_SERVICE_ACCOUNT_EMAIL"       # The GCP service account email to search for (e.g., "terraform@lc-terraform-admin.iam.gserviceaccount.com"; "" to only use the terms file)
+    SEARCH_TERMS_FILE = None                             # Optional file with further terms to search for, one per line ("#" starts a comment line)
+    IGNORE_CASE = False                                  # Match terms case-insensitively
+    GROUP_ID = "YOUR_GROUP_ID"                           # The ID of the GitLab group to search within (e.g., 95194212)
     LOG_FILE = os.path.join(os.getcwd(), "results.txt")  # Path to the log file where results will be logged
     REQUEST_TIMEOUT = 20                                 # Timeout for API requests in seconds
     RETRY_LIMIT = 3                                      # Number of times to retry a failed API request
+    MAX_REQUESTS_PER_SECOND = None                       # Optional ceiling on the API request rate (None = adapt to the instance's rate-limit headers)
+    PROFILE_PATH = None                                  # Optional JSON file for the run profile (requests per endpoint, phase timings)
+    MAX_WORKERS = 8                                      # Number of concurrent requests for the group traversal and for the variable scan
+    SCAN_GROUP_VARIABLES = True                          # Also scan the CI/CD variables of the group and every subgroup
 
 # Helper function to write both to console and log file
 def write_output(message):
@@ -30,97 +56,183 @@ def write_output(message):
         print(f"Error writing to log file {Config.LOG_FILE}: {e}")
 
 class GitlabAPI:
-    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit):
+    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit, max_rate=None, pool_size=DEFAULT_POOL_SIZE):
         self.gitlab_url = gitlab_url
-        self.headers = {"Private-Token": access_token}
+        self.session = create_session(access_token, pool_size)
+        self.rate_limiter = RateLimiter(max_rate)
+        self.profile = RunProfile()
         self.request_timeout = request_timeout
         self.retry_limit = retry_limit
 
     def _make_request(self, method, url, **kwargs):
-        retries = 0
-        while retries < self.retry_limit:
-            try:
-                response = requests.request(method, url, timeout=self.request_timeout, headers=self.headers, **kwargs)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.Timeout:
-                write_output(f"Request to {url} timed out. Retrying... ({retries + 1}/{self.retry_limit})")
-                retries += 1
-                time.sleep(5)
-            except requests.exceptions.RequestException as e:
-                write_output(f"Error with request to {url}: {e}")
-                break
-        return None
+        def log_retry(attempt, delay, reason):
+            write_output(f"Request to {url} failed ({reason}). Retrying in {delay:.1f}s... ({attempt}/{self.retry_limit})")
 
-    def get_all_projects_in_group(self, group_id, all_projects=None):
-        if all_projects is None:
-            all_projects = []
-
-        # Get all projects for the group
-        url = f"{self.gitlab_url}/api/v4/groups/{group_id}/projects?include_subgroups=false"
-        response = self._make_request("GET", url)
-        if not response:
-            write_output(f"Error: Could not fetch projects for group {group_id}")
-            return all_projects
-
-        projects = response.json()
-        write_output(f"Fetched {len(projects)} projects from group {group_id}")
-        for project in projects:
-            all_projects.append(project)
-
-        # Get all subgroups for the group
-        url = f"{self.gitlab_url}/api/v4/groups/{group_id}/subgroups"
-        response = self._make_request("GET", url)
-        if not response:
-            write_output(f"Error: Could not fetch subgroups for group {group_id}")
-            return all_projects
-
-        subgroups = response.json()
-        write_output(f"Found {len(subgroups)} subgroups in group {group_id}")
-        for subgroup in subgroups:
-            # Recursively call get_all_projects for each subgroup
-            self.get_all_projects_in_group(subgroup['id'], all_projects)
-
-        return all_projects
-
-    def search_cicd_variables(self, project_id, search_term):
-        variables_url = f"{self.gitlab_url}/api/v4/projects/{project_id}/variables"
-        response = self._make_request("GET", variables_url)
+        try:
+            return request_with_retry(self.session, method, url, self.rate_limiter, self.retry_limit,
+                                      on_retry=log_retry, profile=self.profile, timeout=self.request_timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            write_output(f"Error with request to {url}: {e}")
+            return None
+
+    def _get_page(self, url, params=None):
+        return self._make_request("GET", url, params=params)
+
+    def _get_list(self, url, description, params=None):
+        """
+        Return the items of every page of a list endpoint; on a failed page, the items read so far.
+        """
+        paginator = Paginator(self._get_page, url, params, profile=self.profile)
+        items = list(paginator.items())
+        if not paginator.complete:
+            write_output(f"Error: Could not fetch all {description} (read {len(items)} in {paginator.pages} pages)")
+        return items
+
+    def get_group(self, group_id):
+        response = self._make_request("GET", f"{self.gitlab_url}/api/v4/groups/{group_id}")
         if response:
             return response.json()
-        return []
-
-def find_gcp_account_in_projects(gitlab_api, projects, search_term):
-    for project in projects:
-        project_id = project['id']
-        project_name = project['name']
-        project_url = project['web_url']
-
-        write_output(f"\nSearching CI/CD variables in project: {project_name} ({project_url})")
+        return None
 
-        variables = gitlab_api.search_cicd_variables(project_id, search_term)
+    def get_group_projects(self, group_id):
+        url = f"{self.gitlab_url}/api/v4/groups/{group_id}/projects"
+        return self._get_list(url, f"projects for group {group_id}", {"include_subgroups": "false"})
 
-        found = False
+    def get_subgroups(self, group_id):
+        url = f"{self.gitlab_url}/api/v4/groups/{group_id}/subgroups"
+        return self._get_list(url, f"subgroups for group {group_id}")
+
+    def get_variables(self, kind, owner_id):
+        """
+        Return the CI/CD variables of a project or group (`kind` "projects" or "groups").
+        """
+        url = f"{self.gitlab_url}/api/v4/{kind}/{owner_id}/variables"
+        return self._get_list(url, f"CI/CD variables for {kind[:-1]} {owner_id}")
+
+def iter_group_tree(gitlab_api, root_group, max_workers):
+    """
+    Walk a group and its subgroups breadth first and yield (group, projects) per group.
+    The projects and subgroups of all groups of a level are fetched concurrently.
+    """
+    def fetch_group(group):
+        return group, gitlab_api.get_group_projects(group['id']), gitlab_api.get_subgroups(group['id'])
+
+    level = [root_group]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            next_level = []
+            for group, projects, subgroups in executor.map(fetch_group, level):
+                write_output(f"Fetched {len(projects)} projects and {len(subgroups)} subgroups from group {group['id']}")
+                yield group, projects
+                next_level.extend(subgroups)
+            level = next_level
+
+def iter_scan_targets(gitlab_api, root_group, max_workers, scan_groups):
+    """
+    Yield ("groups", group) and ("projects", project) targets as the group tree is walked.
+    """
+    for group, projects in iter_group_tree(gitlab_api, root_group, max_workers):
+        if scan_groups:
+            yield "groups", group
+        for project in projects:
+            yield "projects", project
+
+def scan_concurrently(gitlab_api, targets, max_workers):
+    """
+    Fetch the variables of each (kind, owner) target on `max_workers` threads and yield
+    (kind, owner, variables) as the fetches finish. At most twice `max_workers` targets are
+    queued ahead, so the traversal producing `targets` keeps running alongside.
+    """
+    def scan(target):
+        kind, owner = target
+        return kind, owner, gitlab_api.get_variables(kind, owner['id'])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for target in targets:
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(scan, target))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def find_terms_in_variables(gitlab_api, targets, matcher, max_workers=1):
+    """
+    Scan the variables of every target for the matcher's terms and write the results as they arrive.
+    Returns (number of projects and groups scanned, {term: ["<project|group> <name>: <variable key>"]}).
+    """
+    counts = {"projects": 0, "groups": 0}
+    hits = defaultdict(list)
+    multiple_terms = len(matcher.terms) > 1
+    for kind, owner, variables in scan_concurrently(gitlab_api, targets, max_workers):
+        counts[kind] += 1
+        label = "project" if kind == "projects" else "group"
+        owner_name = owner.get('full_path') if kind == "groups" else owner['name']
+        lines = [f"\nSearching CI/CD variables in {label}: {owner_name} ({owner.get('web_url')})"]
         for variable in variables:
-            if search_term in variable['value']:
-                write_output(f"Found in project {project_name}, variable {variable['key']}: {variable['value']}")
-                found = True
-
-        if not found:
-            write_output(f"No occurrences found in CI/CD variables of {project_name}")
+            for term in matcher.matching_terms(variable.get('value') or ""):
+                hits[term].append(f"{label} {owner_name}: {variable['key']}")
+                found = f"Found '{term}'" if multiple_terms else "Found"
+                lines.append(f"{found} in {label} {owner_name}, variable {variable['key']}: {variable['value']}")
+        if len(lines) == 1:
+            lines.append(f"No occurrences found in CI/CD variables of {owner_name}")
+        # One write per project or group keeps its lines together
+        write_output("\n".join(lines))
+    return counts, hits
+
+def write_term_report(terms, hits):
+    """
+    Write where each term was found, then the number of terms that were not found anywhere.
+    """
+    write_output(f"\nTerms found: {len(hits)} of {len(terms)}")
+    for term in terms:
+        if term in hits:
+            write_output(f"'{term}' found in {len(hits[term])} variable(s): {', '.join(hits[term])}")
+    if len(hits) < len(terms):
+        write_output(f"{len(terms) - len(hits)} term(s) not found in any variable")
 
 def run_script():
     write_output("Starting the script...\n")
 
-    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT)
-
-    all_projects = gitlab_api.get_all_projects_in_group(Config.GROUP_ID)
-
-    write_output(f"Total projects found: {len(all_projects)}")
+    # Traversal and scan workers may each have a page prefetch in flight
+    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT,
+                           Config.MAX_REQUESTS_PER_SECOND, pool_size=max(4 * Config.MAX_WORKERS, DEFAULT_POOL_SIZE))
 
-    find_gcp_account_in_projects(gitlab_api, all_projects, Config.SEARCH_TERM)
+    terms = [Config.SEARCH_TERM] if Config.SEARCH_TERM else []
+    if Config.SEARCH_TERMS_FILE:
+        try:
+            terms += load_terms(Config.SEARCH_TERMS_FILE)
+        except IOError as e:
+            write_output(f"Error reading search terms file {Config.SEARCH_TERMS_FILE}: {e}")
+            return
+    matcher = TermMatcher(terms, ignore_case=Config.IGNORE_CASE)
+    if not matcher.terms:
+        write_output("Error: No search terms configured")
+        return
+    write_output(f"Searching CI/CD variables for {len(matcher.terms)} term(s)")
+
+    root_group = gitlab_api.get_group(Config.GROUP_ID)
+    if root_group is None:
+        write_output(f"Error: Could not fetch group {Config.GROUP_ID}")
+        return
+
+    # The traversal feeds the scan, so both count towards the scan phase
+    with gitlab_api.profile.phase("scan variables"):
+        targets = iter_scan_targets(gitlab_api, root_group, Config.MAX_WORKERS, Config.SCAN_GROUP_VARIABLES)
+        counts, hits = find_terms_in_variables(gitlab_api, targets, matcher, Config.MAX_WORKERS)
+
+    write_output(f"Total projects scanned: {counts['projects']}, groups scanned: {counts['groups']}")
+    write_term_report(matcher.terms, hits)
 
     write_output("\nScript execution completed.")
+    write_output(gitlab_api.profile.summary())
+    if Config.PROFILE_PATH:
+        gitlab_api.profile.write_json(Config.PROFILE_PATH)
+        write_output(f"Run profile saved to {Config.PROFILE_PATH}")
 
 if __name__ == "__main__":
     if not os.path.exists(Config.LOG_FILE):
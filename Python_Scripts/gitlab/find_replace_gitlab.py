@@ -6,17 +6,36 @@ progress to a file. Includes logging, error handling, and retry logic.
 
 Configuration parameters such as GitLab URL, access token, search/replacement terms,
 and project namespace are centralized in a Config class for easy modification.
+
+Projects are processed on Config.MAX_WORKERS threads. Each project's log output is collected
+while it is processed and written in one block, in project order, once it is done, so the log
+reads as if the projects ran one after another. The `PROCESSED:` marker is written to the log
+as soon as a project is done, ahead of its output, so an interrupted run never loses it.
+On interrupt, queued projects are cancelled and the output of those already done is written. An error in one project is logged and leaves
+it unmarked (so a rerun retries it) without stopping the others.
+
+With Config.BATCH_COMMIT (the default), all updated files of a project go into one commit
+created through the Commits API, which also creates the branch (`start_branch`). That is a
+single write call instead of a branch creation plus one commit per file. No branch is created
+for a project whose matches need no change. Set it to False for one commit per file.
 """
 import requests
-import time
+import contextvars
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from gitlab_client import Paginator, RateLimiter, create_session, request_with_retry
+from run_profile import RunProfile
+
 class Config:
     GITLAB_URL = "YOUR_GITLAB_URL"                   # Base URL of the GitLab instance (e.g., "https://gitlab.com") (string value)
     ACCESS_TOKEN = "YOUR_ACCESS_TOKEN"               # Personal Access Token for GitLab API authentication (e.g., "glpat-xxxxxxxxxxxxxxxxx") (string value)
     REQUEST_TIMEOUT = 20                             # Timeout for API requests in seconds (integer value)
     RETRY_LIMIT = 3                                  # Number of times to retry a failed API request (integer value)
+    MAX_REQUESTS_PER_SECOND = None                   # Optional ceiling on the API request rate (None = adapt to the instance's rate-limit headers) (float or None)
+    PROFILE_PATH = None                              # Optional JSON file for the run profile (requests per endpoint, phase timings)
     LOG_FILE = os.path.join(os.getcwd(), "log.txt")  # Path to the log file and final log file output name (string value)
     SEARCH_TERM = "SEARCH_TERM_VALUE"                # The string to search for in project files
     REPLACEMENT_TERM = "REPLACEMENT_TERM_VALUE"      # The string to replace the search term with
@@ -24,70 +43,75 @@ class Config:
     BRANCH_PREFIX = "BRANCH_NAME"                    # Prefix for the new branch name created for changes
     COMMIT_MESSAGE = "COMMIT_MESSAGE"                # Commit message for the changes
     MERGE_REQUEST_TITLE = "MERGE_REQUEST_TITLE"      # Title for the created merge request
+    MAX_WORKERS = 8                                  # Number of projects processed concurrently (1 = serial)
+    BATCH_COMMIT = True                              # One commit with all changed files per project (False = one commit per file)
 
-# Helper function to write both to console and log file
-def write_output(message):
+# Output lines of the project processed in the current context, written once the project is done
+project_output = contextvars.ContextVar("project_output", default=None)
+log_lock = threading.Lock()
+
+def write_log(message):
     print(message)
     try:
-        with open(Config.LOG_FILE, "a") as output_file_handle:
+        with log_lock, open(Config.LOG_FILE, "a") as output_file_handle:
             output_file_handle.write(message + "\n")
     except IOError as e:
         print(f"Error writing to log file {Config.LOG_FILE}: {e}")
 
+# Helper function to write both to console and log file
+def write_output(message):
+    buffer = project_output.get()
+    if buffer is not None:
+        buffer.append(message)
+        return
+    write_log(message)
+
 # Check if a project has already been processed
 def is_project_processed(project_name):
     try:
         with open(Config.LOG_FILE, "r") as log:
             for line in log:
-                if line.startswith(f"PROCESSED: {project_name}"):
+                if line.rstrip("\n") == f"PROCESSED: {project_name}":
                     return True
     except FileNotFoundError:
         return False
     return False
 
-# Mark a project as processed
+# Mark a project as processed, straight away rather than with the project's buffered output
 def mark_project_processed(project_name):
-    write_output(f"PROCESSED: {project_name}")
+    write_log(f"PROCESSED: {project_name}")
 
 class GitlabAPI:
-    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit):
+    def __init__(self, gitlab_url, access_token, request_timeout, retry_limit, max_rate=None):
         self.gitlab_url = gitlab_url
-        self.headers = {"Private-Token": access_token}
+        self.session = create_session(access_token)
+        self.rate_limiter = RateLimiter(max_rate)
+        self.profile = RunProfile()
         self.request_timeout = request_timeout
         self.retry_limit = retry_limit
 
     def _make_request(self, method, url, **kwargs):
-        retries = 0
-        while retries < self.retry_limit:
-            try:
-                response = requests.request(method, url, timeout=self.request_timeout, headers=self.headers, **kwargs)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.Timeout:
-                write_output(f"Request to {url} timed out. Retrying... ({retries + 1}/{self.retry_limit})")
-                retries += 1
-                time.sleep(5)
-            except requests.exceptions.RequestException as e:
-                write_output(f"Error with request to {url}: {e}")
-                break
-        return None
+        def log_retry(attempt, delay, reason):
+            write_output(f"Request to {url} failed ({reason}). Retrying in {delay:.1f}s... ({attempt}/{self.retry_limit})")
+
+        try:
+            return request_with_retry(self.session, method, url, self.rate_limiter, self.retry_limit,
+                                      on_retry=log_retry, profile=self.profile, timeout=self.request_timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            write_output(f"Error with request to {url}: {e}")
+            return None
+
+    def _get_page(self, url, params=None):
+        return self._make_request("GET", url, params=params)
 
     def get_all_projects(self, target_namespace):
         projects = []
-        page = 1
-        while True:
-            url = f"{self.gitlab_url}/api/v4/projects?membership=true&per_page=100&page={page}"
-            response = self._make_request("GET", url)
-            if not response:
-                break
-            response_data = response.json()
-            if not response_data:
-                break
-
+        url = f"{self.gitlab_url}/api/v4/projects"
+        # Keyset pagination keeps deep pages fast on instances with thousands of projects
+        for page, response_data in enumerate(Paginator(self._get_page, url, {"membership": "true"}, keyset=True, profile=self.profile), start=1):
             filtered_projects = [project for project in response_data if project['web_url'].startswith(f"{self.gitlab_url}{target_namespace}")]
             projects.extend(filtered_projects)
             write_output(f"Fetched page {page}, total '{target_namespace}' projects so far: {len(projects)}")
-            page += 1
         return projects
 
     def get_default_branch(self, project_id):
@@ -116,6 +140,22 @@ class GitlabAPI:
         response = self._make_request("PUT", url, json=data)
         return response is not None
 
+    def create_commit(self, project_id, branch_name, actions, commit_message, start_branch=None):
+        """
+        Create one commit applying several file `actions` (dicts with "action", "file_path"
+        and "content"). With `start_branch`, `branch_name` is created from it in the same call.
+        """
+        url = f"{self.gitlab_url}/api/v4/projects/{project_id}/repository/commits"
+        data = {
+            "branch": branch_name,
+            "commit_message": commit_message,
+            "actions": actions
+        }
+        if start_branch:
+            data["start_branch"] = start_branch
+        response = self._make_request("POST", url, json=data)
+        return response is not None
+
     def open_merge_request(self, project_id, source_branch, target_branch, title):
         url = f"{self.gitlab_url}/api/v4/projects/{project_id}/merge_requests"
         data = {
@@ -162,6 +202,14 @@ def process_project(gitlab_api, project, search_term, replacement_term):
     
     write_output(f"Processing project: {project_name} on branch {default_branch}")
     
+    if Config.BATCH_COMMIT:
+        changes_made = commit_project_changes(gitlab_api, project, search_results, search_term, replacement_term,
+                                              default_branch, new_branch_name)
+        if changes_made is None:
+            return
+        finish_project(gitlab_api, project, changes_made, default_branch, new_branch_name)
+        return
+
     if not gitlab_api.create_branch(project_id, new_branch_name, default_branch):
         write_output(f"Failed to create branch '{new_branch_name}' for project {project_name}")
         return
@@ -181,29 +229,102 @@ def process_project(gitlab_api, project, search_term, replacement_term):
                 write_output(f"Committed changes to {file_path} on branch {new_branch_name}")
                 changes_made = True
     
+    finish_project(gitlab_api, project, changes_made, default_branch, new_branch_name)
+
+def commit_project_changes(gitlab_api, project, search_results, search_term, replacement_term, default_branch, new_branch_name):
+    """
+    Commit every file that changes in one commit on a new branch created from `default_branch`.
+    Returns whether a commit was made, or None if the commit failed.
+    """
+    actions = []
+    # The search returns one result per matching line, so a file can appear several times
+    for file_path in dict.fromkeys(result.get('path') for result in search_results):
+        file_content = gitlab_api.get_raw_file_content(project['id'], file_path, default_branch)
+        if not file_content:
+            continue
+        updated_content = file_content.replace(search_term, replacement_term)
+        if updated_content != file_content:
+            actions.append({"action": "update", "file_path": file_path, "content": updated_content})
+
+    if not actions:
+        return False
+    commit_message = f"{Config.COMMIT_MESSAGE} in {len(actions)} file(s)"
+    if not gitlab_api.create_commit(project['id'], new_branch_name, actions, commit_message, start_branch=default_branch):
+        write_output(f"Failed to commit changes on branch '{new_branch_name}' for project {project['name']}")
+        return None
+    for action in actions:
+        write_output(f"Committed changes to {action['file_path']} on branch {new_branch_name}")
+    return True
+
+def finish_project(gitlab_api, project, changes_made, default_branch, new_branch_name):
+    """
+    Open the merge request if changes were committed, and mark the project as processed.
+    """
+    project_name = project['name']
     if changes_made:
-        if gitlab_api.open_merge_request(project_id, new_branch_name, default_branch, Config.MERGE_REQUEST_TITLE):
+        if gitlab_api.open_merge_request(project['id'], new_branch_name, default_branch, Config.MERGE_REQUEST_TITLE):
             write_output(f"Merge request created for project: {project_name}")
     else:
         write_output(f"No changes were committed for project: {project_name}")
 
     mark_project_processed(project_name)
 
-# Search for and replace hardcoded URL in the default branch
-def search_and_replace_in_projects(gitlab_api, projects, search_term, replacement_term):
-    for project in projects:
+def process_project_isolated(gitlab_api, project, search_term, replacement_term):
+    """
+    Process a project, collecting its output instead of writing it; returns the output lines.
+    Unexpected errors are logged to the project's output rather than raised.
+    """
+    lines = []
+    project_output.set(lines)
+    try:
         process_project(gitlab_api, project, search_term, replacement_term)
+    except Exception as e:
+        write_output(f"Error processing project {project['name']}: {e}")
+    return lines
+
+# Search for and replace hardcoded URL in the default branch
+def search_and_replace_in_projects(gitlab_api, projects, search_term, replacement_term, max_workers=1):
+    def run(project):
+        # A fresh context per project keeps its output buffer apart from other projects on the same thread
+        return contextvars.copy_context().run(process_project_isolated, gitlab_api, project, search_term, replacement_term)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(run, project) for project in projects]
+    written = 0
+    try:
+        for future in futures:
+            lines = future.result()
+            written += 1
+            if lines:
+                write_output("\n".join(lines))
+    except KeyboardInterrupt:
+        write_output("Interrupted, cancelling the remaining projects...")
+        # Projects already running finish (and mark themselves processed); queued ones never start
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures[written:]:
+            if future.done() and not future.cancelled() and future.result():
+                write_output("\n".join(future.result()))
+        raise
+    executor.shutdown()
 
 def run_script():
     write_output("Starting the script...\n")
     
-    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT)
+    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.ACCESS_TOKEN, Config.REQUEST_TIMEOUT, Config.RETRY_LIMIT,
+                           Config.MAX_REQUESTS_PER_SECOND)
 
-    projects = gitlab_api.get_all_projects(Config.TARGET_NAMESPACE)
+    with gitlab_api.profile.phase("list projects"):
+        projects = gitlab_api.get_all_projects(Config.TARGET_NAMESPACE)
     write_output(f"Total '{Config.TARGET_NAMESPACE}' namespace projects found: {len(projects)}")
 
-    search_and_replace_in_projects(gitlab_api, projects, Config.SEARCH_TERM, Config.REPLACEMENT_TERM)
+    with gitlab_api.profile.phase("process projects"):
+        search_and_replace_in_projects(gitlab_api, projects, Config.SEARCH_TERM, Config.REPLACEMENT_TERM,
+                                       Config.MAX_WORKERS)
     write_output("\nScript execution completed.")
+    write_output(gitlab_api.profile.summary())
+    if Config.PROFILE_PATH:
+        gitlab_api.profile.write_json(Config.PROFILE_PATH)
+        write_output(f"Run profile saved to {Config.PROFILE_PATH}")
 
 if __name__ == "__main__":
     if not os.path.exists(Config.LOG_FILE):
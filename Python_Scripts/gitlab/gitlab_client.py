@@ -0,0 +1,386 @@
+"""
+Shared helpers for talking to the GitLab REST API from the gitlab scripts in this folder.
+
+HTTP session:
+- `create_session` builds one `requests.Session` per script with a connection pool sized
+  for its concurrency. Connections are kept alive and reused, so the TCP and TLS handshake
+  is paid once per pooled connection instead of once per request, and gzip responses
+  are accepted.
+
+Record and replay:
+- With `GITLAB_RECORD_PATH` set (or `record_path` given), `create_session` saves every API
+  response to a JSON Lines fixture file. With `GITLAB_REPLAY_PATH` set, the session answers
+  from such a file instead of the network, so a script can be rerun offline and reproducibly.
+  Responses are matched on method, path and query (not host); time-dependent filters such as
+  `updated_after` are ignored when no exact match exists. Repeated requests replay their
+  recorded responses in order. Unrecorded requests get a 404.
+
+Rate limiting and retries:
+- `RateLimiter` is a token bucket shared by every thread of a script. It reads GitLab's
+  `RateLimit-Remaining` / `RateLimit-Reset` headers and slows down to what the remaining
+  quota allows until the window resets. On a 429 it pauses all threads for `Retry-After`
+  and halves its rate, then ramps back up additively as requests succeed. The aggregate
+  request rate, and so the useful concurrency, follows what the instance sustains.
+- `request_with_retry` sends a request through the limiter and retries idempotent
+  requests (GET/HEAD) on timeouts, connection errors, 429 and 5xx responses with jittered
+  exponential backoff.
+- Both accept an optional `RunProfile` (see run_profile.py) that records every request attempt,
+  its latency, size and retries, and the time spent parsing pages.
+
+Pagination:
+- `Paginator` walks a list endpoint page by page. It follows the `Link: rel="next"` header
+  (used by keyset pagination) or the `X-Next-Page` header, so it stops on the last page
+  instead of requesting an extra empty page. When neither header is present it falls back
+  to stopping on a short page.
+- With keyset pagination enabled (supported by e.g. `/projects`), GitLab serves each page
+  by ID instead of by offset, which stays fast for large listings.
+- The next page is prefetched on a background thread while the caller processes the
+  current one.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_PER_PAGE = 100
+DEFAULT_POOL_SIZE = 16
+DEFAULT_MAX_RETRIES = 3
+BACKOFF_BASE = 1.0          # Seconds before the first retry (doubled on every further retry)
+BACKOFF_MAX = 60.0          # Upper bound on a single backoff delay in seconds
+MIN_RATE = 0.5              # Requests per second the limiter never throttles below
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+VOLATILE_PARAMS = {"updated_after", "updated_before", "created_after", "created_before"}
+# Headers describing the transfer, not the (decoded) body that fixtures store
+TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+def _fixture_keys(method, url):
+    """
+    Return (exact, loose) lookup keys of a request; the loose key drops time-dependent filters.
+    """
+    parts = urlsplit(url)
+    params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    exact = f"{method.upper()} {parts.path}?{urlencode(params)}"
+    loose = f"{method.upper()} {parts.path}?{urlencode([param for param in params if param[0] not in VOLATILE_PARAMS])}"
+    return exact, loose
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Transport adapter that appends every response to a JSON Lines fixture file.
+    """
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        record = {
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "headers": {name: value for name, value in response.headers.items() if name.lower() not in TRANSFER_HEADERS},
+            "body": response.content.decode("utf-8", errors="surrogateescape"),
+        }
+        with self.lock, open(self.path, "a") as fixture_file:
+            fixture_file.write(json.dumps(record) + "\n")
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter that answers requests from a fixture file written by RecordingAdapter.
+    """
+    def __init__(self, path):
+        super().__init__()
+        self.records = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        with open(path) as fixture_file:
+            for line in fixture_file:
+                if line.strip():
+                    record = json.loads(line)
+                    for key in dict.fromkeys(_fixture_keys(record["method"], record["url"])):
+                        self.records.setdefault(key, []).append(record)
+
+    def send(self, request, **kwargs):
+        exact, loose = _fixture_keys(request.method, request.url)
+        key = exact if exact in self.records else loose
+        with self.lock:
+            records = self.records.get(key)
+            if records:
+                # Serve recorded responses in order, then keep repeating the last one
+                position = self.positions.get(key, 0)
+                self.positions[key] = position + 1
+                record = records[min(position, len(records) - 1)]
+            else:
+                record = None
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if record is None:
+            response.status_code = 404
+            response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+            response._content = json.dumps({"message": f"404 Not recorded: {exact}"}).encode("utf-8")
+        else:
+            response.status_code = record["status"]
+            response.headers = CaseInsensitiveDict(record["headers"])
+            response._content = record["body"].encode("utf-8", errors="surrogateescape")
+        response.reason = HTTPStatus(response.status_code).phrase
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+def create_session(access_token, pool_size=DEFAULT_POOL_SIZE, record_path=None, replay_path=None):
+    """
+    Create an authenticated session whose connection pool can serve `pool_size`
+    concurrent requests without opening new connections.
+    `record_path` / `replay_path` (defaulting to the GITLAB_RECORD_PATH / GITLAB_REPLAY_PATH
+    environment variables) record responses to, or replay them from, a fixture file.
+    """
+    record_path = record_path or os.getenv("GITLAB_RECORD_PATH")
+    replay_path = replay_path or os.getenv("GITLAB_REPLAY_PATH")
+    session = requests.Session()
+    if replay_path:
+        adapter = ReplayAdapter(replay_path)
+    elif record_path:
+        adapter = RecordingAdapter(record_path, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Private-Token": access_token,
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+def _retry_after_seconds(response):
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class RateLimiter:
+    """
+    Thread-safe token bucket that adapts its rate to GitLab's rate-limit headers.
+    `max_rate` (requests per second) is a fixed ceiling; None means no ceiling until the
+    instance reports a limit or answers with 429.
+    """
+    def __init__(self, max_rate=None):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    if self.rate is None:
+                        self._record(now)
+                        return
+                    self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        self._record(now)
+                        return
+                    wait = (1.0 - self.tokens) / self.rate
+                else:
+                    wait = self.blocked_until - now
+            time.sleep(wait)
+
+    def _record(self, now):
+        # Requests sent during the last second, used to estimate the current rate on a 429
+        self.recent.append(now)
+        while self.recent and self.recent[0] < now - 1.0:
+            self.recent.popleft()
+
+    def update(self, response):
+        """
+        Adapt the rate to a response's rate-limit headers and status.
+        """
+        headers = response.headers
+        with self.lock:
+            now = time.monotonic()
+            remaining = headers.get("RateLimit-Remaining")
+            reset = headers.get("RateLimit-Reset")
+            if remaining is not None and reset is not None:
+                seconds_to_reset = max(float(reset) - time.time(), 1.0)
+                if int(remaining) <= 0:
+                    self.blocked_until = max(self.blocked_until, now + seconds_to_reset)
+                # Spread the remaining quota evenly over the rest of the window
+                sustainable = max(MIN_RATE, int(remaining) / seconds_to_reset)
+                self.rate = sustainable if self.max_rate is None else min(self.max_rate, sustainable)
+            elif response.status_code == 429:
+                # Multiplicative decrease from the rate actually observed
+                observed = self.rate if self.rate is not None else max(float(len(self.recent)), 2 * MIN_RATE)
+                self.rate = max(MIN_RATE, observed / 2)
+            elif self.rate is not None and response.status_code < 400:
+                # Additive increase: about one request per second more for every second of success
+                self.rate += 1.0 / self.rate
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+
+            if response.status_code == 429:
+                retry_after = _retry_after_seconds(response)
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+
+def request_with_retry(session, method, url, rate_limiter=None, max_retries=DEFAULT_MAX_RETRIES,
+                       on_retry=None, profile=None, **kwargs):
+    """
+    Send a request and return the response, raising `requests.RequestException` on failure.
+
+    Idempotent requests are retried up to `max_retries` times on timeouts, connection errors,
+    429 and 5xx responses, waiting for Retry-After or a jittered exponential backoff.
+    `on_retry(attempt, delay, reason)` is called before each retry, e.g. for logging.
+    Each attempt is recorded in `profile` if one is given.
+    """
+    retryable = method.upper() in IDEMPOTENT_METHODS
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if profile is not None:
+                profile.record_request(url, time.perf_counter() - started, error=e)
+            if not retryable or attempt >= max_retries:
+                raise
+            reason, retry_after = str(e), None
+        else:
+            if profile is not None:
+                profile.record_request(url, time.perf_counter() - started, response.status_code, len(response.content))
+            if rate_limiter is not None:
+                rate_limiter.update(response)
+            if response.status_code not in RETRYABLE_STATUSES or not retryable or attempt >= max_retries:
+                response.raise_for_status()
+                return response
+            reason, retry_after = f"HTTP {response.status_code}", _retry_after_seconds(response)
+
+        # Full jitter spreads out threads that failed together; never retry before Retry-After
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        attempt += 1
+        if profile is not None:
+            profile.record_retry(url)
+        if on_retry is not None:
+            on_retry(attempt, delay, reason)
+        time.sleep(delay)
+
+class Paginator:
+    """
+    Iterate over the pages of a GitLab list endpoint, yielding the items of each page.
+
+    `request(url, params)` performs a GET and returns the response, or None on failure
+    (it may also raise). After iteration, `complete` tells whether the last page was reached.
+    With a `profile`, the time spent parsing pages is recorded as its `json` phase.
+    """
+    def __init__(self, request, url, params=None, keyset=False, prefetch=True, per_page=DEFAULT_PER_PAGE,
+                 profile=None):
+        self.request = request
+        self.profile = profile
+        self.url = url
+        self.params = dict(params or {})
+        self.params.setdefault("per_page", per_page)
+        self.keyset = keyset
+        if keyset:
+            self.params.update({"pagination": "keyset", "order_by": "id", "sort": "asc"})
+        self.prefetch = prefetch
+        self.complete = False
+        self.pages = 0
+
+    def _next_request(self, response, url, params, item_count):
+        """
+        Work out the (url, params) of the page after `response`, or None if it was the last one.
+        """
+        next_link = response.links.get("next", {}).get("url")
+        if next_link:
+            # The link already carries every query parameter, including the keyset cursor
+            return next_link, None
+        if self.keyset:
+            # Keyset pagination marks the last page by leaving out the link
+            return None
+        next_page = response.headers.get("X-Next-Page")
+        if next_page is not None:
+            if not next_page.strip():
+                return None
+            return url, {**(params or {}), "page": next_page}
+        # No pagination headers: only a full page can have a successor
+        if item_count < int(self.params["per_page"]):
+            return None
+        current_page = int((params or {}).get("page", 1))
+        return url, {**(params or {}), "page": current_page + 1}
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            url, params = self.url, dict(self.params)
+            pending = None
+            while True:
+                response = pending.result() if pending else self.request(url, params)
+                pending = None
+                if response is None:
+                    return
+                if self.profile is not None:
+                    with self.profile.phase("json"):
+                        items = response.json()
+                else:
+                    items = response.json()
+                self.pages += 1
+                next_request = self._next_request(response, url, params, len(items))
+                if next_request is None:
+                    self.complete = True
+                else:
+                    url, params = next_request
+                    if executor:
+                        # Run in a copy of the caller's context so context variables (e.g. loggers) carry over
+                        pending = executor.submit(contextvars.copy_context().run, self.request, url, params)
+                if items:
+                    yield items
+                if next_request is None:
+                    return
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def items(self):
+        """
+        Iterate over the individual items across all pages.
+        """
+        for page_items in self:
+            yield from page_items
@@ -7,11 +7,27 @@ and generates a detailed report for each project.
 
 Key features include:
 - Analysis of pipeline runtimes grouped by branch.
-- Analysis of individual job durations (slowest, fastest, average).
+- Analysis of individual job durations (slowest, fastest, average, p50/p90/p99),
+  computed with streaming aggregators in memory proportional to the number of job names.
 - Analysis of job retries and calculation of pipeline reliability rates.
-- Analysis of the duration added by retried jobs.
-- Output of results to a dedicated text file for each project.
+- Analysis of the duration added by retried jobs, per job and per failure reason.
+- Critical path and queue time analysis: each pipeline's job timeline is reconstructed to find
+  the chain of jobs that determined its runtime, how much of it was spent waiting rather than
+  running, each stage's parallelism and runner queue latency percentiles.
+- Output of results to a dedicated text file for each project, and optionally as JSON Lines,
+  CSV and Prometheus/OpenMetrics files streamed from the same stats (see report_writers.py).
+- Parallel auditing of several projects, each with its own log file, plus a combined
+  cross-project summary report.
+- Local SQLite cache of finished pipelines and jobs, so repeated runs only fetch what changed.
+- Per-day or per-week trend rollups persisted locally (see trend_rollups.py), reported with
+  week-over-week (or day-over-day) regressions. Each run only computes the newest buckets.
 - Logging of progress and errors to both console and a log file.
+- A run profile at the end of each run: requests, bytes, retries and latency percentiles per
+  API endpoint, cache hit rates, and time spent fetching, parsing, analyzing and writing
+  (see run_profile.py).
+- An exporter (daemon) mode that keeps the API session and job store warm, polls for pipelines
+  updated since the last poll, and serves the metrics on a local HTTP `/metrics` endpoint in
+  Prometheus/OpenMetrics format.
 
 Configuration:
 - `GITLAB_URL`: The base URL of your GitLab instance.
@@ -21,11 +37,58 @@ Configuration:
   expected to be provided via the `GITLAB_ACCESS_TOKEN` environment variable.
   Ensure this token has `api` scope.
 - `DAYS_AGO`: The number of past days from which to fetch pipeline data.
+- `PROJECT_WORKERS`: The number of projects audited in parallel, optionally provided via
+  the `GITLAB_PROJECT_WORKERS` environment variable (default 1). When several projects are
+  given, a combined summary is written to `combined_pipeline_stats_summary.txt`.
+- `MAX_WORKERS`: The number of concurrent API requests used when fetching per-pipeline
+  details and jobs, optionally provided via the `GITLAB_MAX_WORKERS` environment variable
+  (default 8). Set it to 1 to fetch serially.
+- `CACHE_PATH`: Path of the local pipeline/job cache, optionally provided via the
+  `GITLAB_CACHE_PATH` environment variable (default `gitlab_pipeline_cache.sqlite`).
+  Set it to an empty string to disable caching.
+- `MAX_REQUESTS_PER_SECOND`: Optional ceiling on the API request rate, provided via the
+  `GITLAB_MAX_REQUESTS_PER_SECOND` environment variable. Without it the rate adapts to the
+  instance's rate-limit headers only. GET requests are retried on 429, 5xx and timeouts.
+- `DURATION_SOURCE`: Where pipeline runtimes come from, optionally provided via the
+  `GITLAB_DURATION_SOURCE` environment variable. `jobs` (default) derives each pipeline's
+  duration from the already-fetched job timestamps and needs no extra requests;
+  `details` fetches every pipeline's details as before.
+- `ANALYSIS_BACKEND`: `python` (default) or `pandas`, optionally provided via the
+  `GITLAB_ANALYSIS_BACKEND` environment variable. `pandas` runs the job duration, retry
+  and retry duration analyses as vectorized group-bys over a columnar job table
+  (see job_dataset.py; requires pandas).
+- `EXPORT_DATASET`: Set the `GITLAB_EXPORT_DATASET` environment variable to `true` to also
+  write each project's job table to `<project>_pipeline_jobs.parquet` (requires pandas
+  and pyarrow), which `python job_dataset.py <file>` re-analyzes offline.
+- `OUTPUT_FORMATS`: Comma-separated machine-readable formats written next to the text report,
+  optionally provided via the `GITLAB_OUTPUT_FORMATS` environment variable: `jsonl`
+  (`<project>_pipeline_stats.jsonl`), `csv` (`<project>_pipeline_stats_<section>.csv`) and
+  `openmetrics` (`<project>_pipeline_stats.prom`). Empty by default.
+- `TRENDS_PATH`: Path of the local trend rollup store, optionally provided via the
+  `GITLAB_TRENDS_PATH` environment variable (default `gitlab_pipeline_trends.sqlite`).
+  Set it to an empty string to disable trend reporting.
+- `TREND_BUCKET`: `week` (default) or `day`, via `GITLAB_TREND_BUCKET`; `TREND_BUCKETS`: the
+  number of buckets shown in the report, via `GITLAB_TREND_BUCKETS` (default 12);
+  `TREND_REGRESSION_PCT`: the slowdown in percent reported as a regression between the last
+  two complete buckets, via `GITLAB_TREND_REGRESSION_PCT` (default 20).
+
+- `PROFILE_PATH`: Optional path of a JSON file the run profile is also saved to, provided via
+  the `GITLAB_PROFILE_PATH` environment variable.
+- `METRICS_PORT`: Set the `GITLAB_METRICS_PORT` environment variable to run as an exporter
+  serving `http://<GITLAB_METRICS_HOST>:<port>/metrics` (host default 127.0.0.1) instead of
+  writing reports. `POLL_INTERVAL`: seconds between polls, via `GITLAB_POLL_INTERVAL`
+  (default 300). Each poll only lists pipelines updated since the newest one already seen,
+  fetches the jobs of new or changed pipelines, drops pipelines older than `DAYS_AGO`, and
+  recomputes the aggregates from the in-memory job store.
+- `GITLAB_RECORD_PATH` / `GITLAB_REPLAY_PATH`: Record every API response to a fixture file, or
+  rerun offline from one (see gitlab_client.py). Disable the pipeline cache when recording,
+  so the fixture holds every request.
 
 Usage:
 1. Set the `GITLAB_PROJECT_IDS` environment variable with your project IDs (e.g., "123,456,789").
 2. Set the `GITLAB_ACCESS_TOKEN` environment variable with your GitLab Private Access Token. (requires at least read api access)
 3. Run the script: `python gitlab_pipeline_performance_audit.py`
+   (or `GITLAB_METRICS_PORT=9185 python gitlab_pipeline_performance_audit.py` for the exporter)
 """
 
 import requests
@@ -33,11 +96,26 @@ import logging
 import re
 import sys
 import os
-from datetime import datetime, timedelta
+import itertools
+import bisect
+import contextvars
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 
+from gitlab_client import Paginator, RateLimiter, create_session, request_with_retry
+from job_stats import DurationStats
+from pipeline_cache import PipelineCache, refresh_pipelines
+from report_writers import OpenMetricsWriter, open_writers
+from run_profile import RunProfile
+from trend_rollups import TrendStore, bucket_start, bucket_summaries, find_regressions, update_trends
+
 # GitLab API configuration
-GITLAB_URL = "https://gitlab.com"
+GITLAB_URL = os.getenv("GITLAB_URL", "https://gitlab.com")
 
 # Retrieve project IDs and access token from environment variables
 # PROJECT_IDS should be a comma-separated string (e.g., "123,456,789")
@@ -52,49 +130,116 @@ if not ACCESS_TOKEN:
     logging.error("Environment variable GITLAB_ACCESS_TOKEN not set. Please set your GitLab Private Access Token.")
     sys.exit(1)
 
-# Headers for the API requests
-headers = {
-    "Private-Token": ACCESS_TOKEN
-}
-
 # Calculate date range (default 30 days)
 DAYS_AGO = 30
-days_ago = datetime.now() - timedelta(days=DAYS_AGO)
+days_ago = datetime.now(timezone.utc) - timedelta(days=DAYS_AGO)
 days_ago_iso = days_ago.isoformat()
 
-# Global logging handler to be set once
-file_handler = None
+# Number of concurrent API requests for per-pipeline fetches (1 = serial)
+MAX_WORKERS = int(os.getenv("GITLAB_MAX_WORKERS", "8"))
 
-def setup_logging(project_name_sanitized):
+# Number of projects audited in parallel (1 = one after another)
+PROJECT_WORKERS = int(os.getenv("GITLAB_PROJECT_WORKERS", "1"))
+
+# Shared HTTP session for all API requests, with one pooled connection per worker
+# plus one for each worker's page prefetch, for every project audited in parallel
+session = create_session(ACCESS_TOKEN, pool_size=max(2 * MAX_WORKERS * PROJECT_WORKERS, 2))
+
+# Adaptive rate limiting and retry policy shared by all API requests
+MAX_REQUESTS_PER_SECOND = float(os.getenv("GITLAB_MAX_REQUESTS_PER_SECOND", "0")) or None
+rate_limiter = RateLimiter(MAX_REQUESTS_PER_SECOND)
+REQUEST_TIMEOUT = 30
+RETRY_LIMIT = 3
+
+# Request, cache and phase timings of this run, optionally saved as JSON
+PROFILE_PATH = os.getenv("GITLAB_PROFILE_PATH")
+run_profile = RunProfile()
+
+# Source of pipeline durations for the runtime analysis: "jobs" or "details"
+DURATION_SOURCE = os.getenv("GITLAB_DURATION_SOURCE", "jobs")
+
+# Analysis backend ("python" or "pandas") and optional Parquet export of the job table
+ANALYSIS_BACKEND = os.getenv("GITLAB_ANALYSIS_BACKEND", "python")
+EXPORT_DATASET = os.getenv("GITLAB_EXPORT_DATASET", "").lower() in ("1", "true", "yes")
+if ANALYSIS_BACKEND == "pandas" or EXPORT_DATASET:
+    # Only the columnar backend and the Parquet export load job_dataset (and pandas)
+    import job_dataset
+
+# Machine-readable output formats written next to the text report ("jsonl", "csv", "openmetrics")
+OUTPUT_FORMATS = [name.strip() for name in os.getenv("GITLAB_OUTPUT_FORMATS", "").split(',') if name.strip()]
+
+# Exporter mode: serve metrics on this port instead of writing reports (0 = batch mode)
+METRICS_PORT = int(os.getenv("GITLAB_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("GITLAB_METRICS_HOST", "127.0.0.1")
+POLL_INTERVAL = float(os.getenv("GITLAB_POLL_INTERVAL", "300"))
+
+# Job fields kept in the in-memory job store; everything else in the API response is dropped
+JOB_FIELDS = ('id', 'name', 'stage', 'status', 'duration', 'queued_duration',
+              'started_at', 'finished_at', 'failure_reason')
+
+# Local cache of finished pipelines and jobs (empty string disables it)
+CACHE_PATH = os.getenv("GITLAB_CACHE_PATH", "gitlab_pipeline_cache.sqlite")
+pipeline_cache = None
+
+# Local store of time-bucketed trend rollups (empty string disables trend reporting)
+TRENDS_PATH = os.getenv("GITLAB_TRENDS_PATH", "gitlab_pipeline_trends.sqlite")
+TREND_BUCKET = os.getenv("GITLAB_TREND_BUCKET", "week")
+TREND_BUCKETS = int(os.getenv("GITLAB_TREND_BUCKETS", "12"))
+TREND_REGRESSION_PCT = float(os.getenv("GITLAB_TREND_REGRESSION_PCT", "20"))
+trend_store = None
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+CONSOLE_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+COMBINED_SUMMARY_FILENAME = "combined_pipeline_stats_summary.txt"
+
+# Key of the overall entry in the queue time statistics
+ALL_STAGES = "(all stages)"
+
+# Logger of the project being audited in the current context (the root logger outside a project)
+project_logger = contextvars.ContextVar("project_logger", default=logging.getLogger())
+
+def log():
     """
-    Configure logging to output to both console and a project-specific file.
+    Return the logger of the project being audited in the current context.
+    """
+    return project_logger.get()
+
+def setup_console_logging():
+    """
+    Configure console output once; every project logger propagates to it.
     """
-    global file_handler
-    log_filename = f"{project_name_sanitized}_pipeline_stats_log.txt"
-    
-    # Remove existing file handler if it exists to avoid duplicates when called multiple times
-    if logging.root.handlers:
-        for handler in logging.root.handlers[:]:
-            if isinstance(handler, logging.FileHandler):
-                logging.root.removeHandler(handler)
-                handler.close() # Close the old file handler
-
-    # Configure basic logging for console output
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
+        format=CONSOLE_LOG_FORMAT,
         handlers=[
             logging.StreamHandler()  # Log to console
         ]
     )
-    
-    # Add a new file handler for the current project
+
+def setup_logging(project_name_sanitized):
+    """
+    Create a project-specific logger that writes to its own file and to the console.
+    Each project gets its own logger, so projects can be audited in parallel.
+    """
+    log_filename = f"{project_name_sanitized}_pipeline_stats_log.txt"
+    logger = logging.getLogger(f"audit.{project_name_sanitized}")
+    logger.setLevel(logging.INFO)
+    close_logging(logger)
+
     file_handler = logging.FileHandler(log_filename, mode='w')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logging.root.addHandler(file_handler)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(file_handler)
     
-    logging.info(f"Logging configured. Output also saved to {log_filename}")
+    logger.info(f"Logging configured. Output also saved to {log_filename}")
+    return logger
 
+def close_logging(logger):
+    """
+    Detach and close a project logger's file handlers.
+    """
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
 
 def fetch_project_data(project_id):
     """
@@ -102,9 +247,9 @@ def fetch_project_data(project_id):
     Returns a tuple: (project_name, sanitized_project_name, output_filename)
     """
     url = f"{GITLAB_URL}/api/v4/projects/{project_id}"
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    project_data = response.json()
+    response = api_get(url)
+    with run_profile.phase("json"):
+        project_data = response.json()
     project_name = project_data['name']
     sanitized_project_name = sanitize_filename(project_name)
     output_filename = f"{sanitized_project_name}_pipeline_stats_results.txt"
@@ -120,79 +265,173 @@ def sanitize_filename(name):
     sanitized_name = sanitized_name.replace(' ', '_')
     return sanitized_name
 
+@run_profile.timed("fetch")
 def fetch_pipelines(project_id):
     """
     Fetch all pipelines updated in the specified date range.
+    With the local cache enabled, only pipelines changed since the last run are listed.
     """
-    pipelines = []
-    page = 1
-    while True:
-        url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines"
-        params = {
-            "updated_after": days_ago_iso,
-            "per_page": 100,
-            "page": page
-        }
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if not data:
-            break
-        pipelines.extend(data)
-        page += 1
-    return pipelines
+    if pipeline_cache is None:
+        return list_pipelines(project_id, days_ago_iso)
+    return refresh_pipelines(pipeline_cache, project_id, days_ago_iso,
+                             lambda updated_after_iso: list_pipelines(project_id, updated_after_iso),
+                             lambda pipeline_id: fetch_pipeline_details(project_id, pipeline_id), logger=log())
+
+def api_get(url, params=None):
+    """
+    GET an API URL through the shared session and rate limiter, retrying on
+    429, 5xx and timeouts. Raises requests.RequestException on failure.
+    """
+    def log_retry(attempt, delay, reason):
+        log().warning(f"Request to {url} failed ({reason}). Retrying in {delay:.1f}s... ({attempt}/{RETRY_LIMIT})")
+
+    return request_with_retry(session, "GET", url, rate_limiter, RETRY_LIMIT,
+                              on_retry=log_retry, profile=run_profile, timeout=REQUEST_TIMEOUT, params=params)
+
+def list_pipelines(project_id, updated_after_iso):
+    """
+    List all pipelines updated after a specific date from the API.
+    """
+    url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines"
+    return list(Paginator(api_get, url, {"updated_after": updated_after_iso}, profile=run_profile).items())
 
 def fetch_pipeline_details(project_id, pipeline_id):
     """
     Fetch detailed information for a specific pipeline.
     """
+    if pipeline_cache is not None:
+        details = pipeline_cache.pipeline_details(project_id, pipeline_id)
+        run_profile.record_cache("pipeline details", details is not None)
+        if details is not None:
+            return details
+
     url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines/{pipeline_id}"
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    response = api_get(url)
+    with run_profile.phase("json"):
+        details = response.json()
+
+    if pipeline_cache is not None:
+        pipeline_cache.store_pipeline_details(project_id, pipeline_id, details)
+    return details
 
-def fetch_all_jobs_for_pipelines(project_id, pipelines, include_retried=False):
+def fetch_concurrently(fetch, pipelines, max_workers=MAX_WORKERS):
     """
-    Fetches all jobs for a list of pipelines.
+    Call fetch(pipeline) for each pipeline on a bounded thread pool.
+    Yields (pipeline, result, error) tuples in the original pipeline order, so
+    everything derived from them is deterministic regardless of completion order.
     """
-    all_jobs = []
-    total_pipelines = len(pipelines)
-    for i, pipeline in enumerate(pipelines):
-        pipeline_id = pipeline['id']
+    def fetch_one(pipeline):
         try:
-            jobs = fetch_pipeline_jobs(project_id, pipeline_id, include_retried=include_retried)
-            all_jobs.extend(jobs)
-            if (i + 1) % 10 == 0 or (i + 1) == total_pipelines:
-                logging.info(f"Fetched jobs from {i+1}/{total_pipelines} pipelines (include_retried={include_retried})")
+            return pipeline, fetch(pipeline), None
         except requests.RequestException as e:
-            logging.error(f"Failed to fetch jobs for pipeline ID {pipeline_id}: {e}")
-    return all_jobs
+            return pipeline, None, e
+
+    if max_workers <= 1:
+        for pipeline in pipelines:
+            yield fetch_one(pipeline)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each fetch runs in a copy of the caller's context, so its log lines reach the project's logger
+        contexts = [contextvars.copy_context() for _ in pipelines]
+        yield from executor.map(lambda pipeline, context: context.run(fetch_one, pipeline), pipelines, contexts)
+
+@run_profile.timed("fetch")
+def build_job_store(project_id, pipelines, max_workers=MAX_WORKERS):
+    """
+    Fetch every job attempt (including retried ones) once per pipeline.
+    Returns a dict mapping pipeline ID to its list of jobs, which all analyses share.
+    """
+    job_store = {}
+    total_pipelines = len(pipelines)
+    fetch = lambda pipeline: fetch_pipeline_jobs(project_id, pipeline['id'], include_retried=True)
+    for i, (pipeline, jobs, error) in enumerate(fetch_concurrently(fetch, pipelines, max_workers)):
+        if error is not None:
+            log().error(f"Failed to fetch jobs for pipeline ID {pipeline['id']}: {error}")
+            continue
+        job_store[pipeline['id']] = [{field: job.get(field) for field in JOB_FIELDS} for job in jobs]
+        if (i + 1) % 10 == 0 or (i + 1) == total_pipelines:
+            log().info(f"Fetched jobs from {i+1}/{total_pipelines} pipelines")
+    return job_store
+
+def latest_job_attempts(job_store):
+    """
+    Yield the non-retried view (latest attempt of each job) from the job store.
+    This matches what the jobs endpoint returns without include_retried.
+    """
+    for jobs in job_store.values():
+        yield from pipeline_latest_attempts(jobs)
+
+def pipeline_latest_attempts(jobs):
+    """
+    Return the latest attempt of each job of one pipeline.
+    """
+    # The latest attempt of a job is the one with the highest ID
+    latest = {}
+    for job in jobs:
+        current = latest.get(job['name'])
+        if current is None or job['id'] > current['id']:
+            latest[job['name']] = job
+    return list(latest.values())
 
 def fetch_pipeline_jobs(project_id, pipeline_id, include_retried=False):
     """
     Fetch all jobs for a specific pipeline.
     """
-    jobs = []
-    page = 1
-    while True:
-        url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs"
-        params = {
-            "per_page": 100,
-            "page": page
-        }
-        
-        if include_retried:
-            params["include_retried"] = "true"
-            
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if not data:
-            break
-        jobs.extend(data)
-        page += 1
+    if pipeline_cache is not None:
+        jobs = pipeline_cache.jobs(project_id, pipeline_id, include_retried)
+        run_profile.record_cache("jobs", jobs is not None)
+        if jobs is not None:
+            return jobs
+
+    url = f"{GITLAB_URL}/api/v4/projects/{project_id}/pipelines/{pipeline_id}/jobs"
+    params = {"include_retried": "true"} if include_retried else {}
+    jobs = list(Paginator(api_get, url, params, profile=run_profile).items())
+
+    if pipeline_cache is not None:
+        pipeline_cache.store_jobs(project_id, pipeline_id, jobs, include_retried)
     return jobs
 
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 timestamp returned by the GitLab API.
+    """
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def pipeline_duration_from_jobs(jobs):
+    """
+    Derive a pipeline's duration in seconds from its jobs' timestamps.
+    Like GitLab, this is the total time at least one job was running (the union of
+    the jobs' running intervals), so queue gaps between stages are not counted. Only the
+    latest attempt of each job counts, as in GitLab, so retried attempts do not add time.
+    Returns None if no job has both a start and finish time.
+    """
+    intervals = [
+        (parse_timestamp(job['started_at']), parse_timestamp(job['finished_at']))
+        for job in pipeline_latest_attempts(jobs)
+        if job.get('started_at') and job.get('finished_at')
+    ]
+    if not intervals:
+        return None
+    return interval_union_seconds(intervals)
+
+def interval_union_seconds(intervals):
+    """
+    Return the total seconds covered by a non-empty list of (start, end) intervals.
+    """
+    intervals = sorted(intervals)
+    duration = 0.0
+    current_start, current_end = intervals[0]
+    for start, end in intervals[1:]:
+        if start > current_end:
+            duration += (current_end - current_start).total_seconds()
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    duration += (current_end - current_start).total_seconds()
+    return duration
+
+@run_profile.timed("write")
 def write_section_header(file, title, char="=", width=100):
     """
     Write a formatted section header to the output file
@@ -203,47 +442,65 @@ def write_section_header(file, title, char="=", width=100):
     file.write(char * width + "\n\n")
     
     # Also log to console
-    logging.info("\n" + char * width)
-    logging.info(title)
-    logging.info(char * width + "\n")
+    log().info("\n" + char * width)
+    log().info(title)
+    log().info(char * width + "\n")
 
 #
 # ANALYSIS FUNCTIONS
 #
 
-def analyze_pipeline_runtimes(project_id, pipelines):
+@run_profile.timed("analyze")
+def analyze_pipeline_runtimes(project_id, pipelines, job_store=None, max_workers=MAX_WORKERS, pipeline_durations=None):
     """
     Analyze pipeline runtimes grouped by branch.
+    When a job store is given, durations are derived from the jobs' timestamps and
+    only pipelines missing from the store need their details fetched.
+    If a `pipeline_durations` dict is given, each pipeline's duration in seconds is recorded in it.
     """
-    logging.info("Starting pipeline runtime analysis...")
+    log().info("Starting pipeline runtime analysis...")
     
     # Dictionary to store durations for each branch
     branch_durations = defaultdict(list)
     processed_count = 0
     total_count = len(pipelines)
 
-    for pipeline in pipelines:
+    if job_store is None:
+        job_store = {}
+    derived_details = [
+        (pipeline, {'duration': pipeline_duration_from_jobs(job_store[pipeline['id']])}, None)
+        for pipeline in pipelines if pipeline['id'] in job_store
+    ]
+    remaining_pipelines = [pipeline for pipeline in pipelines if pipeline['id'] not in job_store]
+    if derived_details:
+        log().info(f"Derived durations of {len(derived_details)} pipelines from job timestamps; "
+                     f"fetching details for {len(remaining_pipelines)}")
+
+    # Fetch detailed pipeline information
+    fetch = lambda pipeline: fetch_pipeline_details(project_id, pipeline['id'])
+    fetched_details = fetch_concurrently(fetch, remaining_pipelines, max_workers)
+    for pipeline, details, error in itertools.chain(derived_details, fetched_details):
         pipeline_id = pipeline['id']
         ref = pipeline['ref']
-        
-        # Fetch detailed pipeline information
-        try:
-            details = fetch_pipeline_details(project_id, pipeline_id)
-            duration = details.get('duration')  # Duration in seconds
 
-            if duration is not None:
-                duration_minutes = duration / 60
-                branch_durations[ref].append(duration_minutes)
-                logging.debug(f"Pipeline ID: {pipeline_id}, Branch: {ref}, Duration: {duration_minutes:.2f} minutes")
-            else:
-                logging.debug(f"Pipeline ID: {pipeline_id}, Branch: {ref}, Duration: Not Available")
-                
-            processed_count += 1
-            if processed_count % 10 == 0 or processed_count == total_count:
-                logging.info(f"Processed {processed_count}/{total_count} pipelines for runtime analysis")
-                
-        except requests.RequestException as e:
-            logging.error(f"Error fetching details for pipeline {pipeline_id}: {e}")
+        if error is not None:
+            log().error(f"Error fetching details for pipeline {pipeline_id}: {error}")
+            continue
+
+        duration = details.get('duration')  # Duration in seconds
+
+        if duration is not None:
+            if pipeline_durations is not None:
+                pipeline_durations[pipeline_id] = duration
+            duration_minutes = duration / 60
+            branch_durations[ref].append(duration_minutes)
+            log().debug(f"Pipeline ID: {pipeline_id}, Branch: {ref}, Duration: {duration_minutes:.2f} minutes")
+        else:
+            log().debug(f"Pipeline ID: {pipeline_id}, Branch: {ref}, Duration: Not Available")
+            
+        processed_count += 1
+        if processed_count % 10 == 0 or processed_count == total_count:
+            log().info(f"Processed {processed_count}/{total_count} pipelines for runtime analysis")
 
     # Calculate statistics for each branch
     branch_stats = {}
@@ -258,144 +515,235 @@ def analyze_pipeline_runtimes(project_id, pipelines):
                 "average": average
             }
 
-    logging.info(f"Pipeline runtime analysis completed for {len(branch_stats)} branches.")
+    log().info(f"Pipeline runtime analysis completed for {len(branch_stats)} branches.")
     return branch_stats
 
-def analyze_job_durations(all_jobs):
+@run_profile.timed("analyze")
+def analyze_job_durations(jobs):
     """
     Analyze job durations and calculate statistics.
+    Jobs are consumed one at a time, so any iterable works and memory stays
+    proportional to the number of distinct job names.
     """
-    logging.info("Starting job duration analysis...")
+    log().info("Starting job duration analysis...")
     
-    job_durations = defaultdict(list)
-    for job in all_jobs:
-        duration = job.get('duration')  # Duration in seconds
-        if duration is not None:
-            job_durations[job['name']].append(duration / 60)  # Convert to minutes
-
-    job_stats = {}
-    for job_name, durations in job_durations.items():
-        if durations:
-            slowest = max(durations)
-            fastest = min(durations)
-            average = sum(durations) / len(durations)
-            job_stats[job_name] = {
-                "slowest": slowest,
-                "fastest": fastest,
-                "average": average
-            }
+    duration_stats = DurationStats()
+    duration_stats.add_jobs(jobs)
+    job_stats = duration_stats.results()
             
-    logging.info(f"Job duration analysis completed for {len(job_stats)} job types.")
+    log().info(f"Job duration analysis completed for {len(job_stats)} job types.")
     return job_stats
 
-def analyze_job_retries(project_id, pipelines):
+@run_profile.timed("analyze")
+def analyze_retries(job_store):
     """
-    Analyze job retries and calculate Pipeline Reliability Rate.
+    Analyze job retries, reliability and the time spent in retried attempts in one pass.
+
+    The latest attempt of a job is the one with the highest ID. Walking each pipeline's jobs,
+    the highest-ID attempt seen so far is kept per name and the lower-ID one of every pair is
+    counted as retried, so no grouping or sorting is needed. Retried time is also attributed
+    to the failure reason of the retried attempt.
+    Returns a dict with:
+    - 'jobs': {name: {'total_runs', 'successes', 'failures', 'retries', 'retry_minutes', 'reliability'}}
+    - 'durations': {name: {'total_duration', 'count', 'avg_duration'}} of retried attempts with a duration
+    - 'total_retried_jobs': the number of retried attempts with a duration
+    - 'failure_reasons': {reason: {'retries', 'minutes', 'average'}}
     """
-    logging.info("Starting job retry analysis...")
-    
-    job_stats = defaultdict(lambda: {'total_runs': 0, 'successes': 0, 'failures': 0, 'retries': 0})
-    processed_count = 0
-    total_count = len(pipelines)
+    log().info("Starting job retry analysis...")
 
-    for pipeline in pipelines:
-        pipeline_id = pipeline['id']
-        try:
-            jobs = fetch_pipeline_jobs(project_id, pipeline_id, include_retried=True)
-
-            # Group jobs by their name within the same pipeline
-            jobs_by_name = defaultdict(list)
-            for job in jobs:
-                jobs_by_name[job['name']].append(job)
-
-            # Analyze each group to determine retries and calculate statistics
-            for job_name, job_list in jobs_by_name.items():
-                job_list.sort(key=lambda x: x['id'], reverse=True)
-                # latest_job = job_list[0] # Not used
-                retried_jobs = job_list[1:]
-
-                job_stats[job_name]['total_runs'] += len(job_list)
-                job_stats[job_name]['retries'] += len(retried_jobs)
-                for job in job_list:
-                    if job['status'] == 'success':
-                        job_stats[job_name]['successes'] += 1
-                    elif job['status'] == 'failed':
-                        job_stats[job_name]['failures'] += 1
-                        
-            processed_count += 1
-            if processed_count % 10 == 0 or processed_count == total_count:
-                logging.info(f"Processed {processed_count}/{total_count} pipelines for retry analysis")
-                
-        except requests.RequestException as e:
-            logging.error(f"Error fetching jobs for pipeline {pipeline_id}: {e}")
+    job_stats = defaultdict(lambda: {'total_runs': 0, 'successes': 0, 'failures': 0, 'retries': 0, 'retry_minutes': 0.0})
+    durations = defaultdict(lambda: {'total_duration': 0.0, 'count': 0})
+    failure_reasons = defaultdict(lambda: {'retries': 0, 'minutes': 0.0})
 
-    logging.info(f"Job retry analysis completed for {len(job_stats)} job types.")
-    return job_stats
+    def add_retry(job):
+        stats = job_stats[job['name']]
+        reason = failure_reasons[job.get('failure_reason') or 'unknown']
+        stats['retries'] += 1
+        reason['retries'] += 1
+        duration = job.get('duration')
+        if duration is not None:
+            minutes = duration / 60  # Convert to minutes
+            stats['retry_minutes'] += minutes
+            reason['minutes'] += minutes
+            durations[job['name']]['total_duration'] += minutes
+            durations[job['name']]['count'] += 1
+
+    for jobs in job_store.values():
+        latest = {}
+        for job in jobs:
+            name = job['name']
+            stats = job_stats[name]
+            stats['total_runs'] += 1
+            if job['status'] == 'success':
+                stats['successes'] += 1
+            elif job['status'] == 'failed':
+                stats['failures'] += 1
 
-def analyze_retry_durations(project_id, pipelines):
+            current = latest.get(name)
+            if current is None:
+                latest[name] = job
+            elif job['id'] > current['id']:
+                add_retry(current)
+                latest[name] = job
+            else:
+                add_retry(job)
+
+    for stats in job_stats.values():
+        stats['reliability'] = (stats['total_runs'] - stats['retries']) / stats['total_runs'] * 100
+    for stats in durations.values():
+        stats['avg_duration'] = stats['total_duration'] / stats['count']
+    for stats in failure_reasons.values():
+        stats['average'] = stats['minutes'] / stats['retries']
+    total_retried_jobs = sum(stats['count'] for stats in durations.values())
+
+    log().info(f"Job retry analysis completed for {len(job_stats)} job types with {total_retried_jobs} total retried jobs.")
+    return {
+        'jobs': dict(job_stats),
+        'durations': dict(durations),
+        'total_retried_jobs': total_retried_jobs,
+        'failure_reasons': dict(failure_reasons),
+    }
+
+def job_timeline(jobs):
+    """
+    Return the jobs of a pipeline that ran, as (start, finish, job) tuples sorted by finish time.
+    """
+    timeline = [
+        (parse_timestamp(job['started_at']), parse_timestamp(job['finished_at']), job)
+        for job in jobs
+        if job.get('started_at') and job.get('finished_at')
+    ]
+    timeline.sort(key=lambda entry: entry[1])
+    return timeline
+
+def critical_path(timeline):
     """
-    Analyze durations of retried jobs.
+    Walk back from the job that finished last. Each job's predecessor is the job that finished
+    last before it started, i.e. the one it was waiting for. Returns the path, first job first,
+    as (job, wait_seconds) tuples, where the wait is the gap since the predecessor finished
+    (for the first job, its queue time).
     """
-    logging.info("Starting retry duration analysis...")
+    finish_times = [finish for _, finish, _ in timeline]
+    path = []
+    index = len(timeline) - 1
+    while index >= 0:
+        start, _, job = timeline[index]
+        # Predecessors must finish no later than this job started (and before it in sort order)
+        predecessor = min(bisect.bisect_right(finish_times, start), index) - 1
+        if predecessor >= 0:
+            wait = (start - timeline[predecessor][1]).total_seconds()
+        else:
+            wait = job.get('queued_duration') or 0.0
+        path.append((job, wait))
+        index = predecessor
+    path.reverse()
+    return path
+
+@run_profile.timed("analyze")
+def analyze_critical_paths(job_store):
+    """
+    Reconstruct each pipeline's job timeline (all attempts, including retries) and analyze:
+    - the critical path: how often each job is on it and how long it runs there, and how much
+      of the path is spent running versus waiting (runner queue and scheduling gaps);
+    - per stage, wall time (the union of its jobs' running intervals) versus the sum of its
+      job durations, whose ratio is the stage's parallelism factor;
+    - runner queue latency (`queued_duration`) percentiles per stage and overall.
+    Returns a dict with 'pipelines', 'path_running', 'path_waiting' (minutes), 'path_jobs',
+    'stages' and 'queue' entries.
+    """
+    log().info("Starting critical path and queue time analysis...")
     
-    retried_jobs_duration = defaultdict(float)
-    retried_jobs_count = defaultdict(int)
-    total_retried_jobs = 0
-    processed_count = 0
-    total_count = len(pipelines)
+    path_jobs = defaultdict(lambda: {'count': 0, 'minutes': 0.0})
+    stage_times = defaultdict(lambda: {'pipelines': 0, 'jobs': 0, 'wall': 0.0, 'job_time': 0.0, 'start_offset': 0.0})
+    queue_stats = DurationStats()
+    analyzed = 0
+    path_running = 0.0
+    path_waiting = 0.0
 
-    for pipeline in pipelines:
-        pipeline_id = pipeline['id']
-        try:
-            jobs = fetch_pipeline_jobs(project_id, pipeline_id, include_retried=True)
+    for jobs in job_store.values():
+        timeline = job_timeline(jobs)
+        if not timeline:
+            continue
+        analyzed += 1
+        pipeline_start = min(start for start, _, _ in timeline)
 
-            # Group jobs by their name within the same pipeline
-            jobs_by_name = defaultdict(list)
-            for job in jobs:
-                jobs_by_name[job['name']].append(job)
+        for job, wait in critical_path(timeline):
+            minutes = (job.get('duration') or 0.0) / 60
+            path_jobs[job['name']]['count'] += 1
+            path_jobs[job['name']]['minutes'] += minutes
+            path_running += minutes
+            path_waiting += wait / 60
 
-            # Analyze each group to determine retries and calculate statistics
-            for job_name, job_list in jobs_by_name.items():
-                # Sort by job ID to get the latest job first
-                job_list.sort(key=lambda x: x['id'], reverse=True)
-                
-                # If we have more than one job with the same name in a pipeline, we have retries
-                if len(job_list) > 1:
-                    retried_jobs = job_list[1:]  # All except the latest one are retries
-                    for job in retried_jobs:
-                        duration = job.get('duration')
-                        if duration is not None:
-                            retried_jobs_duration[job_name] += duration / 60  # Convert to minutes
-                            retried_jobs_count[job_name] += 1
-                            total_retried_jobs += 1
-                            logging.debug(f"Found retried job: {job_name} in pipeline {pipeline_id}, duration: {duration / 60:.2f} min")
-            
-            processed_count += 1
-            if processed_count % 10 == 0 or processed_count == total_count:
-                logging.info(f"Processed {processed_count}/{total_count} pipelines for retry duration analysis")
-                
-        except requests.RequestException as e:
-            logging.error(f"Error fetching jobs for pipeline {pipeline_id}: {e}")
-
-    # Calculate average durations
-    retry_stats = {}
-    for job_name in retried_jobs_duration:
-        total_duration = retried_jobs_duration[job_name]
-        count = retried_jobs_count[job_name]
-        avg_duration = total_duration / count if count > 0 else 0
-        retry_stats[job_name] = {
-            "total_duration": total_duration,
-            "count": count,
-            "avg_duration": avg_duration
+        stage_intervals = defaultdict(list)
+        for start, finish, job in timeline:
+            stage_intervals[job.get('stage') or 'unknown'].append((start, finish, job))
+        for stage, entries in stage_intervals.items():
+            times = stage_times[stage]
+            times['pipelines'] += 1
+            times['jobs'] += len(entries)
+            times['wall'] += interval_union_seconds([(start, finish) for start, finish, _ in entries]) / 60
+            times['job_time'] += sum((finish - start).total_seconds() for start, finish, _ in entries) / 60
+            times['start_offset'] += (min(start for start, _, _ in entries) - pipeline_start).total_seconds()
+
+        for job in jobs:
+            if job.get('queued_duration') is not None:
+                queue_stats.add(job.get('stage') or 'unknown', job['queued_duration'])
+                queue_stats.add(ALL_STAGES, job['queued_duration'])
+
+    stages = {}
+    for stage, times in stage_times.items():
+        stages[stage] = {
+            'pipelines': times['pipelines'],
+            'jobs': times['jobs'],
+            'wall': times['wall'] / times['pipelines'],
+            'job_time': times['job_time'] / times['pipelines'],
+            'parallelism': times['job_time'] / times['wall'] if times['wall'] > 0 else 0.0,
+            'start_offset': times['start_offset'] / times['pipelines'],  # Seconds after the pipeline's first job started
         }
 
-    logging.info(f"Retry duration analysis completed with {total_retried_jobs} total retried jobs.")
-    return retry_stats, total_retried_jobs
+    log().info(f"Critical path analysis completed for {analyzed} pipelines and {len(stages)} stages.")
+    return {
+        'pipelines': analyzed,
+        'path_running': path_running,
+        'path_waiting': path_waiting,
+        'path_jobs': dict(path_jobs),
+        'stages': stages,
+        'queue': queue_stats.results(),
+    }
+
+@run_profile.timed("analyze")
+def analyze_trends(project_id, pipelines, job_store, pipeline_durations):
+    """
+    Update the project's stored trend rollups with the newest buckets and load the most recent
+    TREND_BUCKETS of them. Returns a tuple: (bucket_summaries, regressions, compared_buckets).
+    """
+    log().info("Starting trend analysis...")
+    now = datetime.now(timezone.utc)
+    window_start = days_ago.astimezone(timezone.utc)
+    computed = update_trends(trend_store, project_id, pipelines, job_store, pipeline_durations,
+                             TREND_BUCKET, window_start, now)
+
+    # Step back from the current (incomplete) bucket to find the ones to show and compare
+    starts = [bucket_start(now, TREND_BUCKET)]
+    for _ in range(max(TREND_BUCKETS, 3) - 1):
+        previous_start = bucket_start(starts[-1] - timedelta(days=1), TREND_BUCKET)
+        starts.append(previous_start)
+    buckets = [start.date().isoformat() for start in starts]
+    rollups = trend_store.rollups(project_id, TREND_BUCKET, since_bucket=buckets[TREND_BUCKETS - 1])
+
+    # Compare the last complete bucket with the one before it
+    compared_buckets = (buckets[2], buckets[1])
+    regressions = find_regressions(rollups, buckets[1], buckets[2], TREND_REGRESSION_PCT)
+    summaries = bucket_summaries(rollups)
+
+    log().info(f"Trend analysis completed: recomputed {computed} buckets, {len(summaries)} buckets in the report.")
+    return summaries, regressions, compared_buckets
 
 #
 # OUTPUT FUNCTIONS
 #
 
+@run_profile.timed("write")
 def write_branch_stats(file, branch_stats):
     """
     Write branch statistics to the output file.
@@ -410,20 +758,24 @@ def write_branch_stats(file, branch_stats):
         
     file.write("\n")
 
+@run_profile.timed("write")
 def write_job_duration_stats(file, job_stats):
     """
     Write job duration statistics to the output file.
     """
-    header = f"{'Job Name':<30} {'Slowest (min)':<15} {'Fastest (min)':<15} {'Average (min)':<15}\n"
+    header = (f"{'Job Name':<30} {'Slowest (min)':<15} {'Fastest (min)':<15} {'Average (min)':<15} "
+              f"{'p50 (min)':<12} {'p90 (min)':<12} {'p99 (min)':<12}\n")
     file.write(header)
-    file.write("=" * 75 + "\n")
+    file.write("=" * 114 + "\n")
     
     for job_name, stats in sorted(job_stats.items()):
-        line = f"{job_name:<30} {stats['slowest']:<15.2f} {stats['fastest']:<15.2f} {stats['average']:<15.2f}\n"
+        line = (f"{job_name:<30} {stats['slowest']:<15.2f} {stats['fastest']:<15.2f} {stats['average']:<15.2f} "
+                f"{stats['p50']:<12.2f} {stats['p90']:<12.2f} {stats['p99']:<12.2f}\n")
         file.write(line)
         
     file.write("\n")
 
+@run_profile.timed("write")
 def write_job_retry_stats(file, job_stats):
     """
     Write job retry statistics to the output file.
@@ -442,9 +794,10 @@ def write_job_retry_stats(file, job_stats):
         
     file.write("\n")
 
-def write_retry_duration_stats(file, retry_stats, total_retried_jobs):
+@run_profile.timed("write")
+def write_retry_duration_stats(file, retry_stats, total_retried_jobs, failure_reasons=None):
     """
-    Write retry duration statistics to the output file.
+    Write retry duration statistics to the output file, and the retried time per failure reason if given.
     """
     header = f"{'Job Name':<30} {'Total Retried Duration (min)':<25} {'Retry Count':<15} {'Avg Duration (min)':<20}\n"
     file.write(header)
@@ -466,92 +819,532 @@ def write_retry_duration_stats(file, retry_stats, total_retried_jobs):
         
     file.write("\n")
 
-def main():
+    if failure_reasons:
+        file.write(f"{'Failure Reason of Retried Job':<30} {'Retries':<10} {'Retried Duration (min)':<25} {'Avg Duration (min)':<20}\n")
+        file.write("=" * 90 + "\n")
+        for reason, stats in sorted(failure_reasons.items(), key=lambda item: -item[1]['minutes']):
+            file.write(f"{reason:<30} {stats['retries']:<10} {stats['minutes']:<25.2f} {stats['average']:<20.2f}\n")
+        file.write("\n")
+
+@run_profile.timed("write")
+def write_critical_path_stats(file, critical_path_stats):
     """
-    Main function that runs all analyses in sequence
+    Write critical path, stage parallelism and queue time statistics to the output file.
     """
+    pipelines = critical_path_stats['pipelines']
+    if pipelines == 0:
+        file.write("No job timestamps available.\n\n")
+        return
+    running = critical_path_stats['path_running']
+    waiting = critical_path_stats['path_waiting']
+    file.write(f"Average critical path per pipeline: {(running + waiting) / pipelines:.2f} min "
+               f"({running / pipelines:.2f} min running, {waiting / pipelines:.2f} min waiting")
+    if running + waiting > 0:
+        file.write(f", {waiting / (running + waiting) * 100:.1f}% waiting")
+    file.write(")\n\n")
+
+    header = f"{'Job Name':<30} {'On Critical Path':<18} {'Share of Pipelines (%)':<24} {'Avg on Path (min)':<18}\n"
+    file.write(header)
+    file.write("=" * 93 + "\n")
+    path_jobs = sorted(critical_path_stats['path_jobs'].items(), key=lambda item: (-item[1]['minutes'], item[0]))
+    for job_name, stats in path_jobs:
+        line = (f"{job_name:<30} {stats['count']:<18} {stats['count'] / pipelines * 100:<24.2f} "
+                f"{stats['minutes'] / stats['count']:<18.2f}\n")
+        file.write(line)
+    file.write("\n")
+
+    queue = critical_path_stats['queue']
+    header = (f"{'Stage':<30} {'Jobs':<8} {'Wall (min)':<12} {'Job Time (min)':<16} {'Parallelism':<12} "
+              f"{'Queue p50 (s)':<14} {'Queue p90 (s)':<14} {'Queue p99 (s)':<14}\n")
+    file.write(header)
+    file.write("=" * 127 + "\n")
+    stages = sorted(critical_path_stats['stages'].items(), key=lambda item: (item[1]['start_offset'], item[0]))
+    for stage, stats in stages + [(ALL_STAGES, None)]:
+        stage_queue = queue.get(stage)
+        if stats is not None:
+            line = (f"{stage:<30} {stats['jobs']:<8} {stats['wall']:<12.2f} {stats['job_time']:<16.2f} "
+                    f"{stats['parallelism']:<12.2f} ")
+        elif stage_queue is not None:
+            line = f"{stage:<30} {stage_queue['count']:<8} {'-':<12} {'-':<16} {'-':<12} "
+        else:
+            continue
+        if stage_queue is not None:
+            line += f"{stage_queue['p50']:<14.1f} {stage_queue['p90']:<14.1f} {stage_queue['p99']:<14.1f}\n"
+        else:
+            line += f"{'N/A':<14} {'N/A':<14} {'N/A':<14}\n"
+        file.write(line)
+    file.write("\nWall and job times are averages per pipeline; parallelism is job time over wall time.\n")
+    file.write("\n")
+
+@run_profile.timed("write")
+def write_trend_stats(file, summaries, regressions, compared_buckets):
+    """
+    Write per-bucket trend figures and the regressions between the last two complete buckets.
+    """
+    header = (f"{TREND_BUCKET.capitalize() + ' Starting':<16} {'Pipelines':<10} {'Avg Pipeline (min)':<20} {'Job Runs':<10} "
+              f"{'Failures':<10} {'Retries':<10} {'Retry (min)':<12} {'Reliability (%)':<16}\n")
+    file.write(header)
+    file.write("=" * 108 + "\n")
+    
+    for summary in summaries:
+        average = f"{summary['average_pipeline']:.2f}" if summary['average_pipeline'] is not None else "N/A"
+        reliability = f"{summary['reliability']:.2f}" if summary['reliability'] is not None else "N/A"
+        line = (f"{summary['bucket']:<16} {summary['pipelines']:<10} {average:<20} {summary['job_runs']:<10} "
+                f"{summary['failures']:<10} {summary['retries']:<10} {summary['retry_minutes']:<12.2f} {reliability:<16}\n")
+        file.write(line)
+    
+    previous_bucket, current_bucket = compared_buckets
+    file.write(f"\nRegressions of at least {TREND_REGRESSION_PCT:g}% ({previous_bucket} -> {current_bucket}):\n")
+    if regressions:
+        file.write(f"{'Type':<10} {'Name':<50} {'Before (min)':<15} {'After (min)':<15} {'Change (%)':<12}\n")
+        file.write("=" * 105 + "\n")
+        for regression in regressions:
+            kind = "Branch" if regression['metric'] == "branch_runtime" else "Job"
+            line = (f"{kind:<10} {regression['key']:<50} {regression['previous']:<15.2f} "
+                    f"{regression['current']:<15.2f} {regression['change_pct']:<+12.1f}\n")
+            file.write(line)
+    else:
+        file.write("None found.\n")
+        
+    file.write("\n")
+
+def audit_project(project_id, current_time):
+    """
+    Run all analyses for one project and write its report. Returns the project's summary
+    figures, or None if the project has no pipelines or its audit failed. Errors are
+    contained here so one failing project does not stop the others.
+    """
+    logger = None
+    token = None
     try:
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Fetch project data and set up logging
+        project_name, sanitized_project_name, output_filename = fetch_project_data(project_id)
+        logger = setup_logging(sanitized_project_name)
+        token = project_logger.set(logger)
+        
+        log().info(f"Starting unified GitLab Pipeline analysis for project: {project_name} (ID: {project_id})")
+        log().info(f"Analyzing data from the last {DAYS_AGO} days (since {days_ago.strftime('%Y-%m-%d')})")
+        log().info(f"Fetching per-pipeline data with up to {MAX_WORKERS} concurrent requests")
+        if pipeline_cache is not None:
+            log().info(f"Using local pipeline cache {CACHE_PATH}")
+        log().info(f"Results will be saved to {output_filename}")
         
-        for project_id in PROJECT_IDS:
-            # Fetch project data and set up logging
-            project_name, sanitized_project_name, output_filename = fetch_project_data(project_id)
-            setup_logging(sanitized_project_name)
+        # Fetch pipelines (we'll reuse this for all analyses)
+        log().info("Fetching pipelines data...")
+        pipelines = fetch_pipelines(project_id)
+        pipeline_count = len(pipelines)
+        log().info(f"Found {pipeline_count} pipelines in the last {DAYS_AGO} days.")
+        
+        if pipeline_count == 0:
+            log().error("No pipelines found. Skipping project.")
+            return None
+        
+        # Open output file and any machine-readable outputs, which are streamed section by section
+        structured_prefix = f"{sanitized_project_name}_pipeline_stats"
+        with open(output_filename, "w") as output_file, \
+                open_writers(OUTPUT_FORMATS, structured_prefix, {'project': project_name}, "gitlab_pipeline") as structured:
+            # Write file header
+            output_file.write(f"# GitLab Pipeline Analysis Results for {project_name} (ID: {project_id})\n")
+            output_file.write(f"# Generated on: {current_time}\n")
+            output_file.write(f"# Analysis period: Last {DAYS_AGO} days (since {days_ago.strftime('%Y-%m-%d')})\n")
+            output_file.write(f"# Total pipelines analyzed: {pipeline_count}\n\n")
             
-            logging.info(f"Starting unified GitLab Pipeline analysis for project: {project_name} (ID: {project_id})")
-            logging.info(f"Analyzing data from the last {DAYS_AGO} days (since {days_ago.strftime('%Y-%m-%d')})")
-            logging.info(f"Results will be saved to {output_filename}")
+            # Fetch every job attempt once; all analyses are derived from this store
+            log().info("Fetching jobs data (including retried jobs)...")
+            job_store = build_job_store(project_id, pipelines)
             
-            # Fetch pipelines (we'll reuse this for all analyses)
-            logging.info("Fetching pipelines data...")
-            pipelines = fetch_pipelines(project_id)
-            pipeline_count = len(pipelines)
-            logging.info(f"Found {pipeline_count} pipelines in the last {DAYS_AGO} days.")
+            # ANALYSIS 1: Pipeline Runtimes by Branch
+            write_section_header(output_file, "1. PIPELINE RUNTIMES BY BRANCH")
+            duration_job_store = job_store if DURATION_SOURCE == "jobs" else None
+            pipeline_durations = {}
+            branch_stats = analyze_pipeline_runtimes(project_id, pipelines, duration_job_store,
+                                                     pipeline_durations=pipeline_durations)
+            write_branch_stats(output_file, branch_stats)
+            structured.write_section("branch_runtime", "branch", branch_stats)
             
-            if pipeline_count == 0:
-                logging.error("No pipelines found. Skipping project.")
-                continue
+            # Columnar job table for the pandas backend and the Parquet export
+            job_table = None
+            if ANALYSIS_BACKEND == "pandas" or EXPORT_DATASET:
+                job_table = job_dataset.build_job_table(project_id, pipelines, job_store)
+            if EXPORT_DATASET:
+                dataset_filename = f"{sanitized_project_name}_pipeline_jobs.parquet"
+                job_dataset.write_parquet(job_table, dataset_filename)
+                log().info(f"Job dataset ({len(job_table)} job attempts) saved to {dataset_filename}")
             
-            # Open output file
-            with open(output_filename, "w") as output_file:
-                # Write file header
-                output_file.write(f"# GitLab Pipeline Analysis Results for {project_name} (ID: {project_id})\n")
-                output_file.write(f"# Generated on: {current_time}\n")
-                output_file.write(f"# Analysis period: Last {DAYS_AGO} days (since {days_ago.strftime('%Y-%m-%d')})\n")
-                output_file.write(f"# Total pipelines analyzed: {pipeline_count}\n\n")
-                
-                # ANALYSIS 1: Pipeline Runtimes by Branch
-                write_section_header(output_file, "1. PIPELINE RUNTIMES BY BRANCH")
-                branch_stats = analyze_pipeline_runtimes(project_id, pipelines)
-                write_branch_stats(output_file, branch_stats)
-                
-                # ANALYSIS 2: Job Durations
-                write_section_header(output_file, "2. JOB DURATIONS")
-                
-                # Fetch all jobs for regular duration analysis
-                logging.info("Fetching jobs data for duration analysis...")
-                all_jobs = fetch_all_jobs_for_pipelines(project_id, pipelines, include_retried=False)
-                
-                job_stats = analyze_job_durations(all_jobs)
-                write_job_duration_stats(output_file, job_stats)
-                
-                # ANALYSIS 3: Job Retries and Reliability
-                write_section_header(output_file, "3. JOB RETRIES AND RELIABILITY")
-                job_retry_stats = analyze_job_retries(project_id, pipelines)
-                write_job_retry_stats(output_file, job_retry_stats)
-                
-                # ANALYSIS 4: Retry Durations
-                write_section_header(output_file, "4. RETRY DURATIONS")
-                retry_stats, total_retried_jobs = analyze_retry_durations(project_id, pipelines)
-                write_retry_duration_stats(output_file, retry_stats, total_retried_jobs)
-                
-                # Final summary
-                write_section_header(output_file, "SUMMARY", char="-")
-                output_file.write(f"Total pipelines analyzed: {pipeline_count}\n")
-                output_file.write(f"Total unique branches: {len(branch_stats)}\n")
-                output_file.write(f"Total unique job types: {len(job_stats)}\n")
-                output_file.write(f"Total retried jobs: {total_retried_jobs}\n")
-                
-                # Calculate overall reliability rate
-                total_runs = sum(stats['total_runs'] for stats in job_retry_stats.values())
-                total_retries = sum(stats['retries'] for stats in job_retry_stats.values())
-                if total_runs > 0:
-                    overall_reliability = ((total_runs - total_retries) / total_runs) * 100
-                    output_file.write(f"Overall pipeline reliability rate: {overall_reliability:.2f}%\n")
-                    
-            logging.info(f"Analysis complete! Results saved to {output_filename}")
-            # The log filename is now managed within setup_logging, so we don't need a global variable for it here.
-            # We can infer it from sanitized_project_name if needed for the final log message.
-            logging.info(f"Log file saved to {sanitized_project_name}_pipeline_stats_log.txt")
+            # ANALYSIS 2: Job Durations
+            write_section_header(output_file, "2. JOB DURATIONS")
+            if ANALYSIS_BACKEND == "pandas":
+                job_stats = job_dataset.job_duration_stats(job_table)
+            else:
+                job_stats = analyze_job_durations(latest_job_attempts(job_store))
+            write_job_duration_stats(output_file, job_stats)
+            structured.write_section("job_duration", "job", job_stats)
+            
+            # ANALYSES 3 and 4 share one pass over the jobs
+            if ANALYSIS_BACKEND == "pandas":
+                job_retry_stats = job_dataset.job_retry_stats(job_table)
+                retry_stats, total_retried_jobs = job_dataset.retry_duration_stats(job_table)
+                failure_reason_stats = job_dataset.retry_failure_reason_stats(job_table)
+            else:
+                retry_analysis = analyze_retries(job_store)
+                job_retry_stats = retry_analysis['jobs']
+                retry_stats, total_retried_jobs = retry_analysis['durations'], retry_analysis['total_retried_jobs']
+                failure_reason_stats = retry_analysis['failure_reasons']
+            
+            # ANALYSIS 3: Job Retries and Reliability
+            write_section_header(output_file, "3. JOB RETRIES AND RELIABILITY")
+            write_job_retry_stats(output_file, job_retry_stats)
+            structured.write_section("job_retries", "job", job_retry_stats)
+            
+            # ANALYSIS 4: Retry Durations
+            write_section_header(output_file, "4. RETRY DURATIONS")
+            write_retry_duration_stats(output_file, retry_stats, total_retried_jobs, failure_reason_stats)
+            structured.write_section("retry_duration", "job", retry_stats)
+            structured.write_section("retry_failure_reason", "reason", failure_reason_stats)
+            
+            # ANALYSIS 5: Critical Path and Queue Time
+            write_section_header(output_file, "5. CRITICAL PATH AND QUEUE TIME")
+            critical_path_stats = analyze_critical_paths(job_store)
+            write_critical_path_stats(output_file, critical_path_stats)
+            structured.write_section("critical_path", None, {None: {
+                'pipelines': critical_path_stats['pipelines'],
+                'running': critical_path_stats['path_running'],
+                'waiting': critical_path_stats['path_waiting'],
+            }})
+            structured.write_section("critical_path_job", "job", critical_path_stats['path_jobs'])
+            structured.write_section("stage_timing", "stage", critical_path_stats['stages'])
+            structured.write_section("queue_time", "stage", critical_path_stats['queue'])
             
+            # ANALYSIS 6: Trends over time, from the locally stored rollups
+            if trend_store is not None:
+                write_section_header(output_file, f"6. TRENDS BY {TREND_BUCKET.upper()}")
+                trend_summaries, regressions, compared_buckets = analyze_trends(project_id, pipelines, job_store, pipeline_durations)
+                write_trend_stats(output_file, trend_summaries, regressions, compared_buckets)
+                structured.write_section("trend", "bucket", {summary['bucket']: summary for summary in trend_summaries})
+                structured.write_section("regression", "name", {regression['key']: regression for regression in regressions})
+            
+            # Final summary
+            write_section_header(output_file, "SUMMARY", char="-")
+            output_file.write(f"Total pipelines analyzed: {pipeline_count}\n")
+            output_file.write(f"Total unique branches: {len(branch_stats)}\n")
+            output_file.write(f"Total unique job types: {len(job_stats)}\n")
+            output_file.write(f"Total retried jobs: {total_retried_jobs}\n")
+            
+            # Calculate overall reliability rate
+            total_runs = sum(stats['total_runs'] for stats in job_retry_stats.values())
+            total_retries = sum(stats['retries'] for stats in job_retry_stats.values())
+            overall_reliability = None
+            if total_runs > 0:
+                overall_reliability = ((total_runs - total_retries) / total_runs) * 100
+                output_file.write(f"Overall pipeline reliability rate: {overall_reliability:.2f}%\n")
+            
+            summary = {
+                'project_name': project_name,
+                'pipelines': pipeline_count,
+                'branches': len(branch_stats),
+                'job_types': len(job_stats),
+                'total_runs': total_runs,
+                'retries': total_retries,
+                'retried_jobs': total_retried_jobs,
+                'retry_minutes': sum(stats['total_duration'] for stats in retry_stats.values()),
+                'reliability': overall_reliability,
+            }
+            structured.write_section("summary", None, {None: {key: value for key, value in summary.items() if key != 'project_name'}})
+                
+        log().info(f"Analysis complete! Results saved to {output_filename}")
+        # The log filename is now managed within setup_logging, so we don't need a global variable for it here.
+        # We can infer it from sanitized_project_name if needed for the final log message.
+        log().info(f"Log file saved to {sanitized_project_name}_pipeline_stats_log.txt")
+        for path in structured.paths:
+            log().info(f"Machine-readable results saved to {path}")
+        return summary
+        
     except requests.RequestException as e:
-        logging.error(f"API Error: {e}")
-        return
+        log().error(f"API Error for project {project_id}: {e}")
+        return None
+    except Exception as e:
+        log().error(f"Unexpected error for project {project_id}: {e}")
+        import traceback
+        log().error(traceback.format_exc())
+        return None
+    finally:
+        if token is not None:
+            project_logger.reset(token)
+        if logger is not None:
+            close_logging(logger)
+
+@run_profile.timed("write")
+def write_combined_summary(summaries, current_time):
+    """
+    Write one summary line per audited project, plus totals across all of them.
+    """
+    with open(COMBINED_SUMMARY_FILENAME, "w") as output_file:
+        output_file.write(f"# GitLab Pipeline Analysis Summary for {len(summaries)} projects\n")
+        output_file.write(f"# Generated on: {current_time}\n")
+        output_file.write(f"# Analysis period: Last {DAYS_AGO} days (since {days_ago.strftime('%Y-%m-%d')})\n")
+        write_section_header(output_file, "PROJECTS SUMMARY")
+        output_file.write(f"{'Project':<40} {'Pipelines':<10} {'Branches':<10} {'Job Types':<10} {'Job Runs':<10} "
+                          f"{'Retried':<10} {'Retry (min)':<12} {'Reliability':<12}\n")
+        output_file.write("=" * 119 + "\n")
+        for project_id, summary in summaries:
+            if summary is None:
+                output_file.write(f"{str(project_id):<40} {'no data':<10}\n")
+                continue
+            reliability = f"{summary['reliability']:.2f}%" if summary['reliability'] is not None else "N/A"
+            output_file.write(f"{summary['project_name'][:40]:<40} {summary['pipelines']:<10} {summary['branches']:<10} "
+                              f"{summary['job_types']:<10} {summary['total_runs']:<10} {summary['retried_jobs']:<10} "
+                              f"{summary['retry_minutes']:<12.2f} {reliability:<12}\n")
+
+        audited = [summary for _, summary in summaries if summary is not None]
+        total_runs = sum(summary['total_runs'] for summary in audited)
+        total_retries = sum(summary['retries'] for summary in audited)
+        write_section_header(output_file, "TOTALS", char="-")
+        output_file.write(f"Projects audited: {len(audited)} of {len(summaries)}\n")
+        output_file.write(f"Total pipelines analyzed: {sum(summary['pipelines'] for summary in audited)}\n")
+        output_file.write(f"Total job runs: {total_runs}\n")
+        output_file.write(f"Total retried jobs: {sum(summary['retried_jobs'] for summary in audited)}\n")
+        output_file.write(f"Total time spent in retried jobs: {sum(summary['retry_minutes'] for summary in audited):.2f} min\n")
+        if total_runs > 0:
+            output_file.write(f"Overall pipeline reliability rate: {(total_runs - total_retries) / total_runs * 100:.2f}%\n")
+
+def main():
+    """
+    Main function that audits every configured project, up to PROJECT_WORKERS at a time
+    """
+    global pipeline_cache, trend_store
+    setup_console_logging()
+    try:
+        if CACHE_PATH:
+            pipeline_cache = PipelineCache(CACHE_PATH)
+        if TRENDS_PATH:
+            trend_store = TrendStore(TRENDS_PATH)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Projects share the HTTP session, rate limiter and cache; each writes its own report and log
+        project_workers = max(1, min(PROJECT_WORKERS, len(PROJECT_IDS)))
+        if project_workers > 1:
+            log().info(f"Auditing {len(PROJECT_IDS)} projects, {project_workers} at a time")
+        with ThreadPoolExecutor(max_workers=project_workers) as executor:
+            summaries = list(executor.map(lambda project_id: audit_project(project_id, current_time), PROJECT_IDS))
+        
+        if len(PROJECT_IDS) > 1:
+            write_combined_summary(list(zip(PROJECT_IDS, summaries)), current_time)
+            log().info(f"Combined summary saved to {COMBINED_SUMMARY_FILENAME}")
+        
+        log().info(run_profile.summary())
+        if PROFILE_PATH:
+            run_profile.write_json(PROFILE_PATH)
+            log().info(f"Run profile saved to {PROFILE_PATH}")
+            
     except Exception as e:
-        logging.error(f"Unexpected error: {e}")
+        log().error(f"Unexpected error: {e}")
         import traceback
-        logging.error(traceback.format_exc())
+        log().error(traceback.format_exc())
         return
+    finally:
+        if pipeline_cache is not None:
+            pipeline_cache.close()
+        if trend_store is not None:
+            trend_store.close()
+
+#
+# EXPORTER (DAEMON) MODE
+#
+
+def compute_metric_sections(project_id, pipelines, job_store):
+    """
+    Run the analyses exported as metrics over the in-memory job store.
+    Returns {section: (key_label, stats)}, with the same sections as the structured report output.
+    """
+    critical_path_stats = analyze_critical_paths(job_store)
+    retry_analysis = analyze_retries(job_store)
+    return {
+        "branch_runtime": ("branch", analyze_pipeline_runtimes(project_id, pipelines, job_store)),
+        "job_duration": ("job", analyze_job_durations(latest_job_attempts(job_store))),
+        "job_retries": ("job", retry_analysis['jobs']),
+        "retry_duration": ("job", retry_analysis['durations']),
+        "retry_failure_reason": ("reason", retry_analysis['failure_reasons']),
+        "critical_path": (None, {None: {
+            'pipelines': critical_path_stats['pipelines'],
+            'running': critical_path_stats['path_running'],
+            'waiting': critical_path_stats['path_waiting'],
+        }}),
+        "critical_path_job": ("job", critical_path_stats['path_jobs']),
+        "stage_timing": ("stage", critical_path_stats['stages']),
+        "queue_time": ("stage", critical_path_stats['queue']),
+    }
+
+class ProjectMonitor:
+    """
+    Keeps one project's pipelines and job store in memory and brings them up to date on each poll.
+    """
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.project_name = None
+        self.logger = None
+        self.pipelines = {}
+        self.job_store = {}
+        self.watermark = None  # Newest `updated_at` seen so far
+        self.sections = {}
+        self.last_poll = None
+        self.poll_seconds = 0.0
+        self.poll_errors = 0
+
+    def poll(self):
+        """
+        Fetch pipelines updated since the watermark and the jobs of new or changed ones, drop
+        pipelines that left the window and recompute the aggregates. Errors keep the previous ones.
+        """
+        started = time.monotonic()
+        token = None
+        try:
+            if self.project_name is None:
+                self.project_name, sanitized_project_name, _ = fetch_project_data(self.project_id)
+                self.logger = setup_logging(sanitized_project_name)
+            token = project_logger.set(self.logger)
+
+            window_start = datetime.now(timezone.utc) - timedelta(days=DAYS_AGO)
+            listed = list_pipelines(self.project_id, self.watermark or window_start.isoformat())
+            changed_ids = set()
+            for pipeline in listed:
+                known = self.pipelines.get(pipeline['id'])
+                if known is None or known['updated_at'] != pipeline['updated_at']:
+                    self.pipelines[pipeline['id']] = pipeline
+                    changed_ids.add(pipeline['id'])
+            if pipeline_cache is not None:
+                # Drops the cached jobs of changed pipelines, so build_job_store fetches them again
+                pipeline_cache.store_pipelines(self.project_id, listed)
+            if listed:
+                self.watermark = max([self.watermark or ""] + [pipeline['updated_at'] for pipeline in listed])
+
+            for pipeline_id, pipeline in list(self.pipelines.items()):
+                if parse_timestamp(pipeline['updated_at']) < window_start:
+                    del self.pipelines[pipeline_id]
+                    self.job_store.pop(pipeline_id, None)
+
+            # New and changed pipelines, plus any whose jobs could not be fetched last time
+            to_fetch = [pipeline for pipeline_id, pipeline in sorted(self.pipelines.items(), reverse=True)
+                        if pipeline_id in changed_ids or pipeline_id not in self.job_store]
+            self.job_store.update(build_job_store(self.project_id, to_fetch))
+            log().info(f"Poll: {len(listed)} pipelines listed, jobs fetched for {len(to_fetch)}, "
+                       f"{len(self.pipelines)} pipelines in the window")
+
+            pipelines = [pipeline for _, pipeline in sorted(self.pipelines.items(), reverse=True)]
+            self.sections = compute_metric_sections(self.project_id, pipelines, self.job_store)
+            self.last_poll = time.time()
+        except requests.RequestException as e:
+            self.poll_errors += 1
+            log().error(f"API Error while polling project {self.project_id}: {e}")
+        except Exception as e:
+            self.poll_errors += 1
+            log().error(f"Unexpected error while polling project {self.project_id}: {e}")
+            import traceback
+            log().error(traceback.format_exc())
+        finally:
+            self.poll_seconds = time.monotonic() - started
+            if token is not None:
+                project_logger.reset(token)
+
+class MetricsExporter:
+    """
+    Polls every project's monitor and renders their metrics in OpenMetrics text format.
+    """
+    def __init__(self, monitors):
+        self.monitors = monitors
+        self.lock = threading.Lock()
+        self.metrics = "# EOF\n"
+
+    def poll(self):
+        workers = max(1, min(PROJECT_WORKERS, len(self.monitors)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda monitor: monitor.poll(), self.monitors))
+        metrics = self.render()
+        with self.lock:
+            self.metrics = metrics
+
+    def render(self):
+        """
+        Merge the projects' sections, so each metric family is written once with a project label.
+        """
+        merged = {}
+        for monitor in self.monitors:
+            if monitor.project_name is None:
+                continue
+            for section, (key_label, stats) in monitor.sections.items():
+                labels = ("project", key_label) if key_label is not None else ("project",)
+                section_stats = merged.setdefault(section, (labels, {}))[1]
+                for key, fields in stats.items():
+                    section_stats[(monitor.project_name, key) if key_label is not None else (monitor.project_name,)] = fields
+        merged["exporter"] = (("project",), {
+            (monitor.project_name or str(monitor.project_id),): {
+                'pipelines': len(monitor.pipelines),
+                'jobs': sum(len(jobs) for jobs in monitor.job_store.values()),
+                'last_poll_timestamp_seconds': monitor.last_poll,
+                'poll_duration_seconds': monitor.poll_seconds,
+                'poll_errors': monitor.poll_errors,
+            }
+            for monitor in self.monitors
+        })
+
+        buffer = io.StringIO()
+        writer = OpenMetricsWriter(None, {}, "gitlab_pipeline", file=buffer)
+        for section, (labels, stats) in merged.items():
+            writer.write_section(section, labels, stats)
+        writer.close()
+        return buffer.getvalue()
+
+    def metrics_text(self):
+        with self.lock:
+            return self.metrics
+
+def create_metrics_server(exporter, host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Create an HTTP server that serves the exporter's latest metrics on /metrics.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f"Metrics request from {self.client_address[0]}: {format % args}")
+
+    return ThreadingHTTPServer((host, port), MetricsHandler)
+
+def run_daemon():
+    """
+    Poll all configured projects every POLL_INTERVAL seconds and serve their metrics until interrupted
+    """
+    global pipeline_cache
+    setup_console_logging()
+    if CACHE_PATH:
+        pipeline_cache = PipelineCache(CACHE_PATH)
+    exporter = MetricsExporter([ProjectMonitor(project_id) for project_id in PROJECT_IDS])
+    server = create_metrics_server(exporter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log().info(f"Serving metrics on http://{METRICS_HOST}:{server.server_address[1]}/metrics, "
+               f"polling {len(PROJECT_IDS)} projects every {POLL_INTERVAL:g}s")
+    try:
+        while True:
+            started = time.monotonic()
+            exporter.poll()
+            time.sleep(max(0.0, POLL_INTERVAL - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        log().info("Stopping metrics exporter")
+    finally:
+        server.shutdown()
+        if pipeline_cache is not None:
+            pipeline_cache.close()
 
 if __name__ == "__main__":
-    main()
+    if METRICS_PORT:
+        run_daemon()
+    else:
+        main()
@@ -5,12 +5,27 @@ the performance of CI/CD pipelines and their jobs within a GitLab project.
 
 Configuration parameters such as GitLab URL, project ID, access token, and data fetching
 period are centralized in a Config class for easy modification.
+
+Finished pipelines and their jobs are kept in a local SQLite cache (Config.CACHE_PATH),
+so repeated runs only fetch pipelines that changed since the previous run.
+
+Besides the text file, the statistics can be written as JSON Lines, CSV or Prometheus/OpenMetrics
+files (Config.OUTPUT_FORMATS, see report_writers.py) for dashboards and metric scrapers.
+
+At the end of a run a profile of requests per endpoint, cache hits and time per phase is logged
+(and saved as JSON to Config.PROFILE_PATH if set, see run_profile.py).
 """
 import requests
 import logging
 import re
-from datetime import datetime, timedelta
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from gitlab_client import Paginator, RateLimiter, create_session, request_with_retry
+from job_stats import DurationStats
+from pipeline_cache import PipelineCache, refresh_pipelines
+from report_writers import open_writers
+from run_profile import RunProfile
 
 class Config:
     GITLAB_URL = "YOUR_GITLAB_URL"                  # Base URL of the GitLab instance (e.g., "https://gitlab.com")
@@ -19,6 +34,13 @@ class Config:
     PIPELINE_FETCH_DAYS_AGO = 90                    # Number of days ago to fetch pipelines from
     LOG_LEVEL = logging.INFO                        # Logging level (e.g., logging.INFO, logging.DEBUG)
     OUTPUT_FILENAME_PREFIX = "job_duration_stats"   # Prefix for the output text file
+    MAX_WORKERS = 8                                 # Number of pipelines whose jobs are fetched concurrently (1 = serial)
+    CACHE_PATH = "gitlab_pipeline_cache.sqlite"     # Local cache of finished pipelines and jobs (None disables caching)
+    REQUEST_TIMEOUT = 30                            # Timeout for API requests in seconds
+    RETRY_LIMIT = 3                                 # Number of times to retry a failed GET request (429, 5xx, timeouts)
+    MAX_REQUESTS_PER_SECOND = None                  # Optional ceiling on the API request rate (None = adapt to the instance's rate-limit headers)
+    OUTPUT_FORMATS = []                             # Machine-readable outputs next to the text file: "jsonl", "csv", "openmetrics"
+    PROFILE_PATH = None                             # Optional JSON file for the run profile (requests, cache hits, phase timings)
 
 # Configure logging
 logging.basicConfig(
@@ -29,6 +51,9 @@ logging.basicConfig(
     ]
 )
 
+# Request, cache and phase timings of this run
+run_profile = RunProfile()
+
 def sanitize_filename(name):
     """
     Sanitize the project name to create a valid filename.
@@ -40,20 +65,29 @@ def sanitize_filename(name):
     return sanitized_name
 
 class GitlabAPI:
-    def __init__(self, gitlab_url, project_id, access_token):
+    def __init__(self, gitlab_url, project_id, access_token, cache=None):
         self.gitlab_url = gitlab_url
         self.project_id = project_id
-        self.headers = {"Private-Token": access_token}
+        # One pooled connection per concurrent worker plus one for each worker's page prefetch
+        self.session = create_session(access_token, pool_size=max(2 * Config.MAX_WORKERS, 2))
+        self.rate_limiter = RateLimiter(Config.MAX_REQUESTS_PER_SECOND)
+        self.cache = cache
 
     def _make_request(self, method, url, params=None):
+        def log_retry(attempt, delay, reason):
+            logging.warning(f"Request to {url} failed ({reason}). Retrying in {delay:.1f}s... ({attempt}/{Config.RETRY_LIMIT})")
+
         try:
-            response = requests.request(method, url, headers=self.headers, params=params)
-            response.raise_for_status()
-            return response
+            return request_with_retry(self.session, method, url, self.rate_limiter, Config.RETRY_LIMIT,
+                                      on_retry=log_retry, profile=run_profile, timeout=Config.REQUEST_TIMEOUT,
+                                      params=params)
         except requests.exceptions.RequestException as e:
             logging.error(f"Error with request to {url}: {e}")
             return None
 
+    def _get_page(self, url, params=None):
+        return self._make_request("GET", url, params=params)
+
     def fetch_project_name(self):
         """
         Fetch the project name using the GitLab API.
@@ -67,70 +101,59 @@ class GitlabAPI:
     def fetch_pipelines(self, updated_after_iso):
         """
         Fetch all pipelines updated after a specific date.
+        With a cache, only pipelines changed since the last run are listed.
+        """
+        if self.cache is None:
+            return self._list_pipelines(updated_after_iso)[0]
+
+        def list_complete_pipelines(list_after_iso):
+            pipelines, complete = self._list_pipelines(list_after_iso)
+            if not complete:
+                # Never advance the cache high-water mark past a partial listing
+                raise requests.RequestException("Pipeline listing was interrupted")
+            return pipelines
+
+        return refresh_pipelines(self.cache, self.project_id, updated_after_iso,
+                                 list_complete_pipelines, self.fetch_pipeline)
+
+    def fetch_pipeline(self, pipeline_id):
+        """
+        Fetch a single pipeline.
+        """
+        url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/pipelines/{pipeline_id}"
+        response = self._make_request("GET", url)
+        if response:
+            return response.json()
+        return None
+
+    def _list_pipelines(self, updated_after_iso):
         """
-        pipelines = []
-        page = 1
-        while True:
-            url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/pipelines"
-            params = {
-                "updated_after": updated_after_iso,
-                "per_page": 100,
-                "page": page
-            }
-            response = self._make_request("GET", url, params=params)
-            if not response:
-                break
-            data = response.json()
-            if not data:
-                break
-            pipelines.extend(data)
-            page += 1
-        return pipelines
+        List pipelines updated after a specific date.
+        Returns a tuple: (pipelines, complete), where complete is False if a request failed.
+        """
+        url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/pipelines"
+        paginator = Paginator(self._get_page, url, {"updated_after": updated_after_iso}, profile=run_profile)
+        pipelines = list(paginator.items())
+        return pipelines, paginator.complete
 
     def fetch_pipeline_jobs(self, pipeline_id):
         """
         Fetch all jobs for a specific pipeline.
         """
-        jobs = []
-        page = 1
-        while True:
-            url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/pipelines/{pipeline_id}/jobs"
-            params = {
-                "per_page": 100,
-                "page": page
-            }
-            response = self._make_request("GET", url, params=params)
-            if not response:
-                break
-            data = response.json()
-            if not data:
-                break
-            jobs.extend(data)
-            page += 1
-        return jobs
+        if self.cache is not None:
+            jobs = self.cache.jobs(self.project_id, pipeline_id)
+            run_profile.record_cache("jobs", jobs is not None)
+            if jobs is not None:
+                return jobs
 
-def analyze_jobs(jobs):
-    """
-    Analyze job durations and calculate statistics.
-    """
-    job_durations = defaultdict(list)
-    for job in jobs:
-        duration = job.get('duration')  # Duration in seconds
-        if duration is not None:
-            job_durations[job['name']].append(duration / 60)  # Convert to minutes
-
-    job_stats = {}
-    for job_name, durations in job_durations.items():
-        if durations:
-            slowest = max(durations)
-            fastest = min(durations)
-            average = sum(durations) / len(durations)
-            job_stats[job_name] = {
-                "slowest": slowest,
-                "fastest": fastest,
-                "average": average
-            }
-    return job_stats
+        url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/pipelines/{pipeline_id}/jobs"
+        paginator = Paginator(self._get_page, url, profile=run_profile)
+        jobs = list(paginator.items())
+
+        # Don't cache a partial job list
+        if self.cache is not None and paginator.complete:
+            self.cache.store_jobs(self.project_id, pipeline_id, jobs)
+        return jobs
 
 def save_to_text(job_stats, project_name):
     """
@@ -140,20 +163,50 @@ def save_to_text(job_stats, project_name):
     filename = f"{Config.OUTPUT_FILENAME_PREFIX}_{sanitized_project_name}.txt"
     try:
         with open(filename, "w") as txtfile:
-            header = f"{'Job Name':<30} {'Slowest (min)':<15} {'Fastest (min)':<15} {'Average (min)':<15}\n"
+            header = (f"{'Job Name':<30} {'Slowest (min)':<15} {'Fastest (min)':<15} {'Average (min)':<15} "
+                      f"{'p50 (min)':<12} {'p90 (min)':<12} {'p99 (min)':<12}\n")
             txtfile.write(header)
-            txtfile.write("=" * 75 + "\n")
+            txtfile.write("=" * 114 + "\n")
             for job_name, stats in job_stats.items():
-                line = f"{job_name:<30} {stats['slowest']:<15.2f} {stats['fastest']:<15.2f} {stats['average']:<15.2f}\n"
+                line = (f"{job_name:<30} {stats['slowest']:<15.2f} {stats['fastest']:<15.2f} {stats['average']:<15.2f} "
+                        f"{stats['p50']:<12.2f} {stats['p90']:<12.2f} {stats['p99']:<12.2f}\n")
                 txtfile.write(line)
                 logging.info(f"Job Name: {job_name}, Slowest: {stats['slowest']:.2f} min, "
-                             f"Fastest: {stats['fastest']:.2f} min, Average: {stats['average']:.2f} min")
+                             f"Fastest: {stats['fastest']:.2f} min, Average: {stats['average']:.2f} min, "
+                             f"p50: {stats['p50']:.2f} min, p90: {stats['p90']:.2f} min, p99: {stats['p99']:.2f} min")
         logging.info(f"Job duration statistics saved to {filename}")
     except IOError as e:
         logging.error(f"Error writing to file {filename}: {e}")
 
+def save_structured(job_stats, project_name):
+    """
+    Save job statistics in each of the configured machine-readable formats.
+    """
+    if not Config.OUTPUT_FORMATS:
+        return
+    path_prefix = f"{Config.OUTPUT_FILENAME_PREFIX}_{sanitize_filename(project_name)}"
+    try:
+        with open_writers(Config.OUTPUT_FORMATS, path_prefix, {"project": project_name}, "gitlab_job") as structured:
+            structured.write_section("duration", "job", job_stats)
+        for path in structured.paths:
+            logging.info(f"Job duration statistics saved to {path}")
+    except IOError as e:
+        logging.error(f"Error writing structured output {path_prefix}: {e}")
+
 def run_script():
-    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.PROJECT_ID, Config.ACCESS_TOKEN)
+    cache = PipelineCache(Config.CACHE_PATH) if Config.CACHE_PATH else None
+    try:
+        run_audit(cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    logging.info(run_profile.summary())
+    if Config.PROFILE_PATH:
+        run_profile.write_json(Config.PROFILE_PATH)
+        logging.info(f"Run profile saved to {Config.PROFILE_PATH}")
+
+def run_audit(cache):
+    gitlab_api = GitlabAPI(Config.GITLAB_URL, Config.PROJECT_ID, Config.ACCESS_TOKEN, cache)
 
     try:
         project_name = gitlab_api.fetch_project_name()
@@ -165,29 +218,44 @@ def run_script():
         logging.error(f"Failed to fetch project name: {e}")
         return
 
-    days_ago = datetime.now() - timedelta(days=Config.PIPELINE_FETCH_DAYS_AGO)
+    days_ago = datetime.now(timezone.utc) - timedelta(days=Config.PIPELINE_FETCH_DAYS_AGO)
     days_ago_iso = days_ago.isoformat()
 
     try:
-        pipelines = gitlab_api.fetch_pipelines(days_ago_iso)
+        with run_profile.phase("fetch"):
+            pipelines = gitlab_api.fetch_pipelines(days_ago_iso)
         logging.info(f"Found {len(pipelines)} pipelines ran in the last {Config.PIPELINE_FETCH_DAYS_AGO} days.\n")
     except requests.RequestException as e:
         logging.error(f"Failed to fetch pipelines: {e}")
         return
 
-    all_jobs = []
-    for pipeline in pipelines:
-        pipeline_id = pipeline['id']
+    def fetch_jobs(pipeline):
         try:
-            jobs = gitlab_api.fetch_pipeline_jobs(pipeline_id)
-            all_jobs.extend(jobs)
-            logging.info(f"Fetched {len(jobs)} jobs from pipeline ID {pipeline_id}.")
+            return gitlab_api.fetch_pipeline_jobs(pipeline['id']), None
         except requests.RequestException as e:
-            logging.error(f"Failed to fetch jobs for pipeline ID {pipeline_id}: {e}")
+            return None, e
+
+    # executor.map yields results in pipeline order, so the output does not depend on completion order.
+    # Each pipeline's jobs are folded into the statistics as they arrive and then dropped.
+    duration_stats = DurationStats()
+    job_count = 0
+    with run_profile.phase("fetch"), ThreadPoolExecutor(max_workers=max(1, Config.MAX_WORKERS)) as executor:
+        for pipeline, (jobs, error) in zip(pipelines, executor.map(fetch_jobs, pipelines)):
+            pipeline_id = pipeline['id']
+            if error is not None:
+                logging.error(f"Failed to fetch jobs for pipeline ID {pipeline_id}: {error}")
+                continue
+            with run_profile.phase("analyze"):
+                duration_stats.add_jobs(jobs)
+            job_count += len(jobs)
+            logging.info(f"Fetched {len(jobs)} jobs from pipeline ID {pipeline_id}.")
 
-    if all_jobs:
-        job_stats = analyze_jobs(all_jobs)
-        save_to_text(job_stats, project_name)
+    if job_count:
+        with run_profile.phase("analyze"):
+            job_stats = duration_stats.results()
+        with run_profile.phase("write"):
+            save_to_text(job_stats, project_name)
+            save_structured(job_stats, project_name)
     else:
         logging.info("No jobs found to analyze.")
 
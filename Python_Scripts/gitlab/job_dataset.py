@@ -0,0 +1,194 @@
+"""
+Columnar job dataset and vectorized analysis backend for the pipeline audit.
+
+The fetched pipelines and jobs are normalized into one pandas DataFrame, one row per job
+attempt, with categorical job, stage, status and branch names. The table can be written to
+Parquet and analyzed again later without calling the GitLab API. The analyses are
+group-bys over the table and return the same dict shapes as the loop-based analyses in
+gitlab_pipeline_performance_audit.py, so the same report writers apply.
+
+pandas (and pyarrow for Parquet) are optional dependencies, only needed when this backend
+is used: `pip install pandas pyarrow`. pandas is imported on first use, not with this module.
+
+Usage (re-analyze exported datasets offline):
+    python job_dataset.py Project_A_pipeline_jobs.parquet [more.parquet ...] [--since 2024-01-01]
+"""
+import argparse
+
+pd = None  # pandas, imported by _require_pandas()
+
+CATEGORICAL_COLUMNS = ('project_id', 'ref', 'name', 'stage', 'status', 'failure_reason')
+TIMESTAMP_COLUMNS = ('pipeline_updated_at', 'started_at', 'finished_at')
+JOB_COLUMNS = ('id', 'name', 'stage', 'status', 'duration', 'queued_duration',
+               'started_at', 'finished_at', 'failure_reason')
+REPORTED_QUANTILES = (0.5, 0.9, 0.99)
+
+def _require_pandas():
+    global pd
+    if pd is None:
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("The columnar job dataset needs pandas (and pyarrow for Parquet): pip install pandas pyarrow") from None
+
+def build_job_table(project_id, pipelines, job_store):
+    """
+    Normalize pipelines and their job store (pipeline ID -> jobs) into one row per job attempt.
+    """
+    _require_pandas()
+    pipelines_by_id = {pipeline['id']: pipeline for pipeline in pipelines}
+    columns = {column: [] for column in ('project_id', 'pipeline_id', 'ref', 'pipeline_updated_at') + JOB_COLUMNS}
+    for pipeline_id, jobs in job_store.items():
+        pipeline = pipelines_by_id.get(pipeline_id, {})
+        for job in jobs:
+            columns['project_id'].append(str(project_id))
+            columns['pipeline_id'].append(pipeline_id)
+            columns['ref'].append(pipeline.get('ref'))
+            columns['pipeline_updated_at'].append(pipeline.get('updated_at'))
+            for column in JOB_COLUMNS:
+                columns[column].append(job.get(column))
+
+    table = pd.DataFrame(columns).rename(columns={'id': 'job_id'})
+    table = table.astype({'pipeline_id': 'int64', 'job_id': 'int64',
+                          'duration': 'float64', 'queued_duration': 'float64'})
+    for column in CATEGORICAL_COLUMNS:
+        table[column] = table[column].astype('category')
+    for column in TIMESTAMP_COLUMNS:
+        table[column] = pd.to_datetime(table[column], utc=True, format='ISO8601')
+    return table
+
+def write_parquet(table, path):
+    table.to_parquet(path, index=False)
+
+def read_parquet(paths):
+    """
+    Load one or more exported datasets; job attempts present in several files are kept once.
+    """
+    _require_pandas()
+    tables = [pd.read_parquet(path) for path in paths]
+    table = pd.concat(tables, ignore_index=True) if len(tables) > 1 else tables[0]
+    table = table.drop_duplicates(subset=['project_id', 'job_id'], keep='last')
+    for column in CATEGORICAL_COLUMNS:
+        table[column] = table[column].astype('category')
+    return table
+
+def _latest_attempt_mask(table):
+    """
+    Boolean mask of the latest attempt (highest job ID) of each job name in each pipeline.
+    """
+    latest_ids = table.groupby(['project_id', 'pipeline_id', 'name'], observed=True)['job_id'].transform('max')
+    return table['job_id'] == latest_ids
+
+def _records(frame):
+    return {name: row for name, row in frame.to_dict(orient='index').items()}
+
+def pipeline_durations(table):
+    """
+    Pipeline durations in seconds as the union of the running intervals of the latest attempt
+    of each job, computed by splitting each pipeline's jobs into non-overlapping segments.
+    """
+    timed = table[_latest_attempt_mask(table)].dropna(subset=['started_at', 'finished_at'])
+    timed = timed.sort_values(['pipeline_id', 'started_at'])
+    by_pipeline = timed.groupby('pipeline_id', sort=False)
+    # A job opens a new segment when it starts after every earlier job in its pipeline has finished
+    previous_end = by_pipeline['finished_at'].cummax().groupby(timed['pipeline_id'], sort=False).shift()
+    segment = (previous_end.isna() | (timed['started_at'] > previous_end)).cumsum()
+    segments = timed.groupby(segment).agg(pipeline_id=('pipeline_id', 'first'),
+                                          start=('started_at', 'min'), end=('finished_at', 'max'))
+    segments['seconds'] = (segments['end'] - segments['start']).dt.total_seconds()
+    return segments.groupby('pipeline_id')['seconds'].sum()
+
+def branch_runtime_stats(table):
+    """
+    Pipeline runtimes grouped by branch, like analyze_pipeline_runtimes.
+    """
+    durations = pipeline_durations(table).rename('minutes') / 60
+    refs = table.drop_duplicates('pipeline_id').set_index('pipeline_id')['ref']
+    frame = pd.concat([durations, refs], axis=1, join='inner')
+    stats = frame.groupby('ref', observed=True)['minutes'].agg(slowest='max', fastest='min', average='mean')
+    return _records(stats)
+
+def job_duration_stats(table):
+    """
+    Duration statistics of the latest attempt of each job, like analyze_job_durations.
+    """
+    latest = table[_latest_attempt_mask(table) & table['duration'].notna()]
+    minutes = (latest['duration'] / 60).groupby(latest['name'], observed=True)
+    stats = minutes.agg(slowest='max', fastest='min', average='mean', stddev='std', count='count')
+    stats['stddev'] = stats['stddev'].fillna(0.0)
+    for q in REPORTED_QUANTILES:
+        stats[f"p{round(q * 100)}"] = minutes.quantile(q)
+    return _records(stats)
+
+def job_retry_stats(table):
+    """
+    Runs, successes, failures, retries, retried minutes and reliability per job name,
+    like analyze_retries()['jobs'].
+    """
+    by_name = table.groupby('name', observed=True)
+    retried = ~_latest_attempt_mask(table)
+    stats = pd.DataFrame({
+        'total_runs': by_name.size(),
+        'successes': (table['status'] == 'success').groupby(table['name'], observed=True).sum(),
+        'failures': (table['status'] == 'failed').groupby(table['name'], observed=True).sum(),
+        'retries': retried.groupby(table['name'], observed=True).sum(),
+    }).astype('int64')
+    retry_minutes = (table['duration'].where(retried) / 60).groupby(table['name'], observed=True).sum()
+    results = {name: {key: int(value) for key, value in row.items()} for name, row in _records(stats).items()}
+    for name, stats in results.items():
+        stats['retry_minutes'] = float(retry_minutes.get(name, 0.0))
+        stats['reliability'] = (stats['total_runs'] - stats['retries']) / stats['total_runs'] * 100
+    return results
+
+def retry_failure_reason_stats(table):
+    """
+    Retried attempts and their minutes per failure reason, like analyze_retries()['failure_reasons'].
+    """
+    retried = table[~_latest_attempt_mask(table)]
+    reasons = retried['failure_reason'].astype('object').fillna('unknown')
+    minutes = (retried['duration'] / 60).groupby(reasons)
+    stats = pd.DataFrame({'retries': reasons.groupby(reasons).size(), 'minutes': minutes.sum()})
+    return {reason: {'retries': int(row['retries']), 'minutes': float(row['minutes']),
+                     'average': float(row['minutes']) / int(row['retries'])}
+            for reason, row in _records(stats).items()}
+
+def retry_duration_stats(table):
+    """
+    Time spent in retried (superseded) attempts per job name, like analyze_retries()['durations'].
+    Returns a tuple: (retry_stats, total_retried_jobs).
+    """
+    retried = table[~_latest_attempt_mask(table) & table['duration'].notna()]
+    minutes = (retried['duration'] / 60).groupby(retried['name'], observed=True)
+    stats = minutes.agg(total_duration='sum', count='count', avg_duration='mean')
+    retry_stats = {name: {'total_duration': row['total_duration'], 'count': int(row['count']),
+                          'avg_duration': row['avg_duration']}
+                   for name, row in _records(stats).items()}
+    return retry_stats, len(retried)
+
+def run_script():
+    parser = argparse.ArgumentParser(description="Re-analyze exported pipeline job datasets offline.")
+    parser.add_argument("paths", nargs="+", help="Parquet files written by the pipeline audit")
+    parser.add_argument("--since", help="Only include pipelines updated on or after this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    table = read_parquet(args.paths)
+    if args.since:
+        table = table[table['pipeline_updated_at'] >= pd.Timestamp(args.since, tz='UTC')]
+    print(f"{len(table)} job attempts in {table['pipeline_id'].nunique()} pipelines\n")
+
+    retry_stats, total_retried_jobs = retry_duration_stats(table)
+    sections = [
+        ("PIPELINE RUNTIMES BY BRANCH (min)", branch_runtime_stats(table)),
+        ("JOB DURATIONS (min)", job_duration_stats(table)),
+        ("JOB RETRIES AND RELIABILITY", job_retry_stats(table)),
+        (f"RETRY DURATIONS (min), {total_retried_jobs} retried jobs", retry_stats),
+    ]
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.2f}'.format):
+        for title, stats in sections:
+            print(title)
+            print("=" * 100)
+            print(pd.DataFrame.from_dict(stats, orient='index').sort_index().to_string() if stats else "No data")
+            print()
+
+if __name__ == "__main__":
+    run_script()
@@ -0,0 +1,158 @@
+"""
+Streaming, constant-memory statistics shared by the pipeline audit scripts.
+
+Values are folded into the aggregators one at a time as jobs arrive, so memory grows
+with the number of distinct job names rather than with the number of jobs:
+- `RunningStats` keeps count, min, max, mean and variance (Welford's algorithm).
+- `QuantileSketch` is a DDSketch-style log-bucketed histogram. Any quantile it returns is
+  within `relative_accuracy` of the exact value (linear interpolation between the closest
+  ranks, as numpy and pandas compute it), and two sketches merge by adding buckets.
+- `DurationStats` keeps one of each per job name.
+"""
+import math
+from collections import defaultdict
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+REPORTED_QUANTILES = (0.5, 0.9, 0.99)
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """
+        Fold another RunningStats into this one (Chan et al. parallel variance).
+        """
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] += bucket_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value_at_rank(self, rank, indexes):
+        """
+        Return the representative value of the item at a 0-based integer rank.
+        """
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in indexes:
+            seen += self.buckets[index]
+            if rank < seen:
+                break
+        # Every value in the bucket (gamma^(i-1), gamma^i] is within relative_accuracy of this one
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Return the approximate q-quantile (0 <= q <= 1), or None if the sketch is empty.
+        Like the exact quantile, it interpolates linearly between the items at the two ranks
+        around q * (count - 1); each is within relative_accuracy, so their interpolation is too.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        lower_rank = math.floor(rank)
+        indexes = sorted(self.buckets)
+        lower = self._value_at_rank(lower_rank, indexes)
+        if rank == lower_rank:
+            return lower
+        upper = self._value_at_rank(lower_rank + 1, indexes)
+        return lower + (upper - lower) * (rank - lower_rank)
+
+class DurationStats:
+    """
+    Per-name running statistics and quantile sketches of durations.
+    """
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.stats = defaultdict(RunningStats)
+        self.sketches = defaultdict(lambda: QuantileSketch(self.relative_accuracy))
+
+    def add(self, name, value):
+        self.stats[name].add(value)
+        self.sketches[name].add(value)
+
+    def add_jobs(self, jobs):
+        """
+        Fold the durations of finished jobs in, in minutes.
+        """
+        for job in jobs:
+            duration = job.get('duration')  # Duration in seconds
+            if duration is not None:
+                self.add(job['name'], duration / 60)  # Convert to minutes
+
+    def merge(self, other):
+        for name, stats in other.stats.items():
+            self.stats[name].merge(stats)
+            self.sketches[name].merge(other.sketches[name])
+
+    def results(self):
+        """
+        Return {name: {"slowest", "fastest", "average", "stddev", "count", "p50", "p90", "p99"}}.
+        """
+        results = {}
+        for name, stats in self.stats.items():
+            if stats.count == 0:
+                continue
+            result = {
+                "slowest": stats.maximum,
+                "fastest": stats.minimum,
+                "average": stats.mean,
+                "stddev": stats.stddev,
+                "count": stats.count,
+            }
+            for q in REPORTED_QUANTILES:
+                # Sketch estimates can drift just outside the observed range; clamp them into it
+                estimate = self.sketches[name].quantile(q)
+                result[f"p{round(q * 100)}"] = min(max(estimate, stats.minimum), stats.maximum)
+            results[name] = result
+        return results
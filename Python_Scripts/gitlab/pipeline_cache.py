@@ -0,0 +1,206 @@
+"""
+Persistent SQLite cache of GitLab pipelines and jobs shared by the pipeline audit scripts.
+
+Pipelines that reached a terminal state (success, failed, canceled, skipped) never change
+unless someone retries them, which bumps their `updated_at`. The cache keeps every pipeline
+seen per project together with the jobs and details of the terminal ones, and remembers a
+high-water mark (the newest `updated_at` seen). A refresh then only lists pipelines updated
+after that mark and re-checks the pipelines that were still running last time.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+TERMINAL_STATUSES = {"success", "failed", "canceled", "skipped"}
+
+def _timestamp(value):
+    """
+    Normalize an ISO 8601 timestamp to UTC 'YYYY-MM-DDTHH:MM:SS' so cache rows compare as strings.
+    Timestamps with an offset are converted to UTC; those without one are taken as UTC, like
+    the ones the cache stores.
+    """
+    if not value:
+        return ""
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+class PipelineCache:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS pipelines (
+                    project_id TEXT NOT NULL,
+                    pipeline_id INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    status TEXT,
+                    data TEXT NOT NULL,
+                    details TEXT,
+                    PRIMARY KEY (project_id, pipeline_id)
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    project_id TEXT NOT NULL,
+                    pipeline_id INTEGER NOT NULL,
+                    include_retried INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (project_id, pipeline_id, include_retried)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    project_id TEXT PRIMARY KEY,
+                    covered_since TEXT NOT NULL,
+                    high_water_mark TEXT NOT NULL
+                );
+            """)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def sync_state(self, project_id):
+        """
+        Return (covered_since, high_water_mark) for a project, or (None, None) if never synced.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT covered_since, high_water_mark FROM sync_state WHERE project_id = ?",
+                (str(project_id),)).fetchone()
+        return row if row else (None, None)
+
+    def set_sync_state(self, project_id, covered_since, high_water_mark):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state (project_id, covered_since, high_water_mark) VALUES (?, ?, ?)",
+                (str(project_id), covered_since, high_water_mark))
+
+    def store_pipelines(self, project_id, pipelines):
+        """
+        Insert or update pipelines. A pipeline whose `updated_at` changed (e.g. it was retried)
+        loses its cached jobs and details.
+        """
+        with self.lock, self.connection:
+            for pipeline in pipelines:
+                key = (str(project_id), pipeline['id'])
+                updated_at = _timestamp(pipeline.get('updated_at'))
+                row = self.connection.execute(
+                    "SELECT updated_at FROM pipelines WHERE project_id = ? AND pipeline_id = ?", key).fetchone()
+                if row and row[0] != updated_at:
+                    self.connection.execute("DELETE FROM jobs WHERE project_id = ? AND pipeline_id = ?", key)
+                    self.connection.execute(
+                        "UPDATE pipelines SET details = NULL WHERE project_id = ? AND pipeline_id = ?", key)
+                self.connection.execute(
+                    "INSERT INTO pipelines (project_id, pipeline_id, updated_at, status, data) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (project_id, pipeline_id) DO UPDATE SET "
+                    "updated_at = excluded.updated_at, status = excluded.status, data = excluded.data",
+                    (*key, updated_at, pipeline.get('status'), json.dumps(pipeline)))
+
+    def pipelines(self, project_id, updated_after_iso):
+        """
+        Return the cached pipelines updated after the given date, newest first.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM pipelines WHERE project_id = ? AND updated_at > ? ORDER BY pipeline_id DESC",
+                (str(project_id), _timestamp(updated_after_iso))).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def pending_pipeline_ids(self, project_id, updated_after_iso):
+        """
+        Return the IDs of cached pipelines in the window that were not finished when last seen.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT pipeline_id, status FROM pipelines WHERE project_id = ? AND updated_at > ?",
+                (str(project_id), _timestamp(updated_after_iso))).fetchall()
+        return [pipeline_id for pipeline_id, status in rows if status not in TERMINAL_STATUSES]
+
+    def _is_terminal(self, project_id, pipeline_id):
+        row = self.connection.execute(
+            "SELECT status FROM pipelines WHERE project_id = ? AND pipeline_id = ?",
+            (str(project_id), pipeline_id)).fetchone()
+        return bool(row) and row[0] in TERMINAL_STATUSES
+
+    def pipeline_details(self, project_id, pipeline_id):
+        """
+        Return the cached details of a finished pipeline, or None on a cache miss.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT details FROM pipelines WHERE project_id = ? AND pipeline_id = ?",
+                (str(project_id), pipeline_id)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def store_pipeline_details(self, project_id, pipeline_id, details):
+        """
+        Cache pipeline details, but only once the pipeline has finished.
+        """
+        if details.get('status') not in TERMINAL_STATUSES:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE pipelines SET details = ? WHERE project_id = ? AND pipeline_id = ? AND status = ?",
+                (json.dumps(details), str(project_id), pipeline_id, details.get('status')))
+
+    def jobs(self, project_id, pipeline_id, include_retried=False):
+        """
+        Return the cached jobs of a finished pipeline, or None on a cache miss.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM jobs WHERE project_id = ? AND pipeline_id = ? AND include_retried = ?",
+                (str(project_id), pipeline_id, int(include_retried))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store_jobs(self, project_id, pipeline_id, jobs, include_retried=False):
+        """
+        Cache the jobs of a pipeline, but only once the pipeline has finished.
+        """
+        with self.lock, self.connection:
+            if not self._is_terminal(project_id, pipeline_id):
+                return
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs (project_id, pipeline_id, include_retried, data) VALUES (?, ?, ?, ?)",
+                (str(project_id), pipeline_id, int(include_retried), json.dumps(jobs)))
+
+def refresh_pipelines(cache, project_id, updated_after_iso, fetch_pipelines, fetch_pipeline, logger=logging):
+    """
+    Bring the cache up to date for a project and return every pipeline in the window.
+
+    `fetch_pipelines(updated_after_iso)` lists pipelines from the API and
+    `fetch_pipeline(pipeline_id)` fetches a single pipeline (or returns None). Only pipelines
+    updated after the high-water mark are listed, unless the window now starts before what
+    the cache covers, in which case the whole window is listed again.
+    Progress is logged to `logger` (e.g. the project's logger), by default the root logger.
+    """
+    window_start = _timestamp(updated_after_iso)
+    covered_since, high_water_mark = cache.sync_state(project_id)
+    if covered_since is None or covered_since > window_start:
+        # First sync, or the window now reaches further back than the cache covers
+        covered_since, list_after = window_start, updated_after_iso
+    else:
+        list_after = max(high_water_mark, window_start) + "Z"  # Cached timestamps are UTC
+
+    # Pipelines that were still running last time; re-check any the listing does not return
+    pending_ids = cache.pending_pipeline_ids(project_id, updated_after_iso)
+
+    fresh_pipelines = fetch_pipelines(list_after)
+    cache.store_pipelines(project_id, fresh_pipelines)
+
+    seen_ids = {pipeline['id'] for pipeline in fresh_pipelines}
+    rechecked_ids = [pipeline_id for pipeline_id in pending_ids if pipeline_id not in seen_ids]
+    for pipeline_id in rechecked_ids:
+        pipeline = fetch_pipeline(pipeline_id)
+        if pipeline:
+            cache.store_pipelines(project_id, [pipeline])
+
+    timestamps = [_timestamp(pipeline.get('updated_at')) for pipeline in fresh_pipelines]
+    cache.set_sync_state(project_id, covered_since, max(timestamps + [high_water_mark or "", _timestamp(list_after)]))
+    pipelines = cache.pipelines(project_id, updated_after_iso)
+    logger.info(f"Pipeline cache: listed {len(fresh_pipelines)} pipelines updated after {list_after}, "
+                 f"re-checked {len(rechecked_ids)} unfinished, {len(pipelines)} pipelines in the window")
+    return pipelines
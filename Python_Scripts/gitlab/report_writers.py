@@ -0,0 +1,174 @@
+"""
+Machine-readable output for the audit scripts, next to their fixed-width text reports.
+
+The analyses produce stats as {key: {field: value}} dicts (e.g. {branch: {"slowest": ...}}).
+Each writer below streams those dicts to disk section by section as the analyses finish,
+so nothing is buffered beyond the section being written:
+- `JsonLinesWriter`: one JSON object per key and section in `<prefix>.jsonl`.
+- `CsvWriter`: one CSV file per section, `<prefix>_<section>.csv`.
+- `OpenMetricsWriter`: Prometheus/OpenMetrics text exposition format in `<prefix>.prom`,
+  one gauge family per numeric field (`<namespace>_<section>_<field>`), suitable for the
+  node_exporter textfile collector or any scraper that reads the format. Fields ending in a
+  suffix OpenMetrics reserves for counters, histograms and summaries are renamed, e.g.
+  `count` is written as `samples` (`<namespace>_job_duration_samples`).
+
+Every record carries the writer's fixed labels (e.g. the project) plus the section's key. A key
+can also be a tuple with a tuple of labels, e.g. ("project", "branch"), to put several projects
+in one section.
+`open_writers` builds the writers for a list of format names and fans each section out to all of them.
+"""
+import csv
+import json
+import math
+import re
+
+def _key_fields(key_label, key):
+    """
+    Map a section key to its label(s): none, one, or one per element of a tuple key.
+    """
+    if key_label is None:
+        return {}
+    if isinstance(key_label, tuple):
+        return dict(zip(key_label, key))
+    return {key_label: key}
+
+class JsonLinesWriter:
+    def __init__(self, path_prefix, labels, namespace):
+        self.labels = labels
+        self.path = f"{path_prefix}.jsonl"
+        self.file = open(self.path, "w")
+
+    def write_section(self, section, key_label, stats):
+        for key, fields in stats.items():
+            record = {"section": section, **self.labels, **_key_fields(key_label, key)}
+            record.update(fields)
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter:
+    def __init__(self, path_prefix, labels, namespace):
+        self.labels = labels
+        self.path_prefix = path_prefix
+        self.path = f"{path_prefix}_<section>.csv"
+
+    def write_section(self, section, key_label, stats):
+        if not stats:
+            return
+        path = f"{self.path_prefix}_{section}.csv"
+        field_columns = list(dict.fromkeys(field for fields in stats.values() for field in fields))
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            for index, (key, fields) in enumerate(stats.items()):
+                key_fields = _key_fields(key_label, key)
+                if index == 0:
+                    writer.writerow(list(self.labels) + list(key_fields) + field_columns)
+                writer.writerow(list(self.labels.values()) + list(key_fields.values())
+                                + [fields.get(field) for field in field_columns])
+
+    def close(self):
+        pass
+
+# OpenMetrics reserves these suffixes for the samples of other metric types
+GAUGE_FIELD_RENAMES = {"count": "samples"}
+RESERVED_SUFFIXES = ("_total", "_created", "_count", "_sum", "_bucket", "_gcount", "_gsum", "_info")
+
+def _metric_name(*parts):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', "_".join(parts))
+
+def _gauge_name(namespace, section, field):
+    name = _metric_name(namespace, section, GAUGE_FIELD_RENAMES.get(field, field))
+    return f"{name}_value" if name.endswith(RESERVED_SUFFIXES) else name
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _sample_value(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class OpenMetricsWriter:
+    """
+    Writes to `<path_prefix>.prom`, or to an already open text `file` (e.g. a StringIO that an
+    HTTP endpoint serves), which is then left open.
+    """
+    def __init__(self, path_prefix, labels, namespace, file=None):
+        self.labels = labels
+        self.namespace = namespace
+        if file is not None:
+            self.path, self.file, self.owns_file = None, file, False
+        else:
+            self.path = f"{path_prefix}.prom"
+            self.file, self.owns_file = open(self.path, "w"), True
+
+    def write_section(self, section, key_label, stats):
+        # Samples of one metric family must be contiguous, so write one field at a time
+        fields = dict.fromkeys(field for values in stats.values() for field, value in values.items()
+                               if isinstance(value, (int, float)) and not isinstance(value, bool))
+        for field in fields:
+            name = _gauge_name(self.namespace, section, field)
+            self.file.write(f"# TYPE {name} gauge\n")
+            for key, values in stats.items():
+                value = values.get(field)
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                labels = {**self.labels, **_key_fields(key_label, key)}
+                label_text = ",".join(f'{_metric_name(label)}="{_label_value(label_value)}"'
+                                      for label, label_value in labels.items())
+                self.file.write(f"{name}{{{label_text}}} {_sample_value(value)}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.write("# EOF\n")
+        if self.owns_file:
+            self.file.close()
+
+WRITERS = {
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+    "openmetrics": OpenMetricsWriter,
+}
+
+class ReportWriters:
+    """
+    Fan each section out to several writers.
+    """
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write_section(self, section, key_label, stats):
+        """
+        Write one section of {key: {field: value}} stats. With `key_label` None, the section
+        is a single record: pass it as {None: fields}.
+        """
+        for writer in self.writers:
+            writer.write_section(section, key_label, stats)
+
+    @property
+    def paths(self):
+        return [writer.path for writer in self.writers]
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_writers(formats, path_prefix, labels, namespace):
+    """
+    Open a writer for each format name in `formats` ("jsonl", "csv", "openmetrics").
+    Raises ValueError on an unknown format.
+    """
+    unknown = [name for name in formats if name not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s) {', '.join(unknown)}; choose from {', '.join(WRITERS)}")
+    return ReportWriters([WRITERS[name](path_prefix, labels, namespace) for name in formats])
@@ -0,0 +1,192 @@
+"""
+Run profile for the gitlab scripts: where a run's wall-clock time goes.
+
+A `RunProfile` is shared by all threads of a script and records:
+- every HTTP request attempt sent by `gitlab_client.request_with_retry`, per endpoint (the URL
+  path with IDs and file paths replaced by placeholders, e.g. `/projects/:id/pipelines/:id/jobs`):
+  status, latency (fixed histogram buckets plus p50/p90/p99 from a quantile sketch), bytes
+  received, errors and retries;
+- local cache lookups (hits and misses) per kind;
+- time spent in named phases, e.g. `fetch`, `json`, `analyze`, `write`.
+
+Phases and request latency are summed over threads, so with concurrent workers they can exceed
+the wall-clock time of the run. Different phases may nest (`json` parsing happens during
+`fetch`); a phase nested in itself is only counted once. `summary()` returns a printable
+report and `write_json(path)` saves the full profile.
+"""
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from job_stats import QuantileSketch, RunningStats
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Path segments following these hold names (file paths, branches, variables) rather than resources
+NAME_SEGMENTS = {"files", "branches", "tags", "variables", "commits"}
+
+def endpoint_name(url):
+    """
+    Reduce a request URL to its endpoint: the API path without query, IDs or names.
+    """
+    segments = urlsplit(url).path.split("/")
+    if segments[1:3] == ["api", "v4"]:
+        segments = [""] + segments[3:]
+    normalized = []
+    for index, segment in enumerate(segments):
+        if segment.isdigit() or "%2F" in segment.upper():
+            normalized.append(":id" if segment.isdigit() else ":path")
+        elif index > 0 and segments[index - 1] in NAME_SEGMENTS and segment:
+            normalized.append(":name")
+        else:
+            normalized.append(segment)
+    return "/".join(normalized) or "/"
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.statuses = defaultdict(int)
+        self.latency = RunningStats()
+        self.latency_sketch = QuantileSketch()
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def to_dict(self):
+        result = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "statuses": dict(self.statuses),
+            "latency_ms": {
+                "total": self.latency.mean * self.latency.count,
+                "average": self.latency.mean,
+                "max": self.latency.maximum if self.latency.count else None,
+            },
+            "latency_histogram_ms": {
+                **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)},
+                "le_inf": self.histogram[-1],
+            },
+        }
+        for q in (0.5, 0.9, 0.99):
+            estimate = self.latency_sketch.quantile(q)
+            if estimate is not None:
+                estimate = min(max(estimate, self.latency.minimum), self.latency.maximum)
+            result["latency_ms"][f"p{round(q * 100)}"] = estimate
+        return result
+
+class RunProfile:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.endpoints = defaultdict(EndpointStats)
+        self.cache = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.phases = defaultdict(float)
+        self.local = threading.local()
+
+    def record_request(self, url, seconds, status=None, size=0, error=None):
+        """
+        Record one request attempt; `status` is None when no response was received.
+        """
+        milliseconds = seconds * 1000
+        bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS_MS) if milliseconds <= bound),
+                      len(LATENCY_BUCKETS_MS))
+        with self.lock:
+            stats = self.endpoints[endpoint_name(url)]
+            stats.requests += 1
+            stats.bytes += size
+            stats.statuses[str(status) if status is not None else type(error).__name__] += 1
+            if error is not None or (status is not None and status >= 400):
+                stats.errors += 1
+            stats.latency.add(milliseconds)
+            stats.latency_sketch.add(milliseconds)
+            stats.histogram[bucket] += 1
+
+    def record_retry(self, url):
+        with self.lock:
+            self.endpoints[endpoint_name(url)].retries += 1
+
+    def record_cache(self, kind, hit):
+        with self.lock:
+            self.cache[kind]["hits" if hit else "misses"] += 1
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block of code as part of a phase.
+        """
+        active = self.local.__dict__.setdefault("active", set())
+        if name in active:
+            yield
+            return
+        active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            active.discard(name)
+            self.add_time(name, time.perf_counter() - started)
+
+    def timed(self, name):
+        """
+        Decorator that times every call of a function as part of a phase.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_dict(self):
+        with self.lock:
+            endpoints = {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())}
+            return {
+                "wall_seconds": time.perf_counter() - self.started,
+                "requests": sum(stats["requests"] for stats in endpoints.values()),
+                "bytes": sum(stats["bytes"] for stats in endpoints.values()),
+                "http_seconds": sum(stats["latency_ms"]["total"] for stats in endpoints.values()) / 1000,
+                "phases_seconds": dict(self.phases),
+                "cache": {kind: dict(counts) for kind, counts in self.cache.items()},
+                "endpoints": endpoints,
+            }
+
+    def write_json(self, path):
+        with open(path, "w") as json_file:
+            json.dump(self.to_dict(), json_file, indent=2)
+
+    def summary(self):
+        """
+        Return a printable run profile.
+        """
+        profile = self.to_dict()
+        lines = [
+            f"Run profile: {profile['wall_seconds']:.2f}s wall clock, {profile['requests']} requests, "
+            f"{profile['bytes'] / 1024:.1f} KiB received, {profile['http_seconds']:.2f}s in HTTP (summed over threads)",
+        ]
+        if profile["phases_seconds"]:
+            lines.append("Phases (summed over threads): " + ", ".join(
+                f"{name} {seconds:.2f}s" for name, seconds in sorted(profile["phases_seconds"].items(),
+                                                                    key=lambda item: -item[1])))
+        for kind, counts in sorted(profile["cache"].items()):
+            lookups = counts["hits"] + counts["misses"]
+            lines.append(f"Cache {kind}: {counts['hits']}/{lookups} hits ({counts['hits'] / lookups * 100:.1f}%)")
+        if profile["endpoints"]:
+            lines.append(f"{'Endpoint':<45} {'Requests':<9} {'Errors':<7} {'Retries':<8} {'KiB':<9} "
+                         f"{'Avg ms':<8} {'p50 ms':<8} {'p90 ms':<8} {'p99 ms':<8} {'Max ms':<8}")
+            for name, stats in sorted(profile["endpoints"].items(), key=lambda item: -item[1]["latency_ms"]["total"]):
+                latency = stats["latency_ms"]
+                lines.append(f"{name:<45} {stats['requests']:<9} {stats['errors']:<7} {stats['retries']:<8} "
+                             f"{stats['bytes'] / 1024:<9.1f} {latency['average']:<8.1f} {latency['p50']:<8.1f} "
+                             f"{latency['p90']:<8.1f} {latency['p99']:<8.1f} {latency['max']:<8.1f}")
+        return "\n".join(lines)
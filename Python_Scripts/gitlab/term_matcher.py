@@ -0,0 +1,75 @@
+"""
+Multi-term literal matching shared by the gitlab search scripts.
+
+`TermMatcher` builds an Aho-Corasick automaton over a list of literal terms (e.g. hundreds of
+service account emails or key fingerprints). Each text is scanned once, in time linear in its
+length plus the number of matches, however many terms there are, and every occurrence of every
+term is reported, including terms that overlap or contain one another (which a combined
+alternation regex would miss).
+
+`load_terms` reads a term list file: one term per line, blank lines and lines starting with
+`#` are ignored.
+"""
+from collections import deque
+
+def load_terms(path):
+    with open(path) as terms_file:
+        return [line.strip() for line in terms_file if line.strip() and not line.lstrip().startswith("#")]
+
+class TermMatcher:
+    def __init__(self, terms, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        # State 0 is the root; each state has its transitions, failure link and matched terms
+        self.transitions = [{}]
+        self.failure = [0]
+        self.outputs = [[]]
+        for term in self.terms:
+            state = 0
+            for char in self._normalize(term):
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions.append({})
+                    self.failure.append(0)
+                    self.outputs.append([])
+                    self.transitions[state][char] = next_state
+                state = next_state
+            self.outputs[state].append(term)
+
+        # Breadth first, so a state's failure target (always shallower) is complete before it
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.failure[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.failure[fallback]
+                target = self.transitions[fallback].get(char, 0)
+                self.failure[next_state] = target if target != next_state else 0
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.failure[next_state]]
+
+    def _normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def finditer(self, text):
+        """
+        Yield (start, term) for every occurrence of every term in `text`, in order of their end.
+        With `ignore_case`, positions refer to the lower-cased text.
+        """
+        transitions, failure, outputs = self.transitions, self.failure, self.outputs
+        state = 0
+        for index, char in enumerate(self._normalize(text)):
+            while state and char not in transitions[state]:
+                state = failure[state]
+            state = transitions[state].get(char, 0)
+            for term in outputs[state]:
+                yield index - len(term) + 1, term
+
+    def matching_terms(self, text):
+        """
+        Return the terms that occur in `text`, in term list order.
+        """
+        found = {term for _, term in self.finditer(text)}
+        return [term for term in self.terms if term in found]
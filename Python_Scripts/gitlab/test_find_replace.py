@@ -0,0 +1,119 @@
+"""
+find_replace_gitlab.py against the fake GitLab server: batched commits, ordered output and resuming.
+"""
+import threading
+
+import pytest
+
+import fake_gitlab_server
+import find_replace_gitlab
+from find_replace_gitlab import Config
+
+PROJECTS = 12
+
+@pytest.fixture
+def server():
+    server = fake_gitlab_server.start_server(port=0, projects=PROJECTS, pipelines=0, files=20, match_rate=0.3)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def configured(server, tmp_path, monkeypatch):
+    for name, value in {
+        "GITLAB_URL": fake_gitlab_server.server_url(server),
+        "ACCESS_TOKEN": "test-token",
+        "LOG_FILE": str(tmp_path / "log.txt"),
+        "SEARCH_TERM": fake_gitlab_server.Config.SEARCH_TERM,
+        "REPLACEMENT_TERM": "https://registry.example.com",
+        "TARGET_NAMESPACE": "/group",
+        "BRANCH_PREFIX": "test",
+        "MAX_WORKERS": 4,
+    }.items():
+        monkeypatch.setattr(Config, name, value)
+    return server.RequestHandlerClass
+
+def new_branches(data):
+    """
+    Return {project ID: {path: content}} of the branches the script created.
+    """
+    return {project_id: files for project_id, branches in data.repositories.items()
+            for branch, files in branches.items() if branch != "main"}
+
+def log_lines():
+    with open(Config.LOG_FILE) as log:
+        return log.read().splitlines()
+
+@pytest.mark.parametrize("batch_commit", [True, False])
+def test_replaces_the_term_in_every_project(configured, monkeypatch, batch_commit):
+    monkeypatch.setattr(Config, "BATCH_COMMIT", batch_commit)
+    find_replace_gitlab.run_script()
+
+    data = configured.data
+    branches = new_branches(data)
+    assert branches and len(data.merge_requests) == len(branches)
+    for project_id, files in branches.items():
+        main = data.repositories[project_id]["main"]
+        assert files == {path: content.replace(Config.SEARCH_TERM, Config.REPLACEMENT_TERM)
+                         for path, content in main.items()}
+    assert sum(line.startswith("PROCESSED: ") for line in log_lines()) == PROJECTS
+
+def test_batch_mode_makes_one_commit_per_project(configured, monkeypatch):
+    monkeypatch.setattr(Config, "BATCH_COMMIT", True)
+    calls = []
+    original = find_replace_gitlab.GitlabAPI.create_commit
+    def create_commit(self, project_id, branch_name, actions, *args, **kwargs):
+        calls.append((project_id, len(actions)))
+        return original(self, project_id, branch_name, actions, *args, **kwargs)
+    monkeypatch.setattr(find_replace_gitlab.GitlabAPI, "create_commit", create_commit)
+    monkeypatch.setattr(find_replace_gitlab.GitlabAPI, "commit_changes", None)
+    monkeypatch.setattr(find_replace_gitlab.GitlabAPI, "create_branch", None)
+    find_replace_gitlab.run_script()
+
+    branches = new_branches(configured.data)
+    assert not [line for line in log_lines() if line.startswith("Error")]
+    assert sorted(project_id for project_id, _ in calls) == sorted(branches)
+    assert all(count >= 1 for _, count in calls)
+
+def test_output_is_written_in_project_order(configured):
+    find_replace_gitlab.run_script()
+    processing = [line for line in log_lines() if line.startswith(("Processing project: ", "No instances found in "))]
+    names = [line.split(": ", 1)[1].split(" on branch")[0] if line.startswith("Processing")
+             else line[len("No instances found in "):].split(" (")[0] for line in processing]
+    assert names == [f"Project {project_id}" for project_id in range(1, PROJECTS + 1)]
+
+def test_rerun_skips_processed_projects(configured):
+    find_replace_gitlab.run_script()
+    merge_requests = len(configured.data.merge_requests)
+    find_replace_gitlab.run_script()
+    assert len(configured.data.merge_requests) == merge_requests
+    assert sum(line.startswith("Skipping already processed project: ") for line in log_lines()) == PROJECTS
+
+def test_markers_match_whole_project_names(configured):
+    with open(Config.LOG_FILE, "w") as log:
+        log.write("PROCESSED: Project 10\n")
+    assert find_replace_gitlab.is_project_processed("Project 10")
+    assert not find_replace_gitlab.is_project_processed("Project 1")
+
+def test_interrupt_keeps_the_markers_of_finished_projects(configured, monkeypatch):
+    original = find_replace_gitlab.process_project
+    release = threading.Event()
+    def process_project(gitlab_api, project, *args):
+        if project['id'] == 1:
+            release.wait(10)  # Holds project 1's ordered output back while later projects finish
+        if project['id'] == 6:
+            raise KeyboardInterrupt
+        return original(gitlab_api, project, *args)
+    monkeypatch.setattr(find_replace_gitlab, "process_project", process_project)
+    threading.Timer(1.0, release.set).start()
+
+    with pytest.raises(KeyboardInterrupt):
+        find_replace_gitlab.run_script()
+
+    data = configured.data
+    marked = {line[len("PROCESSED: "):] for line in log_lines() if line.startswith("PROCESSED: ")}
+    with_merge_request = {f"Project {project_id}" for project_id in new_branches(data)}
+    # Every branch and merge request that was created is marked, so a rerun does not create it again
+    assert with_merge_request <= marked
+    assert len(marked) < PROJECTS
+    assert "Project 6" not in marked
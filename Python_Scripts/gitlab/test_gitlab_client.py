@@ -0,0 +1,166 @@
+"""
+Pagination, rate limiting and retries of gitlab_client.py against canned responses.
+"""
+import json
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+import requests
+
+import gitlab_client
+from gitlab_client import MIN_RATE, Paginator, RateLimiter, request_with_retry
+
+def make_response(items, status=200, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(items).encode()
+    response.headers.update(headers or {})
+    return response
+
+class FakeEndpoint:
+    """
+    A list endpoint of `total` items: records each request and answers through `respond(page, items)`.
+    """
+    def __init__(self, total, respond, fail_on_page=None):
+        self.items = list(range(total))
+        self.respond = respond
+        self.fail_on_page = fail_on_page
+        self.requests = []
+
+    def __call__(self, url, params=None):
+        self.requests.append((url, dict(params or {})))
+        # Link headers carry the query in the URL
+        params = {**dict(parse_qsl(urlsplit(url).query)), **(params or {})}
+        page = int(params.get("page", 1))
+        if page == self.fail_on_page:
+            return None
+        per_page = int(params["per_page"])
+        return self.respond(page, self.items[(page - 1) * per_page:page * per_page])
+
+def test_follows_x_next_page_without_an_extra_request():
+    def respond(page, items):
+        return make_response(items, headers={"X-Next-Page": str(page + 1) if page < 3 else ""})
+    endpoint = FakeEndpoint(30, respond)
+    paginator = Paginator(endpoint, "http://gitlab.local/api/v4/projects", per_page=10)
+    assert list(paginator.items()) == list(range(30))
+    assert len(endpoint.requests) == 3
+    assert paginator.complete and paginator.pages == 3
+
+def test_follows_keyset_link_headers():
+    def respond(page, items):
+        headers = {}
+        if page < 2:
+            headers["Link"] = f'<http://gitlab.local/api/v4/projects?id_after={items[-1]}&page={page + 1}&per_page=10>; rel="next"'
+        return make_response(items, headers=headers)
+    endpoint = FakeEndpoint(20, respond)
+    paginator = Paginator(endpoint, "http://gitlab.local/api/v4/projects", keyset=True, per_page=10)
+    assert list(paginator.items()) == list(range(20))
+    _, first_params = endpoint.requests[0]
+    assert first_params["pagination"] == "keyset" and first_params["order_by"] == "id"
+    # The next request uses the link as is, cursor included
+    assert endpoint.requests[1] == ("http://gitlab.local/api/v4/projects?id_after=9&page=2&per_page=10", {})
+    assert paginator.complete
+
+def test_stops_on_a_short_page_without_headers():
+    endpoint = FakeEndpoint(25, lambda page, items: make_response(items))
+    paginator = Paginator(endpoint, "http://gitlab.local/api/v4/projects", per_page=10, prefetch=False)
+    assert list(paginator.items()) == list(range(25))
+    assert [params["page"] for _, params in endpoint.requests[1:]] == [2, 3]
+    assert paginator.complete
+
+def test_a_failed_page_leaves_the_listing_incomplete():
+    endpoint = FakeEndpoint(30, lambda page, items: make_response(items, headers={"X-Next-Page": str(page + 1)}),
+                            fail_on_page=2)
+    paginator = Paginator(endpoint, "http://gitlab.local/api/v4/projects", per_page=10)
+    assert list(paginator.items()) == list(range(10))
+    assert not paginator.complete and paginator.pages == 1
+
+class FakeSession:
+    """
+    Answers requests with queued responses, raising the queued exceptions.
+    """
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(method)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(gitlab_client.time, "sleep", delays.append)
+    return delays
+
+def test_retries_server_errors_and_timeouts(sleeps):
+    session = FakeSession([make_response([], 503), requests.exceptions.ConnectTimeout("timed out"), make_response([1])])
+    retries = []
+    response = request_with_retry(session, "GET", "http://gitlab.local/api/v4/projects", max_retries=3,
+                                  on_retry=lambda attempt, delay, reason: retries.append((attempt, reason)))
+    assert response.json() == [1]
+    assert [attempt for attempt, _ in retries] == [1, 2]
+    assert retries[0][1] == "HTTP 503"
+    # Full jitter: each delay is at most BACKOFF_BASE * 2^attempt
+    assert sleeps[0] <= gitlab_client.BACKOFF_BASE and sleeps[1] <= 2 * gitlab_client.BACKOFF_BASE
+
+def test_waits_for_retry_after_on_429(sleeps):
+    session = FakeSession([make_response([], 429, {"Retry-After": "7"}), make_response([])])
+    request_with_retry(session, "GET", "http://gitlab.local/api/v4/projects")
+    assert sleeps == [7.0]
+
+def test_gives_up_after_max_retries(sleeps):
+    session = FakeSession([make_response([], 502)] * 3)
+    with pytest.raises(requests.HTTPError):
+        request_with_retry(session, "GET", "http://gitlab.local/api/v4/projects", max_retries=2)
+    assert len(session.calls) == 3
+
+def test_does_not_retry_non_idempotent_requests(sleeps):
+    session = FakeSession([make_response([], 503)])
+    with pytest.raises(requests.HTTPError):
+        request_with_retry(session, "POST", "http://gitlab.local/api/v4/projects/1/merge_requests")
+    assert session.calls == ["POST"] and sleeps == []
+
+def test_client_errors_are_not_retried(sleeps):
+    session = FakeSession([make_response([], 404)])
+    with pytest.raises(requests.HTTPError):
+        request_with_retry(session, "GET", "http://gitlab.local/api/v4/projects/1")
+    assert len(session.calls) == 1
+
+def test_rate_follows_the_remaining_quota():
+    limiter = RateLimiter()
+    limiter.update(make_response([], headers={"RateLimit-Remaining": "100", "RateLimit-Reset": str(time.time() + 50)}))
+    assert limiter.rate == pytest.approx(2.0, rel=0.05)
+
+    capped = RateLimiter(max_rate=1.0)
+    capped.update(make_response([], headers={"RateLimit-Remaining": "100", "RateLimit-Reset": str(time.time() + 50)}))
+    assert capped.rate == 1.0
+
+def test_exhausted_quota_blocks_until_the_reset():
+    limiter = RateLimiter()
+    limiter.update(make_response([], headers={"RateLimit-Remaining": "0", "RateLimit-Reset": str(time.time() + 30)}))
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(30, abs=1)
+    assert limiter.rate == MIN_RATE
+
+def test_429_halves_the_rate_and_success_ramps_it_back_up():
+    limiter = RateLimiter(max_rate=10.0)
+    limiter.update(make_response([], 429, {"Retry-After": "2"}))
+    assert limiter.rate == 5.0
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(2, abs=0.5)
+    limiter.update(make_response([]))
+    assert limiter.rate == pytest.approx(5.2)
+    for _ in range(1000):
+        limiter.update(make_response([]))
+    assert limiter.rate == 10.0
+
+def test_acquire_spaces_requests_at_the_rate():
+    limiter = RateLimiter(max_rate=50.0)
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    # One token is available up front, the other ten come at 50 per second
+    assert time.monotonic() - started >= 10 / 50 * 0.9
@@ -0,0 +1,75 @@
+"""
+Streaming statistics of job_stats.py against exact computations.
+"""
+import math
+import random
+import statistics
+
+import pytest
+
+from job_stats import DurationStats, QuantileSketch, RunningStats
+
+def exact_quantile(values, q):
+    """
+    Linear interpolation between the closest ranks, as numpy and pandas compute quantiles.
+    """
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+@pytest.mark.parametrize("size", [1, 2, 7, 50, 1000])
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_are_within_relative_accuracy(size, accuracy):
+    rng = random.Random(size)
+    values = [rng.lognormvariate(1, 1) for _ in range(size)]
+    sketch = QuantileSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * exact * (1 + 1e-9)
+
+def test_zero_values_and_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0, 0, 0, 10):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
+
+def test_merged_sketches_match_a_single_sketch():
+    rng = random.Random(1)
+    values = [rng.uniform(0.1, 100) for _ in range(500)]
+    whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (first if index % 2 else second).add(value)
+    first.merge(second)
+    assert [first.quantile(q) for q in (0.5, 0.9, 0.99)] == [whole.quantile(q) for q in (0.5, 0.9, 0.99)]
+
+def test_running_stats_merge_matches_exact_values():
+    rng = random.Random(2)
+    values = [rng.gauss(5, 2) for _ in range(300)]
+    left, right = RunningStats(), RunningStats()
+    for value in values[:100]:
+        left.add(value)
+    for value in values[100:]:
+        right.add(value)
+    left.merge(right)
+    assert left.count == len(values)
+    assert left.mean == pytest.approx(statistics.mean(values))
+    assert left.stddev == pytest.approx(statistics.stdev(values))
+    assert (left.minimum, left.maximum) == (min(values), max(values))
+
+def test_duration_stats_results_in_minutes():
+    stats = DurationStats()
+    stats.add_jobs([{'name': 'build', 'duration': seconds} for seconds in (60, 120, 180, None)]
+                   + [{'name': 'test', 'duration': 30}])
+    results = stats.results()
+    assert results['build']['count'] == 3
+    assert results['build']['average'] == pytest.approx(2.0)
+    assert (results['build']['fastest'], results['build']['slowest']) == (1.0, 3.0)
+    assert results['build']['p50'] == pytest.approx(2.0, rel=0.01)
+    assert results['test']['p99'] == 0.5
@@ -0,0 +1,84 @@
+"""
+Analyses of gitlab_pipeline_performance_audit.py over synthetic job stores, and the pandas
+backend of job_dataset.py against them.
+"""
+import importlib
+import sys
+
+import pytest
+
+import fake_gitlab_server
+
+@pytest.fixture(scope="module")
+def audit():
+    # The script reads its configuration from the environment at import time
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("GITLAB_PROJECT_IDS", "1")
+        monkeypatch.setenv("GITLAB_ACCESS_TOKEN", "test-token")
+        sys.modules.pop("gitlab_pipeline_performance_audit", None)
+        yield importlib.import_module("gitlab_pipeline_performance_audit")
+        sys.modules.pop("gitlab_pipeline_performance_audit", None)
+
+@pytest.fixture(scope="module")
+def dataset():
+    """
+    Pipelines and their job store (every attempt, a third of the jobs retried) from the fake server's data.
+    """
+    data = fake_gitlab_server.FakeGitlabData(projects=1, pipelines=40, jobs=8, retry_rate=0.3, seed=7)
+    pipelines = list(data.pipelines.values())
+    return data, pipelines, {pipeline['id']: data.jobs[pipeline['id']] for pipeline in pipelines}
+
+def job(job_id, name, started_at, finished_at):
+    return {'id': job_id, 'name': name, 'started_at': f"2024-03-01T10:{started_at}:00Z",
+            'finished_at': f"2024-03-01T10:{finished_at}:00Z"}
+
+def test_pipeline_duration_is_the_union_of_running_intervals(audit):
+    jobs = [
+        job(1, "build", "00", "10"),
+        job(2, "lint", "05", "12"),    # Overlaps build
+        job(3, "test", "20", "30"),    # Queue gap 12-20 is not counted
+    ]
+    assert audit.pipeline_duration_from_jobs(jobs) == 22 * 60
+
+def test_pipeline_duration_ignores_retried_attempts(audit):
+    jobs = [
+        job(1, "build", "00", "10"),
+        job(2, "test", "10", "40"),    # Failed attempt, superseded by job 3
+        job(3, "test", "40", "45"),
+    ]
+    assert audit.pipeline_duration_from_jobs(jobs) == 15 * 60
+
+def test_pipeline_duration_without_timestamps(audit):
+    assert audit.pipeline_duration_from_jobs([{'id': 1, 'name': "build", 'started_at': None}]) is None
+
+def test_derived_durations_match_gitlab(audit, dataset):
+    data, pipelines, job_store = dataset
+    for pipeline in pipelines:
+        assert audit.pipeline_duration_from_jobs(job_store[pipeline['id']]) == pytest.approx(pipeline['duration'], abs=1)
+
+def assert_same_stats(python_stats, pandas_stats, rel=1e-9, sketched=()):
+    assert python_stats.keys() == pandas_stats.keys()
+    for key, fields in python_stats.items():
+        assert fields.keys() <= pandas_stats[key].keys()
+        for field, value in fields.items():
+            # Quantiles come from a sketch on the python backend and are exact on the pandas one
+            tolerance = 0.01 if field in sketched else rel
+            assert value == pytest.approx(pandas_stats[key][field], rel=tolerance), (key, field)
+
+def test_python_and_pandas_backends_produce_the_same_reports(audit, dataset):
+    job_dataset = pytest.importorskip("job_dataset")
+    pytest.importorskip("pandas")
+    _, pipelines, job_store = dataset
+    table = job_dataset.build_job_table("1", pipelines, job_store)
+
+    assert_same_stats(audit.analyze_pipeline_runtimes("1", pipelines, job_store),
+                      job_dataset.branch_runtime_stats(table))
+    assert_same_stats(audit.analyze_job_durations(audit.latest_job_attempts(job_store)),
+                      job_dataset.job_duration_stats(table), sketched=("p50", "p90", "p99"))
+
+    retry_analysis = audit.analyze_retries(job_store)
+    assert_same_stats(retry_analysis['jobs'], job_dataset.job_retry_stats(table))
+    retry_stats, total_retried_jobs = job_dataset.retry_duration_stats(table)
+    assert_same_stats(retry_analysis['durations'], retry_stats)
+    assert retry_analysis['total_retried_jobs'] == total_retried_jobs > 0
+    assert_same_stats(retry_analysis['failure_reasons'], job_dataset.retry_failure_reason_stats(table))
@@ -0,0 +1,78 @@
+"""
+Incremental refresh of pipeline_cache.py with stubbed API listings.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pipeline_cache import PipelineCache, _timestamp, refresh_pipelines
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PipelineCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+def pipeline(pipeline_id, updated_at, status="success"):
+    return {'id': pipeline_id, 'updated_at': updated_at, 'status': status}
+
+class FakeListing:
+    """
+    Lists the pipelines updated after a timestamp, recording every `updated_after` it is asked for.
+    """
+    def __init__(self, pipelines):
+        self.pipelines = pipelines
+        self.calls = []
+
+    def __call__(self, updated_after_iso):
+        self.calls.append(updated_after_iso)
+        return [p for p in self.pipelines if _timestamp(p['updated_at']) > _timestamp(updated_after_iso)]
+
+def test_timestamps_are_normalized_to_utc():
+    assert _timestamp("2024-03-01T10:00:00.123Z") == "2024-03-01T10:00:00"
+    assert _timestamp("2024-03-01T12:30:00+02:00") == "2024-03-01T10:30:00"
+    assert _timestamp("2024-03-01T01:00:00-05:00") == "2024-03-01T06:00:00"
+    assert _timestamp("2024-03-01T10:00:00") == "2024-03-01T10:00:00"
+    assert _timestamp(None) == ""
+
+def test_window_with_an_offset_matches_utc_pipelines(cache):
+    # 10:00 at +02:00 is 08:00 UTC: the pipeline updated at 09:00 UTC is inside the window
+    listing = FakeListing([pipeline(1, "2024-03-01T07:00:00.000Z"), pipeline(2, "2024-03-01T09:00:00.000Z")])
+    pipelines = refresh_pipelines(cache, 1, "2024-03-01T10:00:00+02:00", listing, lambda pipeline_id: None)
+    assert [p['id'] for p in pipelines] == [2]
+
+def test_refresh_only_lists_pipelines_after_the_high_water_mark(cache):
+    now = datetime.now(timezone.utc)
+    window_start = (now - timedelta(days=30)).isoformat()
+    old = pipeline(1, (now - timedelta(days=2)).strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+    listing = FakeListing([old])
+    assert [p['id'] for p in refresh_pipelines(cache, 1, window_start, listing, lambda pipeline_id: None)] == [1]
+
+    new = pipeline(2, (now - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+    listing.pipelines.append(new)
+    pipelines = refresh_pipelines(cache, 1, window_start, listing, lambda pipeline_id: None)
+    assert [p['id'] for p in pipelines] == [2, 1]
+    assert _timestamp(listing.calls[-1]) == _timestamp(old['updated_at'])
+
+def test_updated_pipeline_loses_its_cached_jobs(cache):
+    cache.store_pipelines(1, [pipeline(1, "2024-03-01T09:00:00.000Z")])
+    cache.store_jobs(1, 1, [{'id': 10, 'name': 'build'}], include_retried=True)
+    assert cache.jobs(1, 1, include_retried=True) == [{'id': 10, 'name': 'build'}]
+
+    cache.store_pipelines(1, [pipeline(1, "2024-03-01T09:05:00.000Z")])
+    assert cache.jobs(1, 1, include_retried=True) is None
+
+def test_unfinished_pipelines_are_rechecked(cache):
+    now = datetime.now(timezone.utc)
+    window_start = (now - timedelta(days=30)).isoformat()
+    running = pipeline(1, (now - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z"), status="running")
+    refresh_pipelines(cache, 1, window_start, FakeListing([running]), lambda pipeline_id: None)
+
+    finished = dict(running, status="success")
+    rechecked = []
+    def fetch_pipeline(pipeline_id):
+        rechecked.append(pipeline_id)
+        return finished
+    pipelines = refresh_pipelines(cache, 1, window_start, FakeListing([]), fetch_pipeline)
+    assert rechecked == [1]
+    assert pipelines[0]['status'] == "success"
@@ -0,0 +1,66 @@
+"""
+Exporter mode of gitlab_pipeline_performance_audit.py against the fake GitLab server, sharing
+the local cache with a batch run.
+"""
+import importlib
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+import fake_gitlab_server
+from pipeline_cache import PipelineCache
+
+@pytest.fixture
+def server():
+    server = fake_gitlab_server.start_server(port=0, projects=1, pipelines=3, jobs=3, retry_rate=0.0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def audit(server, tmp_path, monkeypatch):
+    # The script reads its configuration from the environment at import time, and writes logs to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GITLAB_URL", fake_gitlab_server.server_url(server))
+    monkeypatch.setenv("GITLAB_PROJECT_IDS", "1")
+    monkeypatch.setenv("GITLAB_ACCESS_TOKEN", "test-token")
+    sys.modules.pop("gitlab_pipeline_performance_audit", None)
+    module = importlib.import_module("gitlab_pipeline_performance_audit")
+    module.pipeline_cache = PipelineCache(str(tmp_path / "cache.sqlite"))
+    yield module
+    module.pipeline_cache.close()
+    sys.modules.pop("gitlab_pipeline_performance_audit", None)
+
+def retry_job(data, pipeline_id):
+    """
+    Retry the first job of a pipeline on the fake server, which moves the pipeline's `updated_at`.
+    """
+    jobs = data.jobs[pipeline_id]
+    retried_job = jobs[0]
+    retried_job["retried"] = True
+    # Synthetic pipelines can finish after "now", so the retry starts after the newest one
+    started = max(datetime.strptime(pipeline["updated_at"], "%Y-%m-%dT%H:%M:%S.000Z")
+                  for pipeline in data.pipelines.values()) + timedelta(seconds=1)
+    finished = started + timedelta(seconds=30)
+    jobs.append({**retried_job, "id": max(job["id"] for pipeline_jobs in data.jobs.values() for job in pipeline_jobs) + 1,
+                 "retried": False, "status": "success",
+                 "started_at": fake_gitlab_server._iso(started), "finished_at": fake_gitlab_server._iso(finished)})
+    data.pipelines[pipeline_id]["updated_at"] = fake_gitlab_server._iso(finished)
+
+def test_repolled_pipeline_exports_its_new_jobs(server, audit):
+    # A batch run fills the cache first
+    audit.build_job_store("1", audit.fetch_pipelines("1"))
+
+    monitor = audit.ProjectMonitor("1")
+    exporter = audit.MetricsExporter([monitor])
+    exporter.poll()
+    pipeline_id = max(monitor.pipelines)
+    assert len(monitor.job_store[pipeline_id]) == 3
+
+    retry_job(server.RequestHandlerClass.data, pipeline_id)
+    exporter.poll()
+
+    assert monitor.poll_errors == 0
+    assert len(monitor.job_store[pipeline_id]) == 4
+    assert 'gitlab_pipeline_exporter_jobs{project="Project 1"} 10' in exporter.metrics_text()
@@ -0,0 +1,64 @@
+"""
+Machine-readable writers of report_writers.py.
+"""
+import csv
+import io
+import json
+import math
+
+import pytest
+
+from report_writers import OpenMetricsWriter, open_writers
+
+LABELS = {"project": "Project 1"}
+JOB_STATS = {
+    "build": {"slowest": 3.5, "count": 4, "note": "text fields are skipped by OpenMetrics"},
+    'say "hi"': {"slowest": math.inf, "count": 1},
+}
+
+def test_jsonl_writes_one_record_per_key(tmp_path):
+    with open_writers(["jsonl"], str(tmp_path / "stats"), LABELS, "gitlab_pipeline") as writers:
+        writers.write_section("job_duration", "job", {"build": JOB_STATS["build"]})
+        writers.write_section("critical_path", None, {None: {"pipelines": 2}})
+    records = [json.loads(line) for line in (tmp_path / "stats.jsonl").read_text().splitlines()]
+    assert records == [
+        {"section": "job_duration", "project": "Project 1", "job": "build", **JOB_STATS["build"]},
+        {"section": "critical_path", "project": "Project 1", "pipelines": 2},
+    ]
+
+def test_csv_writes_one_file_per_section_with_tuple_keys(tmp_path):
+    with open_writers(["csv"], str(tmp_path / "stats"), {}, "gitlab_pipeline") as writers:
+        writers.write_section("job_duration", ("project", "job"), {("Project 1", "build"): {"slowest": 3.5},
+                                                                   ("Project 2", "test"): {"count": 2}})
+        writers.write_section("empty", "job", {})
+    with open(tmp_path / "stats_job_duration.csv", newline="") as csvfile:
+        rows = list(csv.reader(csvfile))
+    assert rows == [["project", "job", "slowest", "count"], ["Project 1", "build", "3.5", ""], ["Project 2", "test", "", "2"]]
+    assert not (tmp_path / "stats_empty.csv").exists()
+
+def test_openmetrics_writes_gauge_families_with_escaped_labels():
+    buffer = io.StringIO()
+    writer = OpenMetricsWriter(None, LABELS, "gitlab_pipeline", file=buffer)
+    writer.write_section("job_duration", "job", JOB_STATS)
+    writer.close()
+    assert buffer.getvalue().splitlines() == [
+        "# TYPE gitlab_pipeline_job_duration_slowest gauge",
+        'gitlab_pipeline_job_duration_slowest{project="Project 1",job="build"} 3.5',
+        'gitlab_pipeline_job_duration_slowest{project="Project 1",job="say \\"hi\\""} +Inf',
+        "# TYPE gitlab_pipeline_job_duration_samples gauge",
+        'gitlab_pipeline_job_duration_samples{project="Project 1",job="build"} 4',
+        'gitlab_pipeline_job_duration_samples{project="Project 1",job="say \\"hi\\""} 1',
+        "# EOF",
+    ]
+
+def test_openmetrics_gauges_never_end_in_reserved_suffixes():
+    buffer = io.StringIO()
+    writer = OpenMetricsWriter(None, {}, "gitlab_pipeline", file=buffer)
+    writer.write_section("retry", None, {None: {"count": 1, "retries_total": 2, "sum": 3, "info": 4}})
+    names = [line.split()[2] for line in buffer.getvalue().splitlines() if line.startswith("# TYPE")]
+    assert names == ["gitlab_pipeline_retry_samples", "gitlab_pipeline_retry_retries_total_value",
+                     "gitlab_pipeline_retry_sum_value", "gitlab_pipeline_retry_info_value"]
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_writers(["xml"], str(tmp_path / "stats"), {}, "gitlab_pipeline")
@@ -0,0 +1,50 @@
+"""
+Multi-term matching of term_matcher.py against a brute-force search.
+"""
+import random
+
+import pytest
+
+from term_matcher import TermMatcher, load_terms
+
+def brute_force(terms, text, ignore_case=False):
+    if ignore_case:
+        text = text.lower()
+    found = set()
+    for term in dict.fromkeys(terms):
+        needle = term.lower() if ignore_case else term
+        start = text.find(needle)
+        while needle and start != -1:
+            found.add((start, term))
+            start = text.find(needle, start + 1)
+    return found
+
+def test_reports_overlapping_and_nested_terms():
+    matcher = TermMatcher(["he", "she", "his", "hers"])
+    assert sorted(matcher.finditer("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+    assert matcher.matching_terms("ushers") == ["he", "she", "hers"]
+
+def test_ignore_case():
+    matcher = TermMatcher(["SVC-Deploy@example.com"], ignore_case=True)
+    assert matcher.matching_terms("owner: svc-deploy@EXAMPLE.com") == ["SVC-Deploy@example.com"]
+    assert TermMatcher(["SVC-Deploy@example.com"]).matching_terms("svc-deploy@example.com") == []
+
+def test_duplicate_and_empty_terms_are_dropped():
+    matcher = TermMatcher(["token", "", "token"])
+    assert matcher.terms == ["token"]
+    assert list(matcher.finditer("token")) == [(0, "token")]
+
+@pytest.mark.parametrize("ignore_case", [False, True])
+def test_matches_a_brute_force_search(ignore_case):
+    rng = random.Random(3)
+    alphabet = "abAB"
+    terms = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(40)]
+    for _ in range(50):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        matcher = TermMatcher(terms, ignore_case)
+        assert set(matcher.finditer(text)) == brute_force(terms, text, ignore_case)
+
+def test_load_terms_skips_blank_lines_and_comments(tmp_path):
+    path = tmp_path / "terms.txt"
+    path.write_text("# service accounts\nsvc-a@example.com\n\n  svc-b@example.com  \n  # disabled\n")
+    assert load_terms(str(path)) == ["svc-a@example.com", "svc-b@example.com"]
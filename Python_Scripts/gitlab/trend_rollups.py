@@ -0,0 +1,217 @@
+"""
+Time-bucketed trend rollups persisted locally for the pipeline audit.
+
+Every run of the audit folds its pipelines and jobs into per-day or per-week buckets
+(by pipeline creation time, in UTC) of a few metrics:
+- `branch_runtime`: pipeline runtime in minutes, per branch.
+- `job_duration`: duration in minutes of the latest attempt of each job, per job name.
+- `job_retries`: 1 for a superseded (retried) attempt and 0 otherwise, per job name, so the
+  count is the number of runs and the total the number of retries.
+- `job_failures`: 1 for a failed attempt and 0 otherwise, per job name.
+- `retry_duration`: duration in minutes of superseded attempts, per job name.
+
+Each bucket stores a `RunningStats` (count, mean, variance, min, max) per metric and key in
+SQLite. A bucket becomes final once it ended more than `settle_days` ago; final buckets are
+never recomputed, so a run only computes the newest buckets, while the stored history can
+reach back further than the audit's fetch window. Buckets only partly covered by the fetch
+window are not written.
+"""
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from job_stats import RunningStats
+
+BUCKET_SIZES = ("day", "week")
+METRICS = ("branch_runtime", "job_duration", "job_retries", "job_failures", "retry_duration")
+DEFAULT_SETTLE_DAYS = 2
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+def bucket_start(moment, bucket_size):
+    """
+    Return the UTC start of the bucket containing `moment` (an aware datetime).
+    """
+    day = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket_size == "week":
+        day -= timedelta(days=day.weekday())  # Weeks start on Monday
+    return day
+
+def bucket_end(start, bucket_size):
+    return start + timedelta(days=7 if bucket_size == "week" else 1)
+
+def compute_rollups(pipelines, job_store, pipeline_durations, bucket_size, skip_buckets=()):
+    """
+    Fold pipelines into {(bucket, metric, key): RunningStats}, buckets being 'YYYY-MM-DD' strings.
+    `pipeline_durations` maps pipeline ID to runtime in seconds; pipelines in `skip_buckets`
+    are left out.
+    """
+    rollups = defaultdict(RunningStats)
+    for pipeline in pipelines:
+        if not pipeline.get('created_at'):
+            continue
+        bucket = bucket_start(_parse_timestamp(pipeline['created_at']), bucket_size).date().isoformat()
+        if bucket in skip_buckets:
+            continue
+
+        duration = pipeline_durations.get(pipeline['id'])
+        if duration is not None:
+            rollups[(bucket, "branch_runtime", pipeline['ref'])].add(duration / 60)
+
+        jobs = job_store.get(pipeline['id'], [])
+        # The latest attempt of a job is the one with the highest ID
+        latest_ids = {}
+        for job in jobs:
+            latest_ids[job['name']] = max(job['id'], latest_ids.get(job['name'], job['id']))
+        for job in jobs:
+            name = job['name']
+            retried = job['id'] != latest_ids[name]
+            rollups[(bucket, "job_retries", name)].add(1 if retried else 0)
+            rollups[(bucket, "job_failures", name)].add(1 if job['status'] == 'failed' else 0)
+            if job.get('duration') is not None:
+                metric = "retry_duration" if retried else "job_duration"
+                rollups[(bucket, metric, name)].add(job['duration'] / 60)
+    return rollups
+
+def bucket_summaries(rollups):
+    """
+    Aggregate rollups into one summary dict per bucket, oldest first.
+    """
+    summaries = defaultdict(lambda: {metric: RunningStats() for metric in METRICS})
+    for (bucket, metric, _), stats in rollups.items():
+        summaries[bucket][metric].merge(stats)
+
+    results = []
+    for bucket, metrics in sorted(summaries.items()):
+        runs = metrics['job_retries'].count
+        retries = metrics['job_retries'].mean * runs
+        results.append({
+            'bucket': bucket,
+            'pipelines': metrics['branch_runtime'].count,
+            'average_pipeline': metrics['branch_runtime'].mean if metrics['branch_runtime'].count else None,
+            'job_runs': runs,
+            'failures': round(metrics['job_failures'].mean * metrics['job_failures'].count),
+            'retries': round(retries),
+            'retry_minutes': metrics['retry_duration'].mean * metrics['retry_duration'].count,
+            'reliability': (runs - retries) / runs * 100 if runs else None,
+        })
+    return results
+
+def find_regressions(rollups, current_bucket, previous_bucket, threshold_pct, metrics=("branch_runtime", "job_duration")):
+    """
+    Compare average durations between two buckets and return the keys that slowed down by
+    at least `threshold_pct` percent, as dicts sorted by the largest increase first.
+    """
+    regressions = []
+    for (bucket, metric, key), current in rollups.items():
+        if bucket != current_bucket or metric not in metrics:
+            continue
+        previous = rollups.get((previous_bucket, metric, key))
+        if previous is None or previous.count == 0 or previous.mean <= 0:
+            continue
+        change_pct = (current.mean - previous.mean) / previous.mean * 100
+        if change_pct >= threshold_pct:
+            regressions.append({'metric': metric, 'key': key, 'previous': previous.mean,
+                                'current': current.mean, 'change_pct': change_pct})
+    return sorted(regressions, key=lambda regression: regression['change_pct'], reverse=True)
+
+class TrendStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    project_id TEXT NOT NULL,
+                    bucket_size TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    final INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, bucket_size, bucket_start)
+                );
+                CREATE TABLE IF NOT EXISTS rollups (
+                    project_id TEXT NOT NULL,
+                    bucket_size TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    mean REAL NOT NULL,
+                    m2 REAL NOT NULL,
+                    minimum REAL NOT NULL,
+                    maximum REAL NOT NULL,
+                    PRIMARY KEY (project_id, bucket_size, bucket_start, metric, key)
+                );
+            """)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def final_buckets(self, project_id, bucket_size):
+        """
+        Return the start dates of the project's buckets that will not be recomputed.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT bucket_start FROM buckets WHERE project_id = ? AND bucket_size = ? AND final = 1",
+                (str(project_id), bucket_size)).fetchall()
+        return {row[0] for row in rows}
+
+    def replace_buckets(self, project_id, bucket_size, rollups, finality):
+        """
+        Replace the stored rollups of every bucket in `finality` ({bucket: final}) with `rollups`.
+        """
+        with self.lock, self.connection:
+            for bucket, final in finality.items():
+                key = (str(project_id), bucket_size, bucket)
+                self.connection.execute(
+                    "DELETE FROM rollups WHERE project_id = ? AND bucket_size = ? AND bucket_start = ?", key)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO buckets (project_id, bucket_size, bucket_start, final) VALUES (?, ?, ?, ?)",
+                    (*key, int(final)))
+            self.connection.executemany(
+                "INSERT INTO rollups (project_id, bucket_size, bucket_start, metric, key, count, mean, m2, minimum, maximum) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(project_id), bucket_size, bucket, metric, key,
+                  stats.count, stats.mean, stats.m2, stats.minimum, stats.maximum)
+                 for (bucket, metric, key), stats in rollups.items() if bucket in finality])
+
+    def rollups(self, project_id, bucket_size, since_bucket=""):
+        """
+        Load the stored rollups of buckets starting on or after `since_bucket`.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT bucket_start, metric, key, count, mean, m2, minimum, maximum FROM rollups "
+                "WHERE project_id = ? AND bucket_size = ? AND bucket_start >= ?",
+                (str(project_id), bucket_size, since_bucket)).fetchall()
+        rollups = {}
+        for bucket, metric, key, count, mean, m2, minimum, maximum in rows:
+            stats = RunningStats()
+            stats.count, stats.mean, stats.m2, stats.minimum, stats.maximum = count, mean, m2, minimum, maximum
+            rollups[(bucket, metric, key)] = stats
+        return rollups
+
+def update_trends(store, project_id, pipelines, job_store, pipeline_durations, bucket_size,
+                  window_start, now=None, settle_days=DEFAULT_SETTLE_DAYS):
+    """
+    Compute the rollups of every bucket that is fully inside the fetch window and not final
+    yet, and store them. Returns the number of buckets (re)computed.
+    """
+    now = now or datetime.now(timezone.utc)
+    first_full_bucket = bucket_start(window_start, bucket_size)
+    if first_full_bucket < window_start:
+        first_full_bucket = bucket_end(first_full_bucket, bucket_size)
+
+    final_buckets = store.final_buckets(project_id, bucket_size)
+    rollups = compute_rollups(pipelines, job_store, pipeline_durations, bucket_size, skip_buckets=final_buckets)
+    finality = {}
+    for bucket in {bucket for bucket, _, _ in rollups}:
+        start = datetime.fromisoformat(bucket).replace(tzinfo=timezone.utc)
+        if start >= first_full_bucket:
+            finality[bucket] = bucket_end(start, bucket_size) <= now - timedelta(days=settle_days)
+    store.replace_buckets(project_id, bucket_size, rollups, finality)
+    return len(finality)